@@ -0,0 +1,112 @@
+"""Compare the size and read speed of a recorder database and its archive.
+
+A day of snapshots of every order book is recorded into SQLite, every
+--interval seconds, from books which change a few levels between
+snapshots. The database is archived, and the snapshots of one order book
+are then read back for an hour and for the whole day from both.
+
+    PYTHONPATH=. python benchmarks/bench_archive.py --interval 10 --levels 50
+"""
+from __future__ import division, print_function
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from quadriga import QuadrigaClient
+from quadriga.archive import ArchiveReader, archive_database
+from quadriga.storage import OrderBookStore
+
+BOOK = 'btc_cad'
+DAY = 86400
+
+
+def record(db_path, args):
+    """Record a day of evolving order books into the database."""
+    rng = random.Random(0)
+    books = {}
+    for index, book in enumerate(QuadrigaClient.order_books):
+        middle = 500000 + index * 10000
+        books[book] = [
+            [(middle - 1 - level * 5, rng.randint(1, 10 ** 9))
+             for level in range(args.levels)],
+            [(middle + 1 + level * 5, rng.randint(1, 10 ** 9))
+             for level in range(args.levels)],
+        ]
+    with OrderBookStore(db_path) as store:
+        for timestamp in range(DAY, 2 * DAY, args.interval):
+            rows = []
+            for book, sides in sorted(books.items()):
+                for side, levels in enumerate(sides):
+                    for _ in range(args.changes):
+                        level = rng.randrange(len(levels))
+                        levels[level] = (levels[level][0],
+                                         rng.randint(1, 10 ** 9))
+                    rows.extend((timestamp, side, amount, price, book)
+                                for price, amount in levels)
+            store.insert_rows(rows)
+
+
+def timed(function):
+    start = time.time()
+    result = function()
+    return result, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--interval', type=int, default=30,
+                        help='seconds between snapshots')
+    parser.add_argument('--levels', type=int, default=50,
+                        help='price levels per side of each snapshot')
+    parser.add_argument('--changes', type=int, default=3,
+                        help='levels changed per side between snapshots')
+    parser.add_argument('--block-size', type=int, default=16384,
+                        help='levels per block of the archive')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    db_path = os.path.join(directory, 'quadrigaData.db')
+    root = os.path.join(directory, 'archive')
+    try:
+        record(db_path, args)
+        conn = sqlite3.connect(db_path)
+        conn.execute('VACUUM')
+        conn.close()
+        (rows, size), elapsed = timed(lambda: archive_database(
+            db_path, root, block_size=args.block_size
+        ))
+        database = os.path.getsize(db_path)
+        print('{} levels archived in {:.2f}s ({:.0f}/s)'.format(
+            rows, elapsed, rows / elapsed))
+        print('database {:.1f} MB, archive {:.1f} MB ({:.1f}x smaller, '
+              '{:.2f} bytes per level)\n'.format(
+                  database / 1e6, size / 1e6, database / size, size / rows))
+
+        reader = ArchiveReader(root)
+        print('{:<6} {:>12} {:>12} {:>10}'.format(
+            'range', 'sqlite ms', 'archive ms', 'levels'))
+        for name, start, end in (('hour', DAY + 3600, DAY + 7199),
+                                 ('day', DAY, 2 * DAY - 1)):
+            with OrderBookStore(db_path) as store:
+                expected, sqlite = timed(
+                    lambda: list(store.range(BOOK, start, end))
+                )
+            result, archive = timed(
+                lambda: list(reader.range(BOOK, start, end))
+            )
+            assert sorted(result) == sorted(expected)
+            print('{:<6} {:>12.1f} {:>12.1f} {:>10}'.format(
+                name, sqlite * 1000, archive * 1000, len(result)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
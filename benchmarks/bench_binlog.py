@@ -0,0 +1,106 @@
+"""Compare the SQLite store and the binary log on a day of snapshots.
+
+Snapshots of every order book are generated every --interval seconds over a
+day, written in batches as the recorder would, then one order book is
+scanned for the whole day: as rows streamed from SQLite, and as a NumPy view
+of the mapped log, filtered and summed.
+
+    PYTHONPATH=. python benchmarks/bench_binlog.py --interval 10 --levels 50
+"""
+from __future__ import division, print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from quadriga import QuadrigaClient
+from quadriga.binlog import BinaryLog, BinaryLogReader
+from quadriga.storage import OrderBookStore
+
+BOOK = 'btc_cad'
+DAY = 86400
+
+
+def batches(args):
+    """Yield the rows of each batch of snapshots, in chronological order."""
+    books = QuadrigaClient.order_books
+    batch = []
+    for timestamp in range(0, DAY, args.interval):
+        for index, book in enumerate(books):
+            middle = 500000 + index * 1000 + timestamp % 100
+            batch.extend(
+                (timestamp, side, 100000000 + level, middle + (
+                    level + 1 if side else -level - 1), book)
+                for side in (0, 1) for level in range(args.levels)
+            )
+        if len(batch) >= args.batch_size * len(books) * 2 * args.levels:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def timed(function):
+    start = time.time()
+    result = function()
+    return result, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--interval', type=int, default=10,
+                        help='seconds between snapshots')
+    parser.add_argument('--levels', type=int, default=50,
+                        help='price levels per side of each snapshot')
+    parser.add_argument('--batch-size', type=int, default=10,
+                        help='polls written per batch')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    db_path = os.path.join(directory, 'orders.db')
+    log_path = os.path.join(directory, 'orders.qlog')
+    try:
+        def write(store_class, path):
+            with store_class(path) as store:
+                return sum(store.insert_rows(rows) for rows in batches(args))
+
+        rows, sqlite_write = timed(lambda: write(OrderBookStore, db_path))
+        _, log_write = timed(lambda: write(BinaryLog, log_path))
+
+        def scan_sqlite():
+            with OrderBookStore(db_path) as store:
+                return sum(row[2] for row in store.range(BOOK, 0, DAY))
+
+        def scan_log():
+            with BinaryLogReader(log_path) as reader:
+                records = reader.records(0, DAY)
+                return int(records['amount'][
+                    records['book'] == reader.book_id(BOOK)
+                ].sum())
+
+        sqlite_total, sqlite_scan = timed(scan_sqlite)
+        log_total, log_scan = timed(scan_log)
+        assert sqlite_total == log_total
+
+        print('{} rows, {} scanned\n'.format(
+            rows, rows // len(QuadrigaClient.order_books)))
+        print('{:<8} {:>10} {:>12} {:>10} {:>10}'.format(
+            'store', 'write s', 'rows/s', 'MB', 'scan ms'))
+        for name, write_time, size, scan in (
+                ('sqlite', sqlite_write, os.path.getsize(db_path),
+                 sqlite_scan),
+                ('binlog', log_write, os.path.getsize(log_path) +
+                 os.path.getsize(log_path + '.idx'), log_scan)):
+            print('{:<8} {:>10.2f} {:>12.0f} {:>10.1f} {:>10.1f}'.format(
+                name, write_time, rows / write_time, size / 1e6,
+                scan * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
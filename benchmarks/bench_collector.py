@@ -0,0 +1,90 @@
+"""Measure the snapshots recorded per second by the parallel collector.
+
+The exchange simulator runs in its own process, with every order book
+seeded with the given number of levels per side, and the collector polls
+all the books as fast as it can with each number of worker processes in
+turn, writing into a fresh database.
+
+    PYTHONPATH=. python benchmarks/bench_collector.py --processes 1 2 4
+    PYTHONPATH=. python benchmarks/bench_collector.py --keyframe-interval 60
+"""
+from __future__ import division, print_function
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from quadriga import QuadrigaClient
+from quadriga.collector import ParallelCollector
+from quadriga.simulator import Exchange, ExchangeSimulator
+
+
+def serve(args, ready, stop):
+    exchange = Exchange()
+    for book in QuadrigaClient.order_books:
+        exchange.seed_book(
+            book,
+            bids=[('{}.00'.format(5000 - level), '1')
+                  for level in range(1, args.levels + 1)],
+            asks=[('{}.00'.format(5000 + level), '1')
+                  for level in range(1, args.levels + 1)],
+        )
+    simulator = ExchangeSimulator(exchange, port=0,
+                                  latency=args.latency).start()
+    ready.put(simulator.url)
+    stop.wait()
+    simulator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2],
+                        help='numbers of worker processes to compare')
+    parser.add_argument('--levels', type=int, default=50,
+                        help='price levels per side of each order book')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='simulated latency of each response in seconds')
+    parser.add_argument('--keyframe-interval', type=int, default=None,
+                        help='store deltas with a keyframe every N snapshots')
+    args = parser.parse_args()
+
+    ready, stop = multiprocessing.Queue(), multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(args, ready, stop))
+    server.start()
+    url = ready.get()
+    directory = tempfile.mkdtemp()
+
+    print('{:>9} {:>12} {:>10} {:>12} {:>10}'.format(
+        'processes', 'snapshots/s', 'rows/s', 'KB/s queued', 'errors'))
+    try:
+        for processes in args.processes:
+            collector = ParallelCollector(
+                os.path.join(directory, '{}.db'.format(processes)),
+                processes=processes, interval=0,
+                keyframe_interval=args.keyframe_interval,
+                client_options={'endpoint_prefix': url}
+            )
+            with collector:
+                time.sleep(args.seconds)
+            report = collector.report()
+            elapsed = report['elapsed']
+            print('{:>9} {:>12.1f} {:>10.1f} {:>12.1f} {:>10}'.format(
+                processes, report['snapshots_per_sec'],
+                report['writer']['rows'] / elapsed,
+                sum(worker['bytes'] for worker in report['workers'])
+                / elapsed / 1024,
+                sum(worker['errors'] for worker in report['workers'])))
+    finally:
+        shutil.rmtree(directory)
+        stop.set()
+        server.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Compare the response decoders of RestClient on order book payloads.
+
+By default the payload is a synthetic ungrouped order book. With --db, the
+latest snapshot recorded in a recorder database is used instead (the
+database is only read, never migrated).
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import sqlite3
+import timeit
+
+from requests.models import Response
+
+from quadriga.decoders import DECODERS, get_fast_json
+from quadriga.fixedpoint import FixedPoint
+
+from payloads import order_book
+
+
+def recorded_payload(path):
+    """Rebuild the body of the latest snapshot recorded in a database."""
+    conn = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+    timestamp = conn.execute(
+        'SELECT MAX(timeStamp) FROM transactionOrders'
+    ).fetchone()[0]
+    payload = {'timestamp': str(timestamp), 'bids': [], 'asks': []}
+    for side, amount, price in conn.execute(
+            'SELECT type, amount, price FROM transactionOrders '
+            'WHERE timeStamp = ? ORDER BY rowid', (timestamp,)):
+        key = 'bids' if side == 0 else 'asks'
+        payload[key].append([str(FixedPoint(price, 2)),
+                             str(FixedPoint(amount, 8))])
+    conn.close()
+    return payload
+
+
+def build_response(body):
+    """Return a requests response holding the JSON body."""
+    response = Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    response._content = body
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', help='recorder database to take a book from')
+    parser.add_argument('--levels', type=int, default=5000,
+                        help='levels per side of the synthetic book')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.db:
+        payload = recorded_payload(args.db)
+    else:
+        payload = order_book(args.levels)
+    body = json.dumps(payload).encode('utf-8')
+    response = build_response(body)
+    print('payload: {} bids, {} asks, {} bytes'.format(
+        len(payload['bids']), len(payload['asks']), len(body)))
+    backend = get_fast_json()
+    print('fast backend: {}'.format(
+        backend.__name__ if backend else 'none (same as json)'))
+
+    baseline = None
+    for name in ('json', 'fast', 'raw'):
+        decoder = DECODERS[name]
+        assert name == 'raw' or decoder(response) == payload
+        best = min(timeit.repeat(
+            lambda: decoder(response), repeat=args.repeat, number=args.number
+        )) / args.number
+        baseline = baseline or best
+        print('{:<5} {:9.3f} ms  x{:.1f}'.format(
+            name, best * 1000, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
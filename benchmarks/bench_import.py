@@ -0,0 +1,78 @@
+"""Measure how long importing quadriga and creating a client take.
+
+Each run starts a fresh interpreter, so nothing is cached between runs. The
+slowest modules of the last run are listed (as reported by
+``python -X importtime``), along with any module which should only be
+imported when a request is actually sent.
+
+    PYTHONPATH=. python benchmarks/bench_import.py --runs 20
+"""
+from __future__ import division, print_function
+
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules which importing quadriga and creating a client must not load
+DEFERRED = ('requests', 'urllib3', 'numpy', 'concurrent.futures',
+            'http.server', 'multiprocessing', 'orjson', 'ujson', 'simplejson')
+
+SCRIPT = '''
+import json, sys, time
+start = time.time()
+import quadriga
+imported = time.time()
+quadriga.QuadrigaClient(default_book='btc_cad')
+created = time.time()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'client_ms': (created - imported) * 1000,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+''' % (DEFERRED,)
+
+
+def run():
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError(stderr.decode('utf-8'))
+    modules = []
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative) / 1000, name.strip()))
+    return json.loads(stdout.decode('utf-8')), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of slowest modules to list')
+    args = parser.parse_args()
+
+    results = [run() for _ in range(args.runs)]
+    for key in ('import_ms', 'client_ms'):
+        values = sorted(result[key] for result, _ in results)
+        print('{:<10} median {:7.2f} ms   min {:7.2f} ms'.format(
+            key[:-3], values[len(values) // 2], values[0]))
+
+    result, modules = results[-1]
+    print('\nslowest modules (cumulative ms):')
+    for cumulative, name in sorted(modules, reverse=True)[:args.top]:
+        print('{:8.2f}  {}'.format(cumulative, name))
+    if result['loaded']:
+        print('\nloaded eagerly: ' + ', '.join(result['loaded']))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
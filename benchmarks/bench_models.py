@@ -0,0 +1,83 @@
+"""Compare the memory held by raw response dicts and by result models.
+
+Each payload is decoded from JSON as the client would, then kept either as
+the decoded dicts and lists or as the models of quadriga.models built from
+them (the dicts being dropped). The memory retained by each is measured
+with tracemalloc, along with the time taken to build the models and to read
+a decoded field from every item.
+
+    PYTHONPATH=. python benchmarks/bench_models.py --count 100000
+"""
+from __future__ import division, print_function
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from quadriga.models import BookLevel, Order, Trade, UserTrade
+
+from payloads import order, order_book, trades, user_trades
+
+BOOK = 'btc_cad'
+
+
+def retained(build):
+    """Return what the function builds and the memory it holds in bytes."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--count', type=int, default=100000,
+                        help='items per payload')
+    args = parser.parse_args()
+    count = args.count
+
+    cases = [
+        ('trades', json.dumps(trades(count)),
+         lambda body: Trade.many(body, BOOK), lambda item: item.price),
+        ('user trades', json.dumps(user_trades(count)),
+         lambda body: UserTrade.many(body, BOOK), lambda item: item.major),
+        ('orders', json.dumps([order(i) for i in range(count)]),
+         lambda body: Order.many(body, BOOK), lambda item: item.amount),
+        ('book levels', json.dumps(order_book(count // 2)['bids'] * 2),
+         BookLevel.many, lambda item: item.price),
+    ]
+
+    print('{:<12} {:>12} {:>12} {:>8} {:>10} {:>10}'.format(
+        'payload', 'dicts B/item', 'models B/item', 'saved',
+        'build ms', 'read ms'))
+    for name, text, build, read in cases:
+        raw, raw_size = retained(lambda: json.loads(text))
+        del raw
+        models, model_size = retained(lambda: build(json.loads(text)))
+
+        start = time.time()
+        build(json.loads(text))
+        built = time.time()
+        json.loads(text)
+        build_ms = ((built - start) - (time.time() - built)) * 1000
+        start = time.time()
+        for item in models:
+            read(item)
+        read_ms = (time.time() - start) * 1000
+
+        print('{:<12} {:>12.1f} {:>12.1f} {:>7.0f}% {:>10.1f} {:>10.1f}'
+              .format(name, raw_size / count, model_size / count,
+                      (1 - model_size / raw_size) * 100, build_ms, read_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Load test the client against the local exchange simulator.
+
+The simulator runs in its own process, and each client process runs
+several threads sharing one pooled client, so neither side is limited by
+the other's share of the GIL. Every thread loops over a mix of public calls
+and a limit order placed away from the market then cancelled.
+
+    PYTHONPATH=. python benchmarks/loadtest.py --processes 4 --threads 8
+    PYTHONPATH=. python benchmarks/loadtest.py --latency 0.02 --error-rate 0.01
+"""
+from __future__ import division, print_function
+
+import argparse
+import multiprocessing
+import threading
+import time
+
+from quadriga import QuadrigaClient
+from quadriga.exceptions import RequestError
+from quadriga.metrics import MemorySink
+from quadriga.simulator import Exchange, ExchangeSimulator
+
+BOOK = 'btc_cad'
+
+
+def serve(args, ready, stop):
+    exchange = Exchange(books=[BOOK])
+    for index in range(args.processes):
+        exchange.add_account('key{}'.format(index), 'secret', 'client',
+                             {'btc': '1000', 'cad': '10000000'})
+    exchange.seed_book(
+        BOOK,
+        bids=[('{}.00'.format(5000 - level), '1') for level in range(1, 51)],
+        asks=[('{}.00'.format(5000 + level), '1') for level in range(1, 51)],
+    )
+    simulator = ExchangeSimulator(
+        exchange, port=0, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate
+    ).start()
+    ready.put(simulator.url)
+    stop.wait()
+    simulator.stop()
+
+
+def drive(args, url, index, results):
+    sink = MemorySink()
+    client = QuadrigaClient(
+        'key{}'.format(index), 'secret', 'client', default_book=BOOK,
+        pool_size=args.threads, endpoint_prefix=url, metrics=sink
+    )
+    calls = [
+        client.get_summary,
+        client.get_public_orders,
+        client.get_public_trades,
+        lambda: client.cancel_order(
+            client.buy_limit_order('0.01', '1000')['id']
+        ),
+    ]
+    deadline = time.time() + args.seconds
+
+    def loop():
+        while time.time() < deadline:
+            for call in calls:
+                try:
+                    call()
+                except RequestError:
+                    pass
+
+    threads = [threading.Thread(target=loop) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client.close()
+    results.put((sink.requests, sink.summary()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--processes', type=int, default=2,
+                        help='client processes')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='threads per client process')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='simulated latency of each response in seconds')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='maximum random latency added in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='probability of an injected HTTP error')
+    args = parser.parse_args()
+
+    ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(args, ready, stop))
+    server.start()
+    url = ready.get()
+
+    clients = [
+        multiprocessing.Process(target=drive, args=(args, url, index, results))
+        for index in range(args.processes)
+    ]
+    for process in clients:
+        process.start()
+    requests, summaries = {}, {}
+    for _ in clients:
+        counts, summary = results.get()
+        for key, count in counts.items():
+            requests[key] = requests.get(key, 0) + count
+        for key, stats in summary.items():
+            summaries.setdefault(key, []).append(stats)
+    for process in clients:
+        process.join()
+    stop.set()
+    server.join()
+
+    total = sum(requests.values())
+    print('{} requests in {:.1f}s: {:.1f}/s'.format(
+        total, args.seconds, total / args.seconds))
+    print('\n{:<8} {:<16} {:>7} {:>8}'.format(
+        'method', 'endpoint', 'status', 'count'))
+    for (method, endpoint, status), count in sorted(
+            requests.items(), key=lambda item: str(item[0])):
+        print('{:<8} {:<16} {:>7} {:>8}'.format(
+            method, endpoint, str(status), count))
+    print('\n{:<8} {:<16} {:>9} {:>9}'.format(
+        'method', 'endpoint', 'p50 ms', 'p99 ms'))
+    for (method, endpoint, phase), stats in sorted(summaries.items()):
+        if phase != 'total':
+            continue
+        # Percentiles of the slowest client process
+        print('{:<8} {:<16} {:>9.2f} {:>9.2f}'.format(
+            method, endpoint,
+            max(item['p50'] for item in stats) * 1000,
+            max(item['p99'] for item in stats) * 1000))
+
+
+if __name__ == '__main__':
+    main()
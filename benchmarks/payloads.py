@@ -0,0 +1,81 @@
+"""Synthetic API response bodies shared by the benchmarks."""
+import random
+
+from quadriga.fixedpoint import FixedPoint
+
+
+def order_book(levels, seed=0):
+    """Return the body of an ungrouped order book with the given depth."""
+    rng = random.Random(seed)
+    bids = [[str(FixedPoint(500000 - i * rng.randint(1, 5), 2)),
+             str(FixedPoint(rng.randint(1, 10 ** 9), 8))]
+            for i in range(levels)]
+    asks = [[str(FixedPoint(500100 + i * rng.randint(1, 5), 2)),
+             str(FixedPoint(rng.randint(1, 10 ** 9), 8))]
+            for i in range(levels)]
+    return {'timestamp': '1491481256', 'bids': bids, 'asks': asks}
+
+
+def trades(count, seed=0):
+    """Return the body of /transactions with the given number of trades."""
+    rng = random.Random(seed)
+    return [{
+        'date': str(1491481256 - i),
+        'tid': 1000000 - i,
+        'price': str(FixedPoint(500000 + rng.randint(-500, 500), 2)),
+        'amount': str(FixedPoint(rng.randint(1, 10 ** 9), 8)),
+        'side': rng.choice(['buy', 'sell']),
+    } for i in range(count)]
+
+
+def user_trades(count):
+    """Return the body of /user_transactions with the given length."""
+    return [{
+        'datetime': '2017-04-06 12:{:02d}:00'.format(i % 60),
+        'id': i,
+        'type': 2,
+        'method': 'Exchange',
+        'btc': '0.10000000',
+        'cad': '-500.00',
+        'rate': '5000.00',
+        'fee': '0.00050000',
+        'order_id': '{:064x}'.format(i),
+    } for i in range(count)]
+
+
+def order(index=0):
+    """Return the body of an open order."""
+    return {
+        'id': '{:064x}'.format(index),
+        'datetime': '2017-04-06 12:00:00',
+        'type': 0,
+        'price': '5000.00',
+        'amount': '0.10000000',
+        'status': 0,
+    }
+
+
+# Bodies of the endpoints, by path
+BODIES = {
+    '/ticker': {
+        'high': '5100.00', 'last': '5000.00', 'timestamp': '1491481256',
+        'volume': '123.45678900', 'vwap': '5012.34', 'low': '4900.00',
+        'ask': '5001.00', 'bid': '5000.00',
+    },
+    '/order_book': order_book(1000),
+    '/transactions': trades(500),
+    '/open_orders': [order(i) for i in range(20)],
+    '/user_transactions': user_trades(100),
+    '/balance': {
+        'cad_balance': '1000.00', 'btc_balance': '1.00000000',
+        'cad_reserved': '0.00', 'btc_reserved': '0.00000000',
+        'cad_available': '1000.00', 'btc_available': '1.00000000',
+        'fee': '0.5000',
+    },
+    '/lookup_order': [order()],
+    '/cancel_order': 'true',
+    '/buy': order(),
+    '/sell': order(),
+    '/bitcoin_deposit_address': '1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2',
+    '/bitcoin_withdrawal': 'OK',
+}
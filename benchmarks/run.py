@@ -0,0 +1,267 @@
+"""Benchmark the client, the recorder and order book parsing offline.
+
+API calls are served by a replay session, so the results measure the
+overhead of the client itself (signing, pooling, decoding) rather than the
+network. By default the responses are synthetic; with --cassette, responses
+recorded from the real API (see quadriga.replay) are replayed instead.
+
+Results are written as JSON with --output and can be compared with a
+previous run with --compare:
+
+    PYTHONPATH=. python benchmarks/run.py --output before.json
+    PYTHONPATH=. python benchmarks/run.py --compare before.json
+"""
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from requests.models import Response
+
+from quadriga import QuadrigaClient, RestClient
+from quadriga.delta import OrderBookDiffer
+from quadriga.orderbook import OrderBook
+from quadriga.replay import Cassette, RecordingSession, ReplaySession
+from quadriga.storage import OrderBookStore, snapshot_rows
+from quadriga.version import VERSION
+
+from payloads import BODIES, order_book
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+try:
+    _timer = time.perf_counter
+except AttributeError:  # pragma: no cover
+    _timer = time.time
+
+BOOK = 'btc_cad'
+
+# Client calls benchmarked, as (name, method, keyword arguments)
+CLIENT_CALLS = [
+    ('get_summary', 'get_summary', {}),
+    ('get_public_orders', 'get_public_orders', {}),
+    ('get_order_book', 'get_order_book', {}),
+    ('get_public_trades', 'get_public_trades', {}),
+    ('get_orders', 'get_orders', {}),
+    ('get_trades', 'get_trades', {}),
+    ('get_balance', 'get_balance', {}),
+    ('buy_limit_order', 'buy_limit_order',
+     {'amount': '0.1', 'price': '5000'}),
+    ('sell_limit_order', 'sell_limit_order',
+     {'amount': '0.1', 'price': '5000'}),
+    ('buy_market_order', 'buy_market_order', {'amount': '0.1'}),
+    ('sell_market_order', 'sell_market_order', {'amount': '0.1'}),
+    ('lookup_order', 'lookup_order', {'order_id': '0' * 64}),
+    ('cancel_order', 'cancel_order', {'order_id': '0' * 64}),
+    ('get_deposit_address', 'get_deposit_address', {'currency': 'bitcoin'}),
+    ('withdraw', 'withdraw',
+     {'currency': 'bitcoin', 'amount': '0.1', 'address': 'address'}),
+]
+
+
+class SyntheticAPI(object):
+    """Session answering every endpoint with a synthetic body."""
+
+    def _respond(self, url):
+        path = url[len(RestClient.endpoint_prefix):]
+        response = Response()
+        response.url = url
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(BODIES[path]).encode('utf-8')
+        return response
+
+    def get(self, url, **_):
+        return self._respond(url)
+
+    def post(self, url, **_):
+        return self._respond(url)
+
+    def close(self):
+        pass
+
+
+def synthetic_cassette():
+    """Record the synthetic responses of every benchmarked call."""
+    cassette = Cassette()
+    client = build_client(
+        lambda _: RecordingSession(cassette, SyntheticAPI())
+    )
+    for _, method, kwargs in CLIENT_CALLS:
+        getattr(client, method)(**kwargs)
+    return cassette
+
+
+def build_client(wrap_session):
+    return QuadrigaClient(
+        api_key='api_key',
+        api_secret='api_secret',
+        client_id='client_id',
+        default_book=BOOK,
+        wrap_session=wrap_session
+    )
+
+
+def percentile(values, q):
+    """Return a percentile of sorted values (nearest rank)."""
+    index = min(int(round(q / 100 * len(values) + 0.5)) - 1, len(values) - 1)
+    return values[max(index, 0)]
+
+
+def measure(func, number, items=1):
+    """Time the function and measure its allocations.
+
+    :returns: the throughput, the latency percentiles and the peak memory
+        allocated by a single call
+    :rtype: dict
+    """
+    func()  # Warm up
+    latencies = []
+    started = _timer()
+    for _ in range(number):
+        start = _timer()
+        func()
+        latencies.append(_timer() - start)
+    total = _timer() - started
+    latencies.sort()
+    result = {
+        'number': number,
+        'per_sec': number * items / total,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            func()
+            result['peak_alloc_kb'] = (
+                tracemalloc.get_traced_memory()[1] - before
+            ) / 1024
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def bench_client(cassette, number, latency):
+    client = build_client(
+        lambda _: ReplaySession(cassette, latency=latency)
+    )
+    results = {}
+    for name, method, kwargs in CLIENT_CALLS:
+        func = getattr(client, method)
+        results['client.' + name] = measure(lambda: func(**kwargs), number)
+    client.close()
+    return results
+
+
+def bench_recorder(number, batch):
+    snapshot = order_book(100)
+    directory = tempfile.mkdtemp()
+    try:
+        store = OrderBookStore(os.path.join(directory, 'bench.db'))
+        rows = len(snapshot_rows(BOOK, snapshot)) * batch
+        results = {
+            'recorder.insert_snapshots': measure(
+                lambda: store.insert_snapshots([(BOOK, snapshot)] * batch),
+                number, items=rows
+            )
+        }
+        differ = OrderBookDiffer(keyframe_interval=60)
+        books = [order_book(100, seed=seed) for seed in range(batch)]
+        results['recorder.insert_deltas'] = measure(
+            lambda: store.insert_deltas(
+                differ, [(BOOK, book) for book in books]
+            ),
+            number, items=batch
+        )
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def bench_parsing(number):
+    snapshot = BODIES['/order_book']
+    return {
+        'parsing.order_book': measure(
+            lambda: OrderBook.from_response(snapshot, BOOK), number
+        ),
+        'parsing.snapshot_rows': measure(
+            lambda: snapshot_rows(BOOK, snapshot), number
+        ),
+    }
+
+
+def compare(results, baseline):
+    print('\n{:<32} {:>12} {:>12} {:>8}'.format(
+        'benchmark', 'before/s', 'after/s', 'change'))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before = baseline[name]['per_sec']
+        after = results[name]['per_sec']
+        print('{:<32} {:>12.1f} {:>12.1f} {:>+7.1f}%'.format(
+            name, before, after, (after / before - 1) * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--cassette', help='cassette of recorded responses')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='simulated latency of each response in seconds')
+    parser.add_argument('--number', type=int, default=200,
+                        help='calls per benchmark')
+    parser.add_argument('--batch', type=int, default=20,
+                        help='snapshots per recorder transaction')
+    parser.add_argument('--output', help='write the results to a JSON file')
+    parser.add_argument('--compare', help='JSON results to compare with')
+    args = parser.parse_args()
+
+    if args.cassette:
+        cassette = Cassette.load(args.cassette)
+    else:
+        cassette = synthetic_cassette()
+
+    results = {}
+    results.update(bench_client(cassette, args.number, args.latency))
+    results.update(bench_recorder(max(args.number // 20, 5), args.batch))
+    results.update(bench_parsing(args.number))
+
+    print('{:<32} {:>12} {:>9} {:>9} {:>10}'.format(
+        'benchmark', 'per sec', 'p50 ms', 'p99 ms', 'peak KiB'))
+    for name in sorted(results):
+        result = results[name]
+        print('{:<32} {:>12.1f} {:>9.3f} {:>9.3f} {:>10.1f}'.format(
+            name, result['per_sec'], result['p50_ms'], result['p99_ms'],
+            result.get('peak_alloc_kb', float('nan'))))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({
+                'version': VERSION,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': int(time.time()),
+                'argv': sys.argv[1:],
+                'results': results,
+            }, fp, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(results, json.load(fp)['results'])
+
+
+if __name__ == '__main__':
+    main()
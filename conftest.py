@@ -0,0 +1,4 @@
+import sys
+
+# The asyncio tests use syntax which older versions cannot even compile
+collect_ignore = ['tests_aio.py'] if sys.version_info < (3, 5) else []
@@ -1,7 +1,17 @@
 from __future__ import absolute_import, unicode_literals
 
+import functools
 import logging
-
+import threading
+
+from quadriga.models import (
+    Balance,
+    Order,
+    Ticker,
+    Trade,
+    UserTrade,
+    order_book
+)
 from quadriga.rest_client import RestClient
 from quadriga.exceptions import (
     InvalidCurrencyError,
@@ -23,6 +33,45 @@ class QuadrigaClient(object):
     :type client_id: str | unicode
     :param default_book: the default order book
     :type default_book: str | unicode
+    :param pool_size: the maximum number of keep-alive connections
+    :type pool_size: int
+    :param idle_timeout: the number of idle seconds after which pooled
+        connections are dropped, or ``None`` to keep them indefinitely
+    :type idle_timeout: int | float | None
+    :param max_workers: the maximum number of concurrent requests issued by
+        :meth:`get_many` (defaults to the number of order books)
+    :type max_workers: int
+    :param cache: the cache for responses from public endpoints, or ``None``
+        to disable caching
+    :type cache: quadriga.cache.ResponseCache
+    :param rate_limiter: the client-side scheduler enforcing the request
+        budget, or ``None`` to send requests immediately
+    :type rate_limiter: quadriga.ratelimit.RateLimiter
+    :param retry_policy: the policy for retrying failed requests, or ``None``
+        to never retry
+    :type retry_policy: quadriga.retry.RetryPolicy
+    :param timeout: the number of seconds to wait for the server to connect
+        or send data, or ``None`` to wait indefinitely
+    :type timeout: int | float | tuple | None
+    :param nonce_generator: the source of nonces for signed requests, which
+        must be shared by everything signing with the same API key
+    :type nonce_generator: quadriga.nonce.NonceGenerator
+    :param decoder: the response decoder (``"json"``, ``"fast"`` or ``"raw"``,
+        see :mod:`quadriga.decoders`) or a callable
+    :type decoder: str | unicode | callable
+    :param metrics: the sink (or list of sinks) receiving the timings, status
+        and error of every request (see :mod:`quadriga.metrics`)
+    :type metrics: object | list | None
+    :param wrap_session: the function applied to each new pooled session,
+        returning the object which sends the requests (see
+        :mod:`quadriga.replay`)
+    :type wrap_session: callable
+    :param endpoint_prefix: the base URL of the API (see
+        :mod:`quadriga.simulator`)
+    :type endpoint_prefix: str | unicode
+    :param result_models: return compact result models instead of dicts (see
+        :mod:`quadriga.models`)
+    :type result_models: bool
     """
 
     # Order books in QuadrigaCX
@@ -38,11 +87,34 @@ class QuadrigaClient(object):
     # Major currencies in QuadrigaCX
     crypto_currencies = {'bitcoin', 'ether', 'litecoin'}
 
+    # Read-only methods which can be fanned out across order books
+    book_methods = {
+        'get_summary',
+        'get_public_orders',
+        'get_order_book',
+        'get_public_trades',
+        'get_orders',
+        'get_trades',
+    }
+
     def __init__(self,
                  api_key=None,
                  api_secret=None,
                  client_id=None,
-                 default_book='eth_cad'):
+                 default_book='eth_cad',
+                 pool_size=10,
+                 idle_timeout=60,
+                 max_workers=None,
+                 cache=None,
+                 rate_limiter=None,
+                 retry_policy=None,
+                 timeout=30,
+                 nonce_generator=None,
+                 decoder='json',
+                 metrics=None,
+                 wrap_session=None,
+                 endpoint_prefix=None,
+                 result_models=False):
         """Initialize the client.
 
         :param api_key: QuadrigaCX API key
@@ -53,15 +125,98 @@ class QuadrigaClient(object):
         :type client_id: str | unicode
         :param default_book: the default order book
         :type default_book: str | unicode
+        :param pool_size: the maximum number of keep-alive connections
+        :type pool_size: int
+        :param idle_timeout: the number of idle seconds after which pooled
+            connections are dropped, or ``None`` to keep them indefinitely
+        :type idle_timeout: int | float | None
+        :param max_workers: the maximum number of concurrent requests issued
+            by :meth:`get_many` (defaults to the number of order books)
+        :type max_workers: int
+        :param cache: the cache for responses from public endpoints, or
+            ``None`` to disable caching
+        :type cache: quadriga.cache.ResponseCache
+        :param rate_limiter: the client-side scheduler enforcing the request
+            budget, or ``None`` to send requests immediately
+        :type rate_limiter: quadriga.ratelimit.RateLimiter
+        :param retry_policy: the policy for retrying failed requests, or
+            ``None`` to never retry
+        :type retry_policy: quadriga.retry.RetryPolicy
+        :param timeout: the number of seconds to wait for the server to
+            connect or send data, or ``None`` to wait indefinitely
+        :type timeout: int | float | tuple | None
+        :param nonce_generator: the source of nonces for signed requests,
+            which must be shared by everything signing with the same API key
+        :type nonce_generator: quadriga.nonce.NonceGenerator
+        :param decoder: the response decoder (``"json"``, ``"fast"`` or
+            ``"raw"``, see :mod:`quadriga.decoders`) or a callable
+        :type decoder: str | unicode | callable
+        :param metrics: the sink (or list of sinks) receiving the timings,
+            status and error of every request (see :mod:`quadriga.metrics`)
+        :type metrics: object | list | None
+        :param wrap_session: the function applied to each new pooled session,
+            returning the object which sends the requests (see
+            :mod:`quadriga.replay`)
+        :type wrap_session: callable
+        :param endpoint_prefix: the base URL of the API, e.g. that of a local
+            simulator from :mod:`quadriga.simulator` (defaults to the
+            QuadrigaCX v2 API)
+        :type endpoint_prefix: str | unicode
+        :param result_models: return the results as compact models with
+            ``__slots__`` instead of dicts and lists (see
+            :mod:`quadriga.models`)
+        :type result_models: bool
         """
         self._logger = logging.getLogger('quadriga')
         self._rest_client = RestClient(
             api_key=api_key,
             api_secret=api_secret,
-            client_id=client_id
+            client_id=client_id,
+            pool_size=pool_size,
+            idle_timeout=idle_timeout,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            retry_policy=retry_policy,
+            timeout=timeout,
+            nonce_generator=nonce_generator,
+            decoder=decoder,
+            metrics=metrics,
+            wrap_session=wrap_session,
+            endpoint_prefix=endpoint_prefix
         )
         self._client_id = client_id
         self._default_book = self._verify_book(default_book)
+        self._max_workers = max_workers or len(self.order_books)
+        self._result_models = result_models
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Close the client and release its pooled HTTP connections."""
+        self._log('close client')
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self._rest_client.close()
+
+    def _get_executor(self):
+        """Return the thread pool used for concurrent requests.
+
+        :returns: the thread pool
+        :rtype: concurrent.futures.ThreadPoolExecutor
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(self._max_workers)
+            return self._executor
 
     def _log(self, message):
         """Log a debug message.
@@ -71,6 +226,20 @@ class QuadrigaClient(object):
         """
         self._logger.debug('[client: {}] {}'.format(self._client_id, message))
 
+    def _models(self, body, convert, *args):
+        """Convert a response body to result models, if enabled.
+
+        :param body: the response body
+        :type body: dict | list
+        :param convert: the function building the models from the body
+        :type convert: callable
+        :returns: the models, or the body as it is
+        :rtype: dict | list | object
+        """
+        if not self._result_models:
+            return body
+        return convert(body, *args)
+
     def _verify_book(self, book):
         """Verify if the order book is valid and return it (or the default).
 
@@ -103,6 +272,29 @@ class QuadrigaClient(object):
                 .format(currency, list(self.crypto_currencies))
             )
 
+    def _verify_book_method(self, method, books):
+        """Verify the method and order books of a multi-book call.
+
+        :param method: the name of a read-only per-book method
+        :type method: str | unicode
+        :param books: the names of the order books (defaults to all books)
+        :type books: [str | unicode]
+        :returns: the bound method and the names of the order books
+        :rtype: (callable, [str | unicode])
+        :raises ValueError: on a method which cannot be fanned out
+        :raises InvalidOrderBookError: on invalid order book name
+        """
+        if method not in self.book_methods:
+            raise ValueError(
+                'Invalid method "{}" (choose from {})'
+                .format(method, sorted(self.book_methods))
+            )
+        if books is None:
+            books = sorted(self.order_books)
+        else:
+            books = [self._verify_book(book) for book in books]
+        return getattr(self, method), books
+
     def set_default_book(self, book):
         """Update the default order book of the client.
 
@@ -117,15 +309,15 @@ class QuadrigaClient(object):
         :param book: the name of the order book
         :type book: str | unicode
         :returns: the trading summary
-        :rtype: dict
+        :rtype: dict | quadriga.models.Ticker
         """
         book = self._verify_book(book)
         self._log('get trading summary for ' + book)
 
-        return self._rest_client.get(
+        return self._models(self._rest_client.get(
             endpoint='/ticker',
             params={'book': book}
-        )
+        ), Ticker, book)
 
     def get_public_orders(self, group=True, book=None):
         """Return all public open orders.
@@ -134,10 +326,26 @@ class QuadrigaClient(object):
         :type group: bool
         :param book: the name of the order book
         :type book: str | unicode
-        :returns: all public open orders
+        :returns: all public open orders (as
+            :class:`quadriga.models.BookLevel` objects if result models are
+            enabled)
         :rtype: dict
         """
         book = self._verify_book(book)
+        return self._models(
+            self._get_public_orders(group, book), order_book
+        )
+
+    def _get_public_orders(self, group, book):
+        """Return all public open orders as the API lists them.
+
+        :param group: group orders with the same price
+        :type group: bool
+        :param book: the verified name of the order book
+        :type book: str | unicode
+        :returns: all public open orders
+        :rtype: dict
+        """
         self._log('get public orders for ' + book)
 
         return self._rest_client.get(
@@ -145,6 +353,23 @@ class QuadrigaClient(object):
             params={'book': book, 'group': 1 if group else 0}
         )
 
+    def get_order_book(self, group=True, book=None):
+        """Return all public open orders as a columnar order book.
+
+        :param group: group orders with the same price
+        :type group: bool
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the order book
+        :rtype: quadriga.orderbook.OrderBook
+        """
+        # Imported on first use, as it loads NumPy when installed
+        from quadriga.orderbook import OrderBook
+        book = self._verify_book(book)
+        return OrderBook.from_response(
+            self._get_public_orders(group, book), book=book
+        )
+
     def get_public_trades(self, time='hour', book=None):
         """Return recently completed public trades.
 
@@ -153,15 +378,83 @@ class QuadrigaClient(object):
         :param book: the name of the order book
         :type book: str | unicode
         :returns: a list of recent trades
-        :rtype: [dict]
+        :rtype: [dict] | [quadriga.models.Trade]
         """
         book = self._verify_book(book)
         self._log('get recent public trades for ' + book)
 
-        return self._rest_client.get(
+        return self._models(self._rest_client.get(
             endpoint='/transactions',
             params={'book': book, 'time': time}
-        )
+        ), Trade.many, book)
+
+    def get_many(self, method, books=None, **kwargs):
+        """Call a per-book method concurrently for several order books.
+
+        The requests are issued on a thread pool bounded by **max_workers**.
+        A failed request does not fail the batch: the exception raised for
+        that order book is returned in place of its result.
+
+        :param method: the name of a read-only per-book method (e.g.
+            ``"get_summary"`` or ``"get_public_orders"``)
+        :type method: str | unicode
+        :param books: the names of the order books (defaults to all books)
+        :type books: [str | unicode]
+        :param kwargs: additional keyword arguments for the method
+        :returns: the result or exception for each order book, keyed by book
+        :rtype: dict
+        :raises ValueError: on a method which cannot be fanned out
+        :raises InvalidOrderBookError: on invalid order book name
+        """
+        func, books = self._verify_book_method(method, books)
+        self._log('call {} for {}'.format(method, ', '.join(books)))
+
+        executor = self._get_executor()
+        futures = {
+            book: executor.submit(func, book=book, **kwargs)
+            for book in books
+        }
+        results = {}
+        for book, future in futures.items():
+            try:
+                results[book] = future.result()
+            except Exception as exc:
+                results[book] = exc
+        return results
+
+    def get_summaries(self, books=None):
+        """Return the latest trading summaries of several order books.
+
+        :param books: the names of the order books (defaults to all books)
+        :type books: [str | unicode]
+        :returns: the trading summary (or exception) for each order book
+        :rtype: dict
+        """
+        return self.get_many('get_summary', books=books)
+
+    def get_all_public_orders(self, group=True, books=None):
+        """Return all public open orders of several order books.
+
+        :param group: group orders with the same price
+        :type group: bool
+        :param books: the names of the order books (defaults to all books)
+        :type books: [str | unicode]
+        :returns: the public open orders (or exception) for each order book
+        :rtype: dict
+        """
+        return self.get_many('get_public_orders', books=books, group=group)
+
+    def get_all_order_books(self, group=True, books=None):
+        """Return the columnar order books of several order books.
+
+        :param group: group orders with the same price
+        :type group: bool
+        :param books: the names of the order books (defaults to all books)
+        :type books: [str | unicode]
+        :returns: the order book (or exception) for each order book
+        :rtype: dict
+        """
+        return self.get_many('get_order_book', books=books, group=group)
 
     def get_orders(self, book=None):
         """Return a list of user's open orders.
@@ -169,15 +462,15 @@ class QuadrigaClient(object):
         :param book: the name of the order book
         :type book: str | unicode
         :returns: a list of user's open orders
-        :rtype: [dict]
+        :rtype: [dict] | [quadriga.models.Order]
         """
         book = self._verify_book(book)
         self._log("get user's open orders for " + book)
 
-        return self._rest_client.post(
+        return self._models(self._rest_client.post(
             endpoint='/open_orders',
             payload={'book': book}
-        )
+        ), Order.many, book)
 
     def get_trades(self, limit=100, offset=0, sort='desc', book=None):
         """Return a list of user's completed trades.
@@ -191,12 +484,12 @@ class QuadrigaClient(object):
         :param book: the name of the order book
         :type book: str | unicode
         :returns: a list of user's completed trades
-        :rtype: [dict]
+        :rtype: [dict] | [quadriga.models.UserTrade]
         """
         book = self._verify_book(book)
         self._log("get user's completed trades for " + book)
 
-        return self._rest_client.post(
+        return self._models(self._rest_client.post(
             endpoint='/user_transactions',
             payload={
                 'book': book,
@@ -204,22 +497,84 @@ class QuadrigaClient(object):
                 'offset': offset,
                 'sort': sort
             }
-        )
+        ), UserTrade.many, book)
+
+    def iter_trades(self,
+                    book=None,
+                    since=None,
+                    page_size=100,
+                    prefetch=True,
+                    checkpoint=None):
+        """Iterate over all of user's completed trades, oldest first.
+
+        The trades are fetched in pages of **page_size**, so memory use does
+        not depend on the length of the history. With **prefetch**, the next
+        page is fetched on the thread pool while the current one is being
+        consumed.
+
+        With a **checkpoint**, iteration starts from its saved offset, and
+        the offset is saved each time a page has been fully consumed. Trades
+        of a partially consumed page are yielded again on resumption.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param since: skip the trades made before this time
+        :type since: datetime.datetime | str | unicode
+        :param page_size: the number of trades fetched per request
+        :type page_size: int
+        :param prefetch: fetch the next page while the current one is consumed
+        :type prefetch: bool
+        :param checkpoint: the checkpoint to resume from and update
+        :type checkpoint: quadriga.checkpoint.FileCheckpoint
+        :returns: user's completed trades
+        :rtype: collections.Iterator[dict]
+        """
+        book = self._verify_book(book)
+        if hasattr(since, 'strftime'):
+            since = since.strftime('%Y-%m-%d %H:%M:%S')
+        offset = 0 if checkpoint is None else checkpoint.offset
+        self._log("iterate over user's completed trades for {} from {}"
+                  .format(book, offset))
+
+        def fetch(offset):
+            return self.get_trades(
+                limit=page_size, offset=offset, sort='asc', book=book
+            )
+
+        page = fetch(offset)
+        while True:
+            next_page = None
+            if prefetch and len(page) == page_size:
+                next_page = self._get_executor().submit(
+                    fetch, offset + page_size
+                )
+            for trade in page:
+                if since is None or trade['datetime'] >= since:
+                    yield trade
+            offset += len(page)
+            if checkpoint is not None:
+                checkpoint.save(offset)
+            if len(page) < page_size:
+                return
+            page = fetch(offset) if next_page is None else next_page.result()
 
     def get_balance(self):
         """Return the user's account balance.
 
         :returns: the user's account balance
-        :rtype: dict
+        :rtype: dict | quadriga.models.Balance
         """
         self._log("get user's account balance")
-        return self._rest_client.post(endpoint='/balance')
+        return self._models(
+            self._rest_client.post(endpoint='/balance'), Balance
+        )
 
     def buy_market_order(self, amount, book=None):
         """Buy market order.
 
         :param amount: the amount of major currency to buy at market price
-        :type amount: int | float | str | unicode
+        :type amount: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
         :param book: the name of the order book
         :type book: str | unicode
         :returns: the total amount of major currency purchased and a set of
@@ -238,27 +593,30 @@ class QuadrigaClient(object):
         """Buy limit order.
 
         :param amount: the amount of major currency to buy at limit price
-        :type amount: int | float | str | unicode
+        :type amount: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
         :param price: the limit price to buy at
-        :type price: int | float | str | unicode
+        :type price: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
         :param book: the name of the order book
         :type book: str | unicode
         :returns: the details of the order placed
-        :rtype: dict
+        :rtype: dict | quadriga.models.Order
         """
         book = self._verify_book(book)
         self._log("buy {} at price of {} for {}".format(amount, price, book))
 
-        return self._rest_client.post(
+        return self._models(self._rest_client.post(
             endpoint='/buy',
             payload={'book': book, 'amount': amount, 'price': price}
-        )
+        ), Order, book)
 
     def sell_market_order(self, amount, book=None):
         """Sell market order.
 
         :param amount: the amount of major currency to sell at market price
-        :type amount: int | float | str | unicode
+        :type amount: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
         :param book: the name of the order book
         :type book: str | unicode
         :returns: te total amount of minor currency acquired in sale and a set
@@ -277,36 +635,38 @@ class QuadrigaClient(object):
         """Sell a limit order.
 
         :param amount: the amount of the major currency to sell at limit price
-        :type amount: int | float | str | unicode
+        :type amount: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
         :param price: the limit price to sell at
-        :type price: int | float | str | unicode
+        :type price: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
         :param book: the name of the order book
         :type book: str | unicode
         :returns: the details of the order placed
-        :rtype: dict
+        :rtype: dict | quadriga.models.Order
         """
         book = self._verify_book(book)
         self._log("sell {} at price of {} for {}".format(amount, price, book))
 
-        return self._rest_client.post(
+        return self._models(self._rest_client.post(
             endpoint='/sell',
             payload={'book': book, 'amount': amount, 'price': price}
-        )
+        ), Order, book)
 
     def lookup_order(self, order_id):
         """Look up an order by its ID
 
         :param order_id: the ID of the order (64 hexadecmial characters)
         :type order_id: str | unicode
-        :returns: ``True`` if order has been found and cancelled
-        :rtype: bool
+        :returns: the order, in a list
+        :rtype: [dict] | [quadriga.models.Order]
         """
         self._log('look up order {}'.format(order_id))
 
-        return self._rest_client.post(
+        return self._models(self._rest_client.post(
             endpoint='/lookup_order',
             payload={'id': order_id}
-        )
+        ), Order.many)
 
     def cancel_order(self, order_id):
         """Cancel an open order by its ID.
@@ -323,6 +683,100 @@ class QuadrigaClient(object):
             payload={'id': order_id}
         )
 
+    def _place_order(self, side, amount, price=None, book=None):
+        """Place a buy or sell order, at market price if no price is given.
+
+        :param side: ``"buy"`` or ``"sell"``
+        :type side: str | unicode
+        :param amount: the amount of major currency
+        :type amount: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
+        :param price: the limit price, or ``None`` for a market order
+        :type price: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the details of the order placed
+        :rtype: dict
+        :raises ValueError: on an invalid side
+        """
+        if side == 'buy':
+            if price is None:
+                return self.buy_market_order(amount, book)
+            return self.buy_limit_order(amount, price, book)
+        if side == 'sell':
+            if price is None:
+                return self.sell_market_order(amount, book)
+            return self.sell_limit_order(amount, price, book)
+        raise ValueError('Invalid side "{}" (choose from buy, sell)'
+                         .format(side))
+
+    def _call_many(self, calls):
+        """Run calls concurrently on the thread pool.
+
+        :param calls: the functions to call without arguments
+        :type calls: [callable]
+        :returns: the result or exception of each call, in the same order
+        :rtype: list
+        """
+        executor = self._get_executor()
+        futures = [executor.submit(call) for call in calls]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    def place_orders(self, orders):
+        """Place several orders concurrently.
+
+        Each order is a dict with the keys ``side`` (``"buy"`` or
+        ``"sell"``), ``amount``, and optionally ``price`` (market order if
+        omitted) and ``book``. The signed requests are sent over the pooled
+        connections by at most **max_workers** threads. Requests whose nonce
+        reaches the server out of order are signed again with a fresh nonce.
+
+        A failed order does not fail the batch: the exception raised for it
+        is returned in place of its result.
+
+        .. code-block:: python
+
+            results = client.place_orders([
+                {'side': 'buy', 'amount': '0.1', 'price': '5000'},
+                {'side': 'sell', 'amount': '0.1', 'price': '5100'},
+            ])
+
+        :param orders: the orders to place
+        :type orders: [dict]
+        :returns: the details of each order placed, or the exception raised
+            for it, in the same order as **orders**
+        :rtype: list
+        """
+        self._log('place {} orders'.format(len(orders)))
+        return self._call_many([
+            functools.partial(self._place_order, **order) for order in orders
+        ])
+
+    def cancel_orders(self, order_ids):
+        """Cancel several open orders concurrently.
+
+        A failed cancellation does not fail the batch: the exception raised
+        for it is returned in place of its result.
+
+        :param order_ids: the IDs of the orders
+        :type order_ids: [str | unicode]
+        :returns: the result of each cancellation, or the exception raised
+            for it, in the same order as **order_ids**
+        :rtype: list
+        """
+        self._log('cancel {} orders'.format(len(order_ids)))
+        return self._call_many([
+            functools.partial(self.cancel_order, order_id)
+            for order_id in order_ids
+        ])
+
     def get_deposit_address(self, currency):
         """Return the deposit address for funding on QuadrigaCX.
 
@@ -347,7 +801,8 @@ class QuadrigaClient(object):
             (``"bitcoin"``/``"ether"``/``"litecoin"``)
         :type currency: str | unicode
         :param amount: the amount to withdraw
-        :type amount: int | float | str | unicode
+        :type amount: int | float | str | unicode |
+            quadriga.fixedpoint.FixedPoint
         :param address: the address to send the amount to
         :type address: str | unicode
         :raises InvalidCurrencyError: on unknown currency
@@ -0,0 +1,484 @@
+"""Asyncio flavour of the QuadrigaCX client (Python 3.5+ only).
+
+This module is not imported by the :mod:`quadriga` package itself, so the rest
+of the package stays importable on Python 2.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import json
+
+from quadriga import QuadrigaClient
+from quadriga.exceptions import RequestError
+from quadriga.orderbook import OrderBook
+from quadriga.rest_client import RestClient
+
+
+class AsyncResponse(object):
+    """Minimal HTTP response returned by asynchronous transports.
+
+    It exposes the subset of :class:`requests.models.Response` used by
+    :meth:`quadriga.rest_client.RestClient._handle_response`.
+
+    :param url: the request URL
+    :type url: str | unicode
+    :param status_code: the HTTP status code
+    :type status_code: int
+    :param reason: the HTTP reason phrase
+    :type reason: str | unicode
+    :param headers: the response headers
+    :type headers: dict
+    :param content: the raw response body
+    :type content: bytes
+    """
+
+    def __init__(self, url, status_code, reason, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        """Return the response body decoded as UTF-8.
+
+        :returns: the response body
+        :rtype: str | unicode
+        """
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        """Decode the response body as JSON.
+
+        :returns: the decoded response body
+        :rtype: dict | list
+        :raises ValueError: if the body is not valid JSON
+        """
+        return json.loads(self.text)
+
+
+class AiohttpTransport(object):
+    """Asynchronous transport backed by an :mod:`aiohttp` client session.
+
+    :param pool_size: the maximum number of simultaneous connections
+    :type pool_size: int
+    """
+
+    def __init__(self, pool_size=100):
+        import aiohttp  # Optional dependency
+        self._aiohttp = aiohttp
+        self._pool_size = pool_size
+        self._session = None
+
+    async def request(self, method, url, params=None, json=None):
+        """Send an HTTP request.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        :param url: the request URL
+        :type url: str | unicode
+        :param params: the query string parameters
+        :type params: dict
+        :param json: the JSON request body
+        :type json: dict
+        :returns: the HTTP response
+        :rtype: quadriga.aio.AsyncResponse
+        """
+        if self._session is None:
+            self._session = self._aiohttp.ClientSession(
+                connector=self._aiohttp.TCPConnector(limit=self._pool_size)
+            )
+        async with self._session.request(
+                method, url, params=params, json=json) as response:
+            return AsyncResponse(
+                url=str(response.url),
+                status_code=response.status,
+                reason=response.reason,
+                headers=dict(response.headers),
+                content=await response.read()
+            )
+
+    async def close(self):
+        """Close the client session and its connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class ThreadedTransport(object):
+    """Asynchronous transport which runs a pooled :mod:`requests` session in
+    the event loop's default executor.
+
+    This is the fallback used when :mod:`aiohttp` is not installed. Its
+    concurrency is bounded by the size of the executor.
+
+    :param pool_size: the maximum number of keep-alive connections
+    :type pool_size: int
+    """
+
+    def __init__(self, pool_size=10):
+        self._rest_client = RestClient(pool_size=pool_size)
+
+    async def request(self, method, url, params=None, json=None):
+        """Send an HTTP request.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        :param url: the request URL
+        :type url: str | unicode
+        :param params: the query string parameters
+        :type params: dict
+        :param json: the JSON request body
+        :type json: dict
+        :returns: the HTTP response
+        :rtype: requests.models.Response
+        """
+        session = self._rest_client._get_session()
+        loop = asyncio.get_event_loop()
+        if method == 'GET':
+            return await loop.run_in_executor(
+                None, lambda: session.get(url=url, params=params)
+            )
+        return await loop.run_in_executor(
+            None, lambda: session.post(url=url, json=json)
+        )
+
+    async def close(self):
+        """Close the underlying session and its connections."""
+        self._rest_client.close()
+
+
+def default_transport():
+    """Return the best available asynchronous transport.
+
+    :returns: an :class:`AiohttpTransport` if :mod:`aiohttp` is installed,
+        otherwise a :class:`ThreadedTransport`
+    :rtype: quadriga.aio.AiohttpTransport | quadriga.aio.ThreadedTransport
+    """
+    try:
+        return AiohttpTransport()
+    except ImportError:
+        return ThreadedTransport()
+
+
+class AsyncRestClient(RestClient):
+    """Asynchronous counterpart of :class:`quadriga.rest_client.RestClient`.
+
+    Signing and response handling are shared with the synchronous client;
+    only the transport differs.
+
+    :param api_key: the API key from QuadrigaCX
+    :type api_key: str | unicode
+    :param api_secret: the API secret from QuadrigaCX
+    :type api_secret: str | unicode
+    :param client_id: the QuadrigaCX client ID
+    :type client_id: str | unicode
+    :param transport: the asynchronous transport, which must provide the
+        coroutines ``request(method, url, params, json)`` and ``close()``
+        (defaults to :func:`default_transport`)
+    :param decoder: the response decoder (see :mod:`quadriga.decoders`)
+    :type decoder: str | unicode | callable
+    :param nonce_generator: the source of nonces for signed requests, which
+        must be shared by everything signing with the same API key
+        (defaults to a new thread-safe generator)
+    :type nonce_generator: quadriga.nonce.NonceGenerator
+    """
+
+    def __init__(self,
+                 api_key=None,
+                 api_secret=None,
+                 client_id=None,
+                 transport=None,
+                 decoder='json',
+                 nonce_generator=None):
+        super(AsyncRestClient, self).__init__(
+            api_key=api_key,
+            api_secret=api_secret,
+            client_id=client_id,
+            decoder=decoder,
+            nonce_generator=nonce_generator
+        )
+        self._transport = transport or default_transport()
+
+    async def get(self, endpoint, params=None):
+        """Send an HTTP GET request to QuadrigaCX.
+
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :param params: the request parameters
+        :type params: dict
+        :returns: the JSON response body from QuadrigaCX
+        :rtype: dict
+        """
+        response = await self._transport.request(
+            'GET',
+            self.endpoint_prefix + endpoint,
+            params=params
+        )
+        return self._handle_response(response)
+
+    async def post(self, endpoint, payload=None):
+        """Send an HTTP POST request to QuadrigaCX.
+
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :param payload: the request payload
+        :type payload: dict
+        :return: the JSON response body from QuadrigaCX
+        :rtype: dict
+        """
+        for attempt in range(self.nonce_retries + 1):
+            response = await self._transport.request(
+                'POST',
+                self.endpoint_prefix + endpoint,
+                json=self._sign_payload(payload)
+            )
+            try:
+                return self._handle_response(response)
+            except RequestError as exc:
+                if not self._should_resign(exc, attempt):
+                    raise
+
+    async def close(self):
+        """Close the transport and its connections."""
+        await self._transport.close()
+
+
+class AsyncTradeIterator(object):
+    """Asynchronous iterator over user's completed trades, oldest first.
+
+    This is what :meth:`AsyncQuadrigaClient.iter_trades` returns. It is a
+    class rather than an asynchronous generator, which needs Python 3.6.
+
+    :param fetch: the coroutine function returning the page of trades at
+        an offset
+    :type fetch: callable
+    :param offset: the offset of the first page
+    :type offset: int
+    :param since: skip the trades made before this time
+    :type since: str | unicode | None
+    :param page_size: the number of trades fetched per request
+    :type page_size: int
+    :param prefetch: fetch the next page while the current one is consumed
+    :type prefetch: bool
+    :param checkpoint: the checkpoint to update
+    :type checkpoint: quadriga.checkpoint.FileCheckpoint | None
+    """
+
+    def __init__(self, fetch, offset, since, page_size, prefetch, checkpoint):
+        self._fetch = fetch
+        self._offset = offset
+        self._since = since
+        self._page_size = page_size
+        self._prefetch = prefetch
+        self._checkpoint = checkpoint
+        self._page = None
+        self._index = 0
+        self._next_page = None
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._done:
+            if self._page is None:
+                self._page = await (self._next_page or
+                                    self._fetch(self._offset))
+                self._index, self._next_page = 0, None
+                if self._prefetch and len(self._page) == self._page_size:
+                    self._next_page = asyncio.ensure_future(
+                        self._fetch(self._offset + self._page_size)
+                    )
+            if self._index < len(self._page):
+                trade = self._page[self._index]
+                self._index += 1
+                if self._since is None or trade['datetime'] >= self._since:
+                    return trade
+                continue
+            self._offset += len(self._page)
+            if self._checkpoint is not None:
+                self._checkpoint.save(self._offset)
+            self._done = len(self._page) < self._page_size
+            self._page = None
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        """Stop iterating, cancelling the page being prefetched."""
+        self._done = True
+        if self._next_page is not None:
+            self._next_page.cancel()
+            self._next_page = None
+
+
+class AsyncQuadrigaClient(QuadrigaClient):
+    """Asyncio client for QuadrigaCX API v2.
+
+    It has the same methods as :class:`quadriga.QuadrigaClient`, but the API
+    calls return coroutines. Arguments are still validated eagerly, so an
+    invalid order book raises before anything is awaited:
+
+    .. code-block:: python
+
+        async with AsyncQuadrigaClient(default_book='btc_cad') as client:
+            summaries = await asyncio.gather(*(
+                client.get_summary(book) for book in client.order_books
+            ))
+
+    :param api_key: QuadrigaCX API key
+    :type api_key: str | unicode
+    :param api_secret: QuadrigaCX API secret
+    :type api_secret: str | unicode
+    :param client_id: QuadrigaCX client ID
+    :type client_id: str | unicode
+    :param default_book: the default order book
+    :type default_book: str | unicode
+    :param transport: the asynchronous transport (defaults to
+        :func:`default_transport`)
+    :param decoder: the response decoder (see :mod:`quadriga.decoders`)
+    :type decoder: str | unicode | callable
+    :param nonce_generator: the source of nonces for signed requests, which
+        must be shared by everything signing with the same API key
+    :type nonce_generator: quadriga.nonce.NonceGenerator
+    """
+
+    def __init__(self,
+                 api_key=None,
+                 api_secret=None,
+                 client_id=None,
+                 default_book='eth_cad',
+                 transport=None,
+                 decoder='json',
+                 nonce_generator=None):
+        super(AsyncQuadrigaClient, self).__init__(
+            api_key=api_key,
+            api_secret=api_secret,
+            client_id=client_id,
+            default_book=default_book,
+            nonce_generator=nonce_generator
+        )
+        self._rest_client = AsyncRestClient(
+            api_key=api_key,
+            api_secret=api_secret,
+            client_id=client_id,
+            transport=transport,
+            decoder=decoder,
+            nonce_generator=nonce_generator
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def close(self):
+        """Close the client and release its transport."""
+        self._log('close client')
+        await self._rest_client.close()
+
+    async def get_order_book(self, group=True, book=None):
+        """Return all public open orders as a columnar order book.
+
+        :param group: group orders with the same price
+        :type group: bool
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the order book
+        :rtype: quadriga.orderbook.OrderBook
+        """
+        book = self._verify_book(book)
+        return OrderBook.from_response(
+            await self.get_public_orders(group=group, book=book), book=book
+        )
+
+    async def get_many(self, method, books=None, **kwargs):
+        """Call a per-book method concurrently for several order books.
+
+        A failed request does not fail the batch: the exception raised for
+        that order book is returned in place of its result.
+
+        :param method: the name of a read-only per-book method (e.g.
+            ``"get_summary"`` or ``"get_public_orders"``)
+        :type method: str | unicode
+        :param books: the names of the order books (defaults to all books)
+        :type books: [str | unicode]
+        :param kwargs: additional keyword arguments for the method
+        :returns: the result or exception for each order book, keyed by book
+        :rtype: dict
+        :raises ValueError: on a method which cannot be fanned out
+        :raises InvalidOrderBookError: on invalid order book name
+        """
+        func, books = self._verify_book_method(method, books)
+        self._log('call {} for {}'.format(method, ', '.join(books)))
+
+        results = await asyncio.gather(
+            *(func(book=book, **kwargs) for book in books),
+            return_exceptions=True
+        )
+        return dict(zip(books, results))
+
+    def iter_trades(self,
+                    book=None,
+                    since=None,
+                    page_size=100,
+                    prefetch=True,
+                    checkpoint=None):
+        """Iterate asynchronously over all of user's completed trades.
+
+        This is the asynchronous counterpart of
+        :meth:`quadriga.QuadrigaClient.iter_trades`, with the same
+        arguments; the next page is prefetched on the event loop:
+
+        .. code-block:: python
+
+            async for trade in client.iter_trades(page_size=1000):
+                ...
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param since: skip the trades made before this time
+        :type since: datetime.datetime | str | unicode
+        :param page_size: the number of trades fetched per request
+        :type page_size: int
+        :param prefetch: fetch the next page while the current one is consumed
+        :type prefetch: bool
+        :param checkpoint: the checkpoint to resume from and update
+        :type checkpoint: quadriga.checkpoint.FileCheckpoint
+        :returns: user's completed trades, oldest first
+        :rtype: quadriga.aio.AsyncTradeIterator
+        """
+        book = self._verify_book(book)
+        if hasattr(since, 'strftime'):
+            since = since.strftime('%Y-%m-%d %H:%M:%S')
+        offset = 0 if checkpoint is None else checkpoint.offset
+        self._log("iterate over user's completed trades for {} from {}"
+                  .format(book, offset))
+
+        def fetch(offset):
+            return self.get_trades(
+                limit=page_size, offset=offset, sort='asc', book=book
+            )
+
+        return AsyncTradeIterator(fetch, offset, since, page_size, prefetch,
+                                  checkpoint)
+
+    async def _call_many(self, calls):
+        """Run calls concurrently on the event loop.
+
+        This makes :meth:`place_orders` and :meth:`cancel_orders` return
+        coroutines.
+
+        :param calls: the functions returning awaitables, called without
+            arguments
+        :type calls: [callable]
+        :returns: the result or exception of each call, in the same order
+        :rtype: list
+        """
+        async def run(call):
+            return await call()
+
+        return await asyncio.gather(
+            *(run(call) for call in calls), return_exceptions=True
+        )
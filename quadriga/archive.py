@@ -0,0 +1,388 @@
+"""Compressed archive of recorded order books, partitioned by book and day.
+
+Snapshots recorded into a :class:`quadriga.storage.OrderBookStore` (or a
+:class:`quadriga.binlog.BinaryLog`) are rolled into one file per order book
+and UTC day, under ``<root>/<book>/<YYYY-MM-DD>.qarc``. Each file is a
+sequence of independent blocks of up to **block_size** price levels, so a
+partition can be appended to by later runs and read one block at a time.
+
+Within a block the levels are stored by column: the timestamps and prices
+as differences from the previous level, which are mostly zero or small, and
+the amounts and sides as they are. The bytes of each 64-bit column are
+grouped by significance before the block is compressed with zlib, which
+turns the zero high bytes of small numbers into long runs:
+
+.. code-block:: python
+
+    archive_database('quadrigaData.db', 'archive', end=yesterday)
+
+    reader = ArchiveReader('archive')
+    for timestamp, side, amount, price in reader.range('btc_cad', start, end):
+        ...
+"""
+from __future__ import absolute_import, unicode_literals
+
+import calendar
+import os
+import struct
+import time
+import zlib
+
+from quadriga.compat import accumulate
+from quadriga.exceptions import ArchiveError
+from quadriga.storage import OrderBookStore
+
+
+MAGIC = b'QGAARC01'
+
+# Header of each block: the length of the compressed columns, the number of
+# levels, and the first and last timestamps
+_BLOCK = struct.Struct('<IIqq')
+
+SUFFIX = '.qarc'
+_DAY = 86400
+
+
+def _partition(root, book, day):
+    """Return the path of the partition of a book and day.
+
+    :param root: the directory of the archive
+    :type root: str | unicode
+    :param book: the name of the order book
+    :type book: str | unicode
+    :param day: the number of days since the epoch
+    :type day: int
+    :returns: the path to the partition
+    :rtype: str | unicode
+    """
+    name = time.strftime('%Y-%m-%d', time.gmtime(day * _DAY))
+    return os.path.join(root, book, name + SUFFIX)
+
+
+def _column(values):
+    """Pack integers into a little-endian column of 64-bit integers.
+
+    :param values: the integers
+    :type values: [int]
+    :returns: the bytes of the column, grouped by significance
+    :rtype: bytes
+    """
+    data = struct.pack('<{}q'.format(len(values)), *values)
+    return b''.join(data[byte::8] for byte in range(8))
+
+
+def _uncolumn(data):
+    """Unpack a column packed by :func:`_column`.
+
+    :param data: the bytes of the column
+    :type data: bytes
+    :returns: the integers
+    :rtype: (int,)
+    """
+    count = len(data) // 8
+    interleaved = bytearray(len(data))
+    for byte in range(8):
+        interleaved[byte::8] = data[byte * count:(byte + 1) * count]
+    return struct.unpack('<{}q'.format(count), bytes(interleaved))
+
+
+def _repair(path):
+    """Truncate a partition after its last complete block.
+
+    A run interrupted while writing a block leaves it incomplete, and any
+    block appended after it could not be read.
+
+    :param path: the path to the partition
+    :type path: str | unicode
+    :returns: the last timestamp archived in the partition, or ``None`` if
+        it has no complete block
+    :rtype: int | None
+    :raises ArchiveError: if the file is not a partition
+    """
+    with open(path, 'r+b') as stream:
+        magic = stream.read(len(MAGIC))
+        if magic != MAGIC:
+            if not MAGIC.startswith(magic):
+                raise ArchiveError('Not an archive partition: ' + path)
+            # Interrupted before its first block
+            stream.truncate(0)
+            return None
+        stream.seek(0, os.SEEK_END)
+        end = stream.tell()
+        size, last = len(MAGIC), None
+        while size + _BLOCK.size <= end:
+            stream.seek(size)
+            length, _, _, high = _BLOCK.unpack(stream.read(_BLOCK.size))
+            if size + _BLOCK.size + length > end:
+                break
+            size += _BLOCK.size + length
+            last = high
+        if size < end:
+            stream.truncate(size)
+    return last
+
+
+def encode_block(rows, level=6):
+    """Encode snapshot rows of an order book as a compressed block.
+
+    :param rows: the ``(timeStamp, type, amount, price)`` rows, in
+        chronological order
+    :type rows: [tuple]
+    :param level: the zlib compression level
+    :type level: int
+    :returns: the block, with its header
+    :rtype: bytes
+    """
+    timestamps, sides, amounts, prices = zip(*rows)
+    deltas = [timestamps[0]]
+    deltas.extend(timestamps[index] - timestamps[index - 1]
+                  for index in range(1, len(rows)))
+    changes = [prices[0]]
+    changes.extend(prices[index] - prices[index - 1]
+                   for index in range(1, len(rows)))
+    data = zlib.compress(b''.join((
+        _column(deltas), _column(amounts), _column(changes),
+        bytes(bytearray(sides)),
+    )), level)
+    return _BLOCK.pack(len(data), len(rows), timestamps[0],
+                       timestamps[-1]) + data
+
+
+def decode_block(data, count):
+    """Decode the compressed columns of a block.
+
+    :param data: the compressed columns, after the block header
+    :type data: bytes
+    :param count: the number of levels in the block
+    :type count: int
+    :returns: the timestamps, sides, amounts and prices
+    :rtype: ([int], [int], (int,), [int])
+    """
+    data = zlib.decompress(data)
+    size = count * 8
+    timestamps = list(accumulate(_uncolumn(data[:size])))
+    amounts = _uncolumn(data[size:2 * size])
+    prices = list(accumulate(_uncolumn(data[2 * size:3 * size])))
+    sides = list(bytearray(data[3 * size:]))
+    return timestamps, sides, amounts, prices
+
+
+class ArchiveWriter(object):
+    """Writer of snapshot rows into the partitions of an archive.
+
+    Rows are buffered per partition and written as a block whenever
+    **block_size** of them are buffered, and when the writer is closed.
+    The rows of each partition must be written in chronological order. Rows
+    at or before the last timestamp already archived in their partition are
+    skipped, so a time range can be archived again without duplicating it.
+    A block left incomplete by an interrupted run is discarded before the
+    partition is appended to.
+
+    :param root: the directory of the archive, created if needed
+    :type root: str | unicode
+    :param block_size: the maximum number of levels per block
+    :type block_size: int
+    :param level: the zlib compression level
+    :type level: int
+    """
+
+    def __init__(self, root, block_size=16384, level=6):
+        self._root = root
+        self._block_size = block_size
+        self._level = level
+        self._buffers = {}
+        # Last timestamp archived in each partition, checked by _repair
+        self._archived = {}
+        self.rows = 0
+        self.bytes = 0
+        self.skipped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _flush(self, book, day):
+        """Write the rows buffered for a partition as a block.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param day: the number of days since the epoch
+        :type day: int
+        """
+        rows = self._buffers.pop((book, day))
+        path = _partition(self._root, book, day)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        block = encode_block(rows, self._level)
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        with open(path, 'ab') as stream:
+            if new:
+                stream.write(MAGIC)
+                self.bytes += len(MAGIC)
+            stream.write(block)
+        self.rows += len(rows)
+        self.bytes += len(block)
+
+    def write_rows(self, rows):
+        """Buffer snapshot rows, writing the blocks which are full.
+
+        :param rows: the ``(timeStamp, type, amount, price, book)`` rows, as
+            returned by :func:`quadriga.storage.snapshot_rows`
+        :type rows: collections.Iterable[tuple]
+        """
+        for timestamp, side, amount, price, book in rows:
+            key = (book, timestamp // _DAY)
+            try:
+                archived = self._archived[key]
+            except KeyError:
+                path = _partition(self._root, *key)
+                archived = self._archived[key] = (
+                    _repair(path) if os.path.exists(path) else None
+                )
+            if archived is not None and timestamp <= archived:
+                self.skipped += 1
+                continue
+            buffer = self._buffers.setdefault(key, [])
+            buffer.append((timestamp, side, amount, price))
+            if len(buffer) >= self._block_size:
+                self._flush(*key)
+
+    def close(self):
+        """Write the rows left in the buffers."""
+        for key in sorted(self._buffers):
+            self._flush(*key)
+
+
+def archive_database(db_path, root, start=None, end=None, block_size=16384,
+                     level=6):
+    """Archive the full snapshots of a recorder database.
+
+    The rows are appended to the partitions, skipping those at or before
+    the last timestamp already archived in their partition, so successive
+    runs may archive overlapping ranges.
+
+    :param db_path: the path to the SQLite database
+    :type db_path: str | unicode
+    :param root: the directory of the archive
+    :type root: str | unicode
+    :param start: the first UNIX timestamp (inclusive), or ``None``
+    :type start: int | None
+    :param end: the last UNIX timestamp (inclusive), or ``None``
+    :type end: int | None
+    :param block_size: the maximum number of levels per block
+    :type block_size: int
+    :param level: the zlib compression level
+    :type level: int
+    :returns: the number of levels archived and of bytes written
+    :rtype: (int, int)
+    """
+    start = 0 if start is None else start
+    end = 2 ** 63 - 1 if end is None else end
+    with OrderBookStore(db_path) as store:
+        with ArchiveWriter(root, block_size, level) as writer:
+            for book in store.books():
+                writer.write_rows(
+                    (timestamp, side, amount, price, book)
+                    for timestamp, side, amount, price
+                    in store.range(book, start, end)
+                )
+    return writer.rows, writer.bytes
+
+
+class ArchiveReader(object):
+    """Streaming reader of an archive.
+
+    Only the blocks overlapping the requested time range are read and
+    decompressed, one at a time.
+
+    :param root: the directory of the archive
+    :type root: str | unicode
+    """
+
+    def __init__(self, root):
+        self._root = root
+
+    def books(self):
+        """Return the names of the archived order books.
+
+        :returns: the names of the order books
+        :rtype: [str | unicode]
+        """
+        if not os.path.isdir(self._root):
+            return []
+        return sorted(name for name in os.listdir(self._root)
+                      if os.path.isdir(os.path.join(self._root, name)))
+
+    def days(self, book):
+        """Return the days archived for an order book.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the ``YYYY-MM-DD`` dates in chronological order
+        :rtype: [str | unicode]
+        """
+        directory = os.path.join(self._root, book)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len(SUFFIX)] for name in os.listdir(directory)
+                      if name.endswith(SUFFIX))
+
+    def blocks(self, book, start=None, end=None):
+        """Stream the decoded blocks overlapping a time range.
+
+        The blocks may hold levels outside of the range.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param start: the first UNIX timestamp (inclusive), or ``None``
+        :type start: int | None
+        :param end: the last UNIX timestamp (inclusive), or ``None``
+        :type end: int | None
+        :returns: the timestamps, sides, amounts and prices of each block
+        :rtype: collections.Iterator[tuple]
+        :raises ArchiveError: if a file of the archive is not a partition
+        """
+        for date in self.days(book):
+            first = calendar.timegm(time.strptime(date, '%Y-%m-%d'))
+            if ((start is not None and first + _DAY <= start) or
+                    (end is not None and first > end)):
+                continue
+            path = os.path.join(self._root, book, date + SUFFIX)
+            with open(path, 'rb') as stream:
+                if stream.read(len(MAGIC)) != MAGIC:
+                    raise ArchiveError('Not an archive partition: ' + path)
+                while True:
+                    header = stream.read(_BLOCK.size)
+                    if len(header) < _BLOCK.size:
+                        break
+                    size, count, low, high = _BLOCK.unpack(header)
+                    if ((start is not None and high < start) or
+                            (end is not None and low > end)):
+                        stream.seek(size, os.SEEK_CUR)
+                        continue
+                    data = stream.read(size)
+                    if len(data) < size:
+                        # Left incomplete by an interrupted run
+                        break
+                    yield decode_block(data, count)
+
+    def range(self, book, start=None, end=None):
+        """Stream the archived rows of a time range.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param start: the first UNIX timestamp (inclusive), or ``None``
+        :type start: int | None
+        :param end: the last UNIX timestamp (inclusive), or ``None``
+        :type end: int | None
+        :returns: the ``(timeStamp, type, amount, price)`` rows in
+            chronological order
+        :rtype: collections.Iterator[tuple]
+        """
+        for block in self.blocks(book, start, end):
+            for row in zip(*block):
+                if ((start is None or row[0] >= start) and
+                        (end is None or row[0] <= end)):
+                    yield row
@@ -0,0 +1,476 @@
+"""Append-only binary log of order book snapshots.
+
+An alternative to :class:`quadriga.storage.OrderBookStore` for recording
+full snapshots which are mostly scanned in bulk (e.g. by backtests). Each
+price level is a fixed-width record of 32 bytes, appended in chronological
+order after a header of 4 KiB holding the names of the order books:
+
+====== ====== =======================================================
+offset type   field
+====== ====== =======================================================
+0      int64  ``timestamp``: the UNIX timestamp of the snapshot
+8      int64  ``amount``: the amount
+16     int64  ``price``: the price
+24     uint16 ``book``: the index of the order book in the header
+26     uint8  ``side``: 0 for bids, 1 for asks
+====== ====== =======================================================
+
+All integers are little-endian, and amounts and prices are at the scales of
+:func:`quadriga.storage.storage_places` for their book. A sparse index next
+to the log (its path with ``.idx`` appended) holds the timestamp of the
+first record of every block of records, so a time range is found in a few
+reads:
+
+.. code-block:: python
+
+    with BinaryLog('orders.qlog') as log:
+        log.insert_snapshots([('btc_cad', client.get_public_orders())])
+
+    reader = BinaryLogReader('orders.qlog')
+    records = reader.records(start, end)   # NumPy view of the mapped file
+    bids = records[(records['book'] == reader.book_id('btc_cad')) &
+                   (records['side'] == 0)]
+"""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import mmap
+import os
+import struct
+from bisect import bisect_left, bisect_right
+
+from quadriga.delta import BID
+from quadriga.exceptions import BinaryLogError
+from quadriga.storage import snapshot_rows
+
+MAGIC = b'QGABLOG1'
+
+# The header, padded to a page so the records stay aligned in memory: the
+# magic, the record size, the index interval, the number of order books,
+# and the names of the order books
+HEADER_SIZE = 4096
+_HEADER = struct.Struct('<8sIII')
+_NAME = struct.Struct('<16s')
+MAX_BOOKS = (HEADER_SIZE - _HEADER.size) // _NAME.size
+
+RECORD = struct.Struct('<qqqHB5x')
+_TIMESTAMP = struct.Struct('<q')
+
+# Entries of the sparse index: a timestamp and a record number
+_ENTRY = struct.Struct('<qq')
+
+
+def record_dtype():
+    """Return the NumPy dtype of the records.
+
+    :returns: the structured dtype, with the fields of :data:`RECORD`
+    :rtype: numpy.dtype
+    """
+    import numpy as np
+    return np.dtype({
+        'names': ['timestamp', 'amount', 'price', 'book', 'side'],
+        'formats': ['<i8', '<i8', '<i8', '<u2', 'u1'],
+        'offsets': [0, 8, 16, 24, 26],
+        'itemsize': RECORD.size,
+    })
+
+
+def _read_header(stream, path):
+    """Read and check the header of a log.
+
+    :param stream: the log file, positioned at its start
+    :type stream: file
+    :param path: the path to the log, for error messages
+    :type path: str | unicode
+    :returns: the index interval and the names of the order books
+    :rtype: (int, [str | unicode])
+    :raises BinaryLogError: if the file is not a log
+    """
+    header = stream.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise BinaryLogError('Truncated snapshot log header: ' + path)
+    magic, record_size, interval, count = _HEADER.unpack_from(header)
+    if magic != MAGIC or record_size != RECORD.size:
+        raise BinaryLogError('Not a snapshot log: ' + path)
+    books = []
+    for index in range(count):
+        name = _NAME.unpack_from(header, _HEADER.size + index * _NAME.size)
+        books.append(name[0].rstrip(b'\0').decode('ascii'))
+    return interval, books
+
+
+class BinaryLog(object):
+    """Writer appending order book snapshots to a binary log.
+
+    It can replace :class:`quadriga.storage.OrderBookStore` as the store of
+    :class:`quadriga.recorder.OrderBookRecorder` and
+    :class:`quadriga.collector.ParallelCollector` (as **store_class**), but
+    only records full snapshots, and the collector must then have a single
+    worker process.
+
+    A log must only have one writer at a time. Records are appended in
+    chronological order: each batch is sorted by time, and the levels of any
+    snapshot older than the last one written are dropped with a warning. A
+    record or index entry left incomplete by a crash is discarded when the
+    log is opened again.
+
+    :param path: the path to the log, created if it does not exist
+    :type path: str | unicode
+    :param index_interval: the number of records per entry of the sparse
+        index, for a new log
+    :type index_interval: int
+    :raises BinaryLogError: if the file exists and is not a log
+    """
+
+    # Snapshots written out of order are dropped
+    chronological = True
+
+    def __init__(self, path, index_interval=4096):
+        self._logger = logging.getLogger('quadriga')
+        self._path = path
+        if not os.path.exists(path) or not os.path.getsize(path):
+            with open(path, 'wb') as stream:
+                stream.write(_HEADER.pack(MAGIC, RECORD.size, index_interval,
+                                          0).ljust(HEADER_SIZE, b'\0'))
+        self._file = open(path, 'r+b')
+        self.index_interval, books = _read_header(self._file, path)
+        self._books = {name: index for index, name in enumerate(books)}
+
+        self._file.seek(0, os.SEEK_END)
+        self.count = (self._file.tell() - HEADER_SIZE) // RECORD.size
+        self._file.truncate(HEADER_SIZE + self.count * RECORD.size)
+        self.last_timestamp = None
+        if self.count:
+            self.last_timestamp = self._timestamp(self.count - 1)
+
+        self._index = open(path + '.idx', 'a+b')
+        self._index.seek(0, os.SEEK_END)
+        entries = self._index.tell() // _ENTRY.size
+        self._index.truncate(entries * _ENTRY.size)
+        for number in range(entries * self.index_interval, self.count,
+                            self.index_interval):
+            self._index.write(_ENTRY.pack(self._timestamp(number), number))
+        self._index.flush()
+        self._file.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Close the log and its index."""
+        self._file.close()
+        self._index.close()
+
+    def _timestamp(self, number):
+        """Read the timestamp of a record.
+
+        :param number: the number of the record
+        :type number: int
+        :returns: the UNIX timestamp
+        :rtype: int
+        """
+        self._file.seek(HEADER_SIZE + number * RECORD.size)
+        return _TIMESTAMP.unpack(self._file.read(_TIMESTAMP.size))[0]
+
+    def _book_id(self, book):
+        """Return the index of an order book, adding it to the header.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the index of the order book
+        :rtype: int
+        :raises BinaryLogError: if the header has no room for the book
+        """
+        try:
+            return self._books[book]
+        except KeyError:
+            pass
+        index = len(self._books)
+        if index >= MAX_BOOKS:
+            raise BinaryLogError('Too many order books in ' + self._path)
+        self._file.seek(_HEADER.size + index * _NAME.size)
+        self._file.write(_NAME.pack(book.encode('ascii')))
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, RECORD.size,
+                                      self.index_interval, index + 1))
+        self._file.seek(0, os.SEEK_END)
+        self._books[book] = index
+        return index
+
+    def insert_snapshots(self, snapshots):
+        """Append full snapshots.
+
+        :param snapshots: the ``(book, snapshot)`` pairs, where each snapshot
+            is a response from
+            :meth:`quadriga.QuadrigaClient.get_public_orders`
+        :type snapshots: [tuple]
+        :returns: the number of records appended
+        :rtype: int
+        """
+        rows = []
+        for book, snapshot in snapshots:
+            rows.extend(snapshot_rows(book, snapshot))
+        return self.insert_rows(rows)
+
+    def insert_rows(self, rows):
+        """Append snapshot rows.
+
+        :param rows: the ``(timeStamp, type, amount, price, book)`` rows, as
+            returned by :func:`quadriga.storage.snapshot_rows`
+        :type rows: [tuple]
+        :returns: the number of records appended
+        :rtype: int
+        """
+        rows = sorted(rows, key=lambda row: row[0])
+        if self.last_timestamp is not None:
+            stale = bisect_left([row[0] for row in rows], self.last_timestamp)
+            if stale:
+                self._logger.warning(
+                    '[binlog: {}] dropped {} levels older than {}'
+                    .format(self._path, stale, self.last_timestamp)
+                )
+                rows = rows[stale:]
+        if not rows:
+            return 0
+
+        records = bytearray(len(rows) * RECORD.size)
+        entries = []
+        for offset, (timestamp, side, amount, price, book) in enumerate(rows):
+            RECORD.pack_into(records, offset * RECORD.size, timestamp,
+                             amount, price, self._book_id(book), side)
+            if (self.count + offset) % self.index_interval == 0:
+                entries.append(_ENTRY.pack(timestamp, self.count + offset))
+        self._file.write(records)
+        self._file.flush()
+        self._index.write(b''.join(entries))
+        self._index.flush()
+        self.count += len(rows)
+        self.last_timestamp = rows[-1][0]
+        return len(rows)
+
+
+class BinaryLogReader(object):
+    """Memory-mapped reader of a binary log.
+
+    The reader sees the records appended up to its creation, or to the last
+    call to :meth:`refresh`. The arrays returned by :meth:`records` are
+    views of the mapped file, and remain valid after the reader is closed.
+
+    :param path: the path to the log
+    :type path: str | unicode
+    :raises BinaryLogError: if the file is not a log
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._map = None
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """Unmap the log, unless arrays still refer to it."""
+        try:
+            self._map.close()
+        except BufferError:
+            # Arrays returned by records() still use the mapping, which is
+            # closed when they are garbage collected
+            pass
+
+    def refresh(self):
+        """Map the records appended since the reader was created."""
+        with open(self._path, 'rb') as stream:
+            self.index_interval, self._books = _read_header(stream, self._path)
+            stream.seek(0, os.SEEK_END)
+            self._count = (stream.tell() - HEADER_SIZE) // RECORD.size
+            if self._map is not None:
+                self.close()
+            self._map = mmap.mmap(
+                stream.fileno(), HEADER_SIZE + self._count * RECORD.size,
+                access=mmap.ACCESS_READ
+            )
+
+        self._index_times, self._index_numbers = [], []
+        if os.path.exists(self._path + '.idx'):
+            with open(self._path + '.idx', 'rb') as stream:
+                index = stream.read()
+            for offset in range(0, len(index) - _ENTRY.size + 1, _ENTRY.size):
+                timestamp, number = _ENTRY.unpack_from(index, offset)
+                if number >= self._count:
+                    break
+                self._index_times.append(timestamp)
+                self._index_numbers.append(number)
+        # Index the records which the writer has not indexed yet
+        for number in range(len(self._index_numbers) * self.index_interval,
+                            self._count, self.index_interval):
+            self._index_times.append(self._timestamp(number))
+            self._index_numbers.append(number)
+
+    def books(self):
+        """Return the names of the order books in the log.
+
+        :returns: the names, in the order of their indexes
+        :rtype: [str | unicode]
+        """
+        return list(self._books)
+
+    def book_id(self, book):
+        """Return the index of an order book, as stored in the records.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the index, or ``None`` if the book was never recorded
+        :rtype: int | None
+        """
+        try:
+            return self._books.index(book)
+        except ValueError:
+            return None
+
+    def _timestamp(self, number):
+        """Read the timestamp of a record.
+
+        :param number: the number of the record
+        :type number: int
+        :returns: the UNIX timestamp
+        :rtype: int
+        """
+        return _TIMESTAMP.unpack_from(
+            self._map, HEADER_SIZE + number * RECORD.size
+        )[0]
+
+    def _search(self, timestamp, right=False):
+        """Find the first record after or at a time, using the index.
+
+        :param timestamp: the UNIX timestamp
+        :type timestamp: int
+        :param right: find the first record after the time, instead of at
+            or after it
+        :type right: bool
+        :returns: the number of the record
+        :rtype: int
+        """
+        entry = (bisect_right if right else bisect_left)(
+            self._index_times, timestamp
+        )
+        low = self._index_numbers[entry - 1] if entry else 0
+        high = self._count
+        if entry < len(self._index_numbers):
+            high = self._index_numbers[entry]
+        while low < high:
+            middle = (low + high) // 2
+            current = self._timestamp(middle)
+            if current < timestamp or (right and current == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _bounds(self, start, end):
+        """Return the numbers of the records in a time range.
+
+        :param start: the first UNIX timestamp (inclusive), or ``None``
+        :type start: int | None
+        :param end: the last UNIX timestamp (inclusive), or ``None``
+        :type end: int | None
+        :returns: the first record and the record after the last
+        :rtype: (int, int)
+        """
+        first = 0 if start is None else self._search(start)
+        last = self._count if end is None else self._search(end, right=True)
+        return first, max(first, last)
+
+    def records(self, start=None, end=None):
+        """Return the records of a time range without copying them.
+
+        NumPy must be installed.
+
+        :param start: the first UNIX timestamp (inclusive), or ``None`` to
+            start from the first record
+        :type start: int | None
+        :param end: the last UNIX timestamp (inclusive), or ``None`` to
+            end with the last record
+        :type end: int | None
+        :returns: a read-only view of the records, with the fields
+            ``timestamp``, ``amount``, ``price``, ``book`` and ``side``
+        :rtype: numpy.ndarray
+        """
+        import numpy as np
+        first, last = self._bounds(start, end)
+        return np.frombuffer(self._map, dtype=record_dtype(),
+                             count=last - first,
+                             offset=HEADER_SIZE + first * RECORD.size)
+
+    def range(self, start=None, end=None, book=None):
+        """Stream the records of a time range as rows.
+
+        :param start: the first UNIX timestamp (inclusive), or ``None``
+        :type start: int | None
+        :param end: the last UNIX timestamp (inclusive), or ``None``
+        :type end: int | None
+        :param book: the name of the order book, or ``None`` for all
+        :type book: str | unicode
+        :returns: the ``(timeStamp, type, amount, price, book)`` rows in
+            chronological order
+        :rtype: collections.Iterator[tuple]
+        """
+        first, last = self._bounds(start, end)
+        for number in range(first, last):
+            timestamp, amount, price, index, side = RECORD.unpack_from(
+                self._map, HEADER_SIZE + number * RECORD.size
+            )
+            if book is None or self._books[index] == book:
+                yield timestamp, side, amount, price, self._books[index]
+
+    def book_at(self, book, timestamp, max_age=86400):
+        """Return the order book as it was at the given time.
+
+        The records are searched backwards from the given time for the
+        latest snapshot of the order book, for at most **max_age** seconds.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param timestamp: the UNIX timestamp
+        :type timestamp: int
+        :param max_age: the maximum age in seconds of the snapshot, or
+            ``None`` to search back to the first record
+        :type max_age: int | None
+        :returns: the timestamp of the latest snapshot at or before the
+            given time, and its bids (highest first) and asks (lowest first)
+            as ``(price, amount)`` pairs, or ``None`` if nothing was recorded
+        :rtype: dict | None
+        """
+        index = self.book_id(book)
+        if index is None:
+            return None
+        first = 0 if max_age is None else self._search(timestamp - max_age)
+        last = self._search(timestamp, right=True)
+        for number in reversed(range(first, last)):
+            latest, _, _, current_book, _ = RECORD.unpack_from(
+                self._map, HEADER_SIZE + number * RECORD.size
+            )
+            if current_book == index:
+                break
+        else:
+            return None
+
+        bids, asks = [], []
+        for number in range(self._search(latest), number + 1):
+            _, amount, price, current_book, side = RECORD.unpack_from(
+                self._map, HEADER_SIZE + number * RECORD.size
+            )
+            if current_book == index:
+                (bids if side == BID else asks).append((price, amount))
+        bids.sort(reverse=True)
+        asks.sort()
+        return {'timestamp': latest, 'bids': bids, 'asks': asks}
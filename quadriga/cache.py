@@ -0,0 +1,121 @@
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from quadriga.compat import monotonic
+
+
+class ResponseCache(object):
+    """Thread-safe LRU cache for responses from public API endpoints.
+
+    Responses are keyed on the endpoint and the request parameters, and expire
+    after a per-endpoint time-to-live. Endpoints without a TTL are never
+    cached. Concurrent misses for the same key are coalesced, so only one
+    HTTP request is in flight for it at any time.
+
+    Cached responses are shared between callers and must not be mutated.
+
+    :param ttls: the time-to-live in seconds for each endpoint, merged into
+        :attr:`default_ttls` (use ``None`` to disable caching an endpoint)
+    :type ttls: dict
+    :param maxsize: the maximum number of cached responses
+    :type maxsize: int
+    :param clock: the function returning the current time in seconds
+    :type clock: callable
+    """
+
+    # Default time-to-live in seconds for each cacheable endpoint
+    default_ttls = {
+        '/ticker': 1.0,
+        '/order_book': 1.0,
+        '/transactions': 5.0,
+    }
+
+    def __init__(self, ttls=None, maxsize=256, clock=monotonic):
+        self._ttls = dict(self.default_ttls)
+        self._ttls.update(ttls or {})
+        self._maxsize = maxsize
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        """Return the cache counters.
+
+        :returns: the number of hits, misses, coalesced misses and entries
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'size': len(self._entries),
+            }
+
+    def clear(self):
+        """Remove all cached responses and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.coalesced = 0
+
+    def get_or_fetch(self, endpoint, params, fetch):
+        """Return the cached response, or fetch and cache a fresh one.
+
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :param params: the request parameters
+        :type params: dict
+        :param fetch: the function which sends the request
+        :type fetch: callable
+        :returns: the JSON response body
+        :rtype: dict | list
+        """
+        ttl = self._ttls.get(endpoint)
+        if ttl is None:
+            return fetch()
+
+        key = (endpoint, tuple(sorted((params or {}).items())))
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > self._clock():
+                self._entries[key] = entry  # Move to the MRU end
+                self.hits += 1
+                return entry[1]
+
+            future = self._pending.get(key)
+            leader = future is None
+            if leader:
+                self.misses += 1
+                future = self._pending[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except Exception as exc:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._pending[key]
+            self._entries[key] = (self._clock() + ttl, value)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
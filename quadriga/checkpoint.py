@@ -0,0 +1,42 @@
+from __future__ import absolute_import, unicode_literals
+
+from quadriga.compat import replace
+
+
+class FileCheckpoint(object):
+    """Position in a paginated history, persisted to a file.
+
+    It lets :meth:`quadriga.QuadrigaClient.iter_trades` resume where a
+    previous run stopped. The file is replaced atomically on every save, so
+    it is never left half-written by a crash.
+
+    :param path: the path to the checkpoint file
+    :type path: str | unicode
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def offset(self):
+        """Return the number of items consumed so far.
+
+        :returns: the saved offset, or 0 if nothing was saved yet
+        :rtype: int
+        """
+        try:
+            with open(self.path) as fp:
+                return int(fp.read().strip() or 0)
+        except IOError:
+            return 0
+
+    def save(self, offset):
+        """Persist the number of items consumed so far.
+
+        :param offset: the offset to resume from
+        :type offset: int
+        """
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            fp.write('{:d}\n'.format(offset))
+        replace(temp_path, self.path)
@@ -0,0 +1,511 @@
+"""Multi-process collector of order book snapshots into SQLite.
+
+:class:`ParallelCollector` shards the order books across worker processes.
+Each worker polls its books with its own :class:`quadriga.QuadrigaClient`,
+parses the snapshots into integer rows, and sends them as compact binary
+records (see :func:`encode_snapshot`) over a queue to a single writer
+process, which inserts them into a :class:`quadriga.storage.OrderBookStore`
+in large transactions. A supervisor thread restarts any process which dies,
+and the throughput of each process is tracked in shared memory:
+
+.. code-block:: python
+
+    collector = ParallelCollector('quadrigaData.db', processes=3,
+                                  interval=0.5, keyframe_interval=60)
+    with collector:
+        while True:
+            time.sleep(60)
+            print(collector.report())
+"""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import multiprocessing
+import struct
+import threading
+import time
+
+from quadriga import QuadrigaClient
+from quadriga.compat import monotonic, queue
+from quadriga.delta import ASK, BID, OrderBookDiffer
+from quadriga.storage import OrderBookStore, snapshot_rows
+
+# Header of an encoded snapshot, after the name of the book: the timestamp
+# and the numbers of bid and ask levels
+_HEADER = struct.Struct('<qII')
+
+# Marks the end of the snapshot queue
+_STOP = b''
+
+# Counters of each worker, and of the writer, in shared memory. Each counter
+# is only written by its own process, so they need no lock, which a process
+# killed while holding it would never release (the same goes for the flag
+# stopping the workers, instead of an event)
+_WORKER_COUNTERS = ('polls', 'errors', 'snapshots', 'bytes')
+_WRITER_COUNTERS = ('snapshots', 'rows')
+
+
+def encode_snapshot(book, snapshot):
+    """Encode an order book snapshot as a compact binary record.
+
+    Amounts and prices are parsed into the integers stored by
+    :func:`quadriga.storage.snapshot_rows`, and packed as little-endian
+    64-bit integers: 16 bytes per level instead of the 30 or so of the JSON.
+
+    :param book: the name of the order book
+    :type book: str | unicode
+    :param snapshot: the response from
+        :meth:`quadriga.QuadrigaClient.get_public_orders`
+    :type snapshot: dict
+    :returns: the record
+    :rtype: bytes
+    :raises ValueError: on an amount or price which cannot be stored exactly
+    """
+    name = book.encode('ascii')
+    values = []
+    for _, _, amount, price, _ in snapshot_rows(book, snapshot):
+        values.append(amount)
+        values.append(price)
+    return b''.join((
+        struct.pack('<B', len(name)),
+        name,
+        _HEADER.pack(int(snapshot['timestamp']), len(snapshot['bids']),
+                     len(snapshot['asks'])),
+        struct.pack('<{}q'.format(len(values)), *values),
+    ))
+
+
+def decode_snapshot(record):
+    """Decode a record encoded by :func:`encode_snapshot`.
+
+    :param record: the record
+    :type record: bytes
+    :returns: the name of the order book, the timestamp and the
+        ``(timeStamp, type, amount, price, book)`` rows of the snapshot
+    :rtype: (str | unicode, int, [tuple])
+    """
+    length = struct.unpack_from('<B', record)[0]
+    book = record[1:1 + length].decode('ascii')
+    offset = 1 + length
+    timestamp, bids, asks = _HEADER.unpack_from(record, offset)
+    offset += _HEADER.size
+    values = struct.unpack_from('<{}q'.format(2 * (bids + asks)), record,
+                                offset)
+    rows = []
+    for index in range(bids + asks):
+        rows.append((timestamp, BID if index < bids else ASK,
+                     values[2 * index], values[2 * index + 1], book))
+    return book, timestamp, rows
+
+
+def _increment(counters, index, value=1):
+    """Add to a counter in shared memory.
+
+    :param counters: the shared counters
+    :type counters: multiprocessing.RawArray
+    :param index: the index of the counter
+    :type index: int
+    :param value: the amount added
+    :type value: int
+    """
+    counters[index] += value
+
+
+def _sleep(seconds, stopping):
+    """Sleep unless the collector stops.
+
+    :param seconds: the number of seconds to sleep
+    :type seconds: int | float
+    :param stopping: the flag set when the collector stops
+    :type stopping: multiprocessing.RawValue
+    """
+    deadline = monotonic() + seconds
+    while not stopping.value:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 0.1))
+
+
+def _poll_books(books, client_options, interval, group, snapshots,
+                counters, offset, stopping):
+    """Poll a shard of order books until the collector stops.
+
+    This runs in each worker process.
+
+    :param books: the names of the order books of the shard
+    :type books: [str | unicode]
+    :param client_options: the keyword arguments of the client
+    :type client_options: dict
+    :param interval: the number of seconds between polls
+    :type interval: int | float
+    :param group: group orders with the same price
+    :type group: bool
+    :param snapshots: the queue of encoded snapshots
+    :type snapshots: multiprocessing.Queue
+    :param counters: the counters of all workers
+    :type counters: multiprocessing.RawArray
+    :param offset: the index of the first counter of this worker
+    :type offset: int
+    :param stopping: the flag set when the collector stops
+    :type stopping: multiprocessing.RawValue
+    """
+    logger = logging.getLogger('quadriga')
+    prefix = '[collector: {}]'.format(', '.join(books))
+    options = dict(client_options)
+    options.setdefault('default_book', books[0])
+    client = QuadrigaClient(**options)
+    deadline = monotonic()
+    try:
+        while not stopping.value:
+            results = client.get_many(
+                'get_public_orders', books=books, group=group
+            )
+            _increment(counters, offset)
+            for book in books:
+                result = results[book]
+                if isinstance(result, Exception):
+                    _increment(counters, offset + 1)
+                    logger.debug('{} failed to fetch {}: {}'
+                                 .format(prefix, book, result))
+                    continue
+                try:
+                    record = encode_snapshot(book, result)
+                except ValueError as exc:
+                    _increment(counters, offset + 1)
+                    logger.warning('{} cannot store {}: {}'
+                                   .format(prefix, book, exc))
+                    continue
+                while not stopping.value:
+                    try:
+                        snapshots.put(record, timeout=interval)
+                        break
+                    except queue.Full:
+                        logger.debug('{} queue full, waiting for the writer'
+                                     .format(prefix))
+                _increment(counters, offset + 2)
+                _increment(counters, offset + 3, len(record))
+            deadline += interval
+            _sleep(deadline - monotonic(), stopping)
+    finally:
+        client.close()
+
+
+def _write_snapshots(db_path, store_class, snapshots, keyframe_interval,
+                     batch_size, counters):
+    """Write the queued snapshots until the end of the queue.
+
+    This runs in the writer process.
+
+    :param db_path: the path to the database
+    :type db_path: str | unicode
+    :param store_class: the class of the store
+    :type store_class: type
+    :param snapshots: the queue of encoded snapshots
+    :type snapshots: multiprocessing.Queue
+    :param keyframe_interval: the number of snapshots between keyframes, or
+        ``None`` to store every snapshot in full
+    :type keyframe_interval: int | None
+    :param batch_size: the maximum number of snapshots per transaction
+    :type batch_size: int
+    :param counters: the counters of the writer
+    :type counters: multiprocessing.RawArray
+    """
+    differ = None
+    if keyframe_interval is not None:
+        differ = OrderBookDiffer(keyframe_interval)
+    with store_class(db_path) as store:
+        stopped = False
+        while not stopped:
+            batch = []
+            record = snapshots.get()
+            while record != _STOP:
+                batch.append(decode_snapshot(record))
+                if len(batch) >= batch_size:
+                    break
+                try:
+                    record = snapshots.get_nowait()
+                except queue.Empty:
+                    break
+            stopped = record == _STOP
+            if not batch:
+                continue
+            if differ is None:
+                rows = store.insert_rows([
+                    row for _, _, snapshot in batch for row in snapshot
+                ])
+            else:
+                rows = store.insert_delta_rows(differ, batch)
+            _increment(counters, 0, len(batch))
+            _increment(counters, 1, rows)
+
+
+class ParallelCollector(object):
+    """Collector of order book snapshots sharded across processes.
+
+    The order books are dealt round-robin to **processes** workers, each
+    polling its shard every **interval** seconds. The snapshots are written
+    by a single writer process, so SQLite never sees concurrent writers.
+
+    A supervisor thread checks the processes every **check_interval**
+    seconds and restarts any which died, waiting **restart_delay** seconds
+    between restarts of the same process. A writer killed while reading
+    the queue can leave it locked, so the writer is restarted with a new
+    queue, and the workers with it: the snapshots left in the old queue are
+    lost, and the new writer starts with a keyframe for every book.
+
+    :param db_path: the path to the SQLite database, or to the file of
+        the store
+    :type db_path: str | unicode
+    :param books: the names of the order books to record (defaults to all)
+    :type books: [str | unicode]
+    :param processes: the number of worker processes (defaults to the
+        number of CPUs, at most one per book)
+    :type processes: int
+    :param interval: the number of seconds between polls of each shard
+    :type interval: int | float
+    :param group: group orders with the same price
+    :type group: bool
+    :param keyframe_interval: the number of snapshots between full
+        keyframes when storing deltas, or ``None`` to store every snapshot
+        in full
+    :type keyframe_interval: int | None
+    :param queue_size: the maximum number of snapshots waiting to be written
+    :type queue_size: int
+    :param batch_size: the maximum number of snapshots written in one
+        transaction
+    :type batch_size: int
+    :param client_options: the keyword arguments of the client of each
+        worker (e.g. ``{"timeout": 5}``)
+    :type client_options: dict
+    :param restart_delay: the minimum number of seconds between restarts of
+        the same process
+    :type restart_delay: int | float
+    :param check_interval: the number of seconds between checks of the
+        processes
+    :type check_interval: int | float
+    :param store_class: the class of the store, created with the path to
+        the database (e.g. :class:`quadriga.binlog.BinaryLog`)
+    :type store_class: type
+    :raises ValueError: if deltas are requested from a store which only
+        records full snapshots, or if a store which must be written in
+        chronological order would get the snapshots of several shards
+    """
+
+    def __init__(self,
+                 db_path,
+                 books=None,
+                 processes=None,
+                 interval=1.0,
+                 group=True,
+                 keyframe_interval=None,
+                 queue_size=1000,
+                 batch_size=100,
+                 client_options=None,
+                 restart_delay=1.0,
+                 check_interval=0.5,
+                 store_class=OrderBookStore):
+        self._logger = logging.getLogger('quadriga')
+        self._db_path = db_path
+        books = sorted(books or QuadrigaClient.order_books)
+        processes = min(processes or multiprocessing.cpu_count(), len(books))
+        self.shards = [books[index::processes] for index in range(processes)]
+        self._interval = interval
+        self._group = group
+        if keyframe_interval is not None and not hasattr(
+                store_class, 'insert_delta_rows'):
+            raise ValueError('{} does not store deltas'
+                             .format(store_class.__name__))
+        # Shards are polled independently, so their snapshots reach the
+        # writer out of order
+        if processes > 1 and getattr(store_class, 'chronological', False):
+            raise ValueError('{} must be written in chronological order by '
+                             'a single process'.format(store_class.__name__))
+        self._keyframe_interval = keyframe_interval
+        self._store_class = store_class
+        self._batch_size = batch_size
+        self._client_options = client_options or {}
+        self._restart_delay = restart_delay
+        self._check_interval = check_interval
+
+        self._queue_size = queue_size
+        self._queue = multiprocessing.Queue(queue_size)
+        self._stopping = multiprocessing.RawValue('b', 0)
+        self._worker_counters = multiprocessing.RawArray(
+            'l', len(_WORKER_COUNTERS) * processes
+        )
+        self._writer_counters = multiprocessing.RawArray(
+            'l', len(_WRITER_COUNTERS)
+        )
+        self._workers = [None] * processes
+        self._writer = None
+        self._restarted = {}
+        self._supervisor = None
+        self._supervising = threading.Event()
+        self._started = None
+        self.restarts = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def running(self):
+        """Return ``True`` if the collector is running.
+
+        :returns: whether the collector is running
+        :rtype: bool
+        """
+        return self._supervisor is not None
+
+    def _log(self, message):
+        """Log a debug message.
+
+        :param message: the message to log
+        :type message: str | unicode
+        """
+        self._logger.debug('[collector: {}] {}'.format(self._db_path, message))
+
+    def _start_worker(self, shard):
+        """Start the worker process polling a shard.
+
+        :param shard: the index of the shard
+        :type shard: int
+        """
+        process = multiprocessing.Process(
+            target=_poll_books,
+            name='quadriga-collector-{}'.format(shard),
+            args=(self.shards[shard], self._client_options, self._interval,
+                  self._group, self._queue, self._worker_counters,
+                  shard * len(_WORKER_COUNTERS), self._stopping)
+        )
+        process.daemon = True
+        process.start()
+        self._workers[shard] = process
+
+    def _start_writer(self):
+        """Start the writer process."""
+        self._writer = multiprocessing.Process(
+            target=_write_snapshots,
+            name='quadriga-collector-writer',
+            args=(self._db_path, self._store_class, self._queue,
+                  self._keyframe_interval, self._batch_size,
+                  self._writer_counters)
+        )
+        self._writer.daemon = True
+        self._writer.start()
+
+    def _replace_writer(self):
+        """Start a new writer, and new workers, on a new queue."""
+        for process in self._workers:
+            if process is not None and process.is_alive():
+                process.terminate()
+                process.join()
+        self._queue.cancel_join_thread()
+        self._queue.close()
+        self._queue = multiprocessing.Queue(self._queue_size)
+        self._start_writer()
+        if not self._stopping.value:
+            for shard in range(len(self.shards)):
+                self._start_worker(shard)
+
+    def _restart(self, name, start):
+        """Restart a dead process, unless it was restarted too recently.
+
+        :param name: the name of the process in the restart counts
+        :type name: str | unicode
+        :param start: the function starting the process
+        :type start: callable
+        """
+        now = monotonic()
+        if now - self._restarted.get(name, -self._restart_delay) < (
+                self._restart_delay):
+            return
+        self._restarted[name] = now
+        self.restarts[name] = self.restarts.get(name, 0) + 1
+        self._logger.warning('[collector: {}] restarting {} (restart {})'
+                             .format(self._db_path, name, self.restarts[name]))
+        start()
+
+    def _supervise(self):
+        """Restart the processes which died until the collector stops."""
+        while not self._supervising.wait(self._check_interval):
+            if not self._writer.is_alive():
+                self._restart('writer', self._replace_writer)
+            for shard, process in enumerate(self._workers):
+                if not process.is_alive():
+                    self._restart(
+                        'worker {}'.format(shard),
+                        lambda: self._start_worker(shard)
+                    )
+
+    def start(self):
+        """Start the writer, the workers and their supervisor."""
+        if self.running:
+            return
+        self._log('start collecting {} with {} workers'.format(
+            ', '.join(book for shard in self.shards for book in shard),
+            len(self.shards)
+        ))
+        self._stopping.value = 0
+        self._supervising.clear()
+        self._start_writer()
+        for shard in range(len(self.shards)):
+            self._start_worker(shard)
+        self._started = monotonic()
+        self._supervisor = threading.Thread(target=self._supervise)
+        self._supervisor.daemon = True
+        self._supervisor.start()
+
+    def stop(self, timeout=None):
+        """Stop the workers and wait until the queued snapshots are written.
+
+        :param timeout: the maximum number of seconds to wait for each
+            process, or ``None`` to wait indefinitely
+        :type timeout: int | float | None
+        """
+        if not self.running:
+            return
+        self._log('stop collecting')
+        self._supervising.set()
+        self._supervisor.join()
+        self._supervisor = None
+        self._stopping.value = 1
+        for process in self._workers:
+            process.join(timeout)
+        if not self._writer.is_alive():
+            self._replace_writer()
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+
+    def report(self):
+        """Return the throughput of the collector since it started.
+
+        :returns: the counts of each worker (polls, errors, snapshots sent
+            and bytes sent) and of the writer (snapshots and rows written),
+            the number of restarts of each process, and the snapshots
+            written per second
+        :rtype: dict
+        """
+        elapsed = monotonic() - self._started if self._started else 0.0
+        values = list(self._worker_counters)
+        workers = []
+        for shard, books in enumerate(self.shards):
+            counts = values[shard * len(_WORKER_COUNTERS):
+                            (shard + 1) * len(_WORKER_COUNTERS)]
+            worker = dict(zip(_WORKER_COUNTERS, counts))
+            worker['books'] = books
+            workers.append(worker)
+        writer = dict(zip(_WRITER_COUNTERS, self._writer_counters))
+        return {
+            'elapsed': elapsed,
+            'workers': workers,
+            'writer': writer,
+            'restarts': dict(self.restarts),
+            'snapshots_per_sec': (
+                writer['snapshots'] / elapsed if elapsed else 0.0
+            ),
+        }
@@ -0,0 +1,27 @@
+"""Shims for the differences between Python 2 and 3."""
+from __future__ import absolute_import, unicode_literals
+
+import os
+import time
+
+try:
+    import queue  # noqa: F401
+except ImportError:  # pragma: no cover
+    import Queue as queue  # noqa: F401
+
+try:
+    from itertools import accumulate
+except ImportError:  # pragma: no cover
+    def accumulate(values):
+        """Yield the running totals of the values."""
+        total = 0
+        for value in values:
+            total += value
+            yield total
+
+# Monotonic clock for measuring intervals (falls back to wall time on py2)
+monotonic = getattr(time, 'monotonic', time.time)
+
+# Atomic rename over an existing file (os.rename on py2, which is atomic on
+# POSIX only)
+replace = getattr(os, 'replace', os.rename)
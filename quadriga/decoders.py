@@ -0,0 +1,126 @@
+"""Decoders turning HTTP responses from QuadrigaCX into response bodies.
+
+A decoder is a callable which takes a :class:`requests.models.Response` and
+returns its body, raising :class:`ValueError` if the body is not valid JSON.
+The API returns prices and amounts as decimal strings, which every decoder
+leaves untouched.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import importlib
+import json
+
+# Optional JSON backends, fastest first
+_FAST_BACKENDS = ('orjson', 'ujson', 'simplejson')
+
+# Fastest installed backend: None until first looked up, False if none is
+# installed
+_fast_json = None
+
+
+def get_fast_json():
+    """Return the fastest installed JSON backend.
+
+    The backends are only imported the first time this is called.
+
+    :returns: the backend module, or ``None`` if none is installed
+    :rtype: module | None
+    """
+    global _fast_json
+    if _fast_json is None:
+        _fast_json = False
+        for name in _FAST_BACKENDS:
+            try:
+                _fast_json = importlib.import_module(name)
+            except ImportError:
+                continue
+            break
+    return _fast_json or None
+
+
+def json_decoder(response):
+    """Decode the response body with the decoder of :mod:`requests`.
+
+    :param response: the HTTP response
+    :type response: requests.models.Response
+    :returns: the decoded response body
+    :rtype: dict | list
+    :raises ValueError: if the body is not valid JSON
+    """
+    return response.json()
+
+
+def fast_decoder(response):
+    """Decode the raw response bytes with the fastest installed backend.
+
+    :mod:`orjson`, :mod:`ujson` and :mod:`simplejson` are tried in that
+    order. Without any of them, this is the same as :func:`json_decoder`.
+
+    :param response: the HTTP response
+    :type response: requests.models.Response
+    :returns: the decoded response body
+    :rtype: dict | list
+    :raises ValueError: if the body is not valid JSON
+    """
+    backend = _fast_json or get_fast_json()
+    if backend is None:
+        return response.json()
+    if backend.__name__ == 'orjson':
+        return backend.loads(response.content)
+    return backend.loads(response.content.decode('utf-8'))
+
+
+def raw_decoder(response):
+    """Return the response bytes without decoding them.
+
+    The body is only decoded if it holds an API error, so that errors are
+    still raised by the client: the body of a non-2xx response, or a JSON
+    object with a top-level ``"error"`` key. Any other body is returned as
+    it is, even if it mentions ``"error"`` in a nested value. This is meant
+    for callers persisting the payloads as they are.
+
+    :param response: the HTTP response
+    :type response: requests.models.Response
+    :returns: the raw response body, or the decoded body of an error
+    :rtype: bytes | dict
+    :raises ValueError: if the body of a non-2xx response is not valid JSON
+    """
+    content = response.content
+    if not 200 <= response.status_code < 300:
+        return json.loads(content.decode('utf-8'))
+    # Only parse bodies which may be an error object
+    if content.lstrip()[:1] == b'{' and b'"error"' in content:
+        try:
+            body = json.loads(content.decode('utf-8'))
+        except ValueError:
+            return content
+        if isinstance(body, dict) and 'error' in body:
+            return body
+    return content
+
+
+# Decoders which can be selected by name
+DECODERS = {
+    'json': json_decoder,
+    'fast': fast_decoder,
+    'raw': raw_decoder,
+}
+
+
+def get_decoder(decoder):
+    """Return the decoder for the given name or callable.
+
+    :param decoder: ``"json"``, ``"fast"``, ``"raw"`` or a decoder
+    :type decoder: str | unicode | callable
+    :returns: the decoder
+    :rtype: callable
+    :raises ValueError: on an unknown decoder name
+    """
+    if callable(decoder):
+        return decoder
+    try:
+        return DECODERS[decoder]
+    except KeyError:
+        raise ValueError('Invalid decoder "{}" (choose from {})'.format(
+            decoder, ', '.join(sorted(DECODERS))
+        ))
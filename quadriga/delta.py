@@ -0,0 +1,222 @@
+from __future__ import absolute_import, unicode_literals
+
+# Sides of the order book as stored in the "type" column
+BID = 0
+ASK = 1
+
+
+def create_tables(conn):
+    """Create the tables holding keyframes and deltas if they do not exist.
+
+    Each recorded snapshot has a row in ``orderBookSnapshots``, flagged as a
+    keyframe or not, and its price levels (all of them for keyframes, only
+    the changed ones for deltas) in ``orderBookLevels``. A level with an
+    amount of zero has been removed.
+
+    :param conn: the database connection
+    :type conn: sqlite3.Connection
+    """
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS orderBookSnapshots '
+        '(id INTEGER PRIMARY KEY, book TEXT, timeStamp INT, keyframe INT)'
+    )
+    conn.execute(
+        'CREATE INDEX IF NOT EXISTS orderBookSnapshots_book_timeStamp '
+        'ON orderBookSnapshots (book, timeStamp)'
+    )
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS orderBookLevels '
+        '(snapshot INT, type INT, amount INT, price INT)'
+    )
+    conn.execute(
+        'CREATE INDEX IF NOT EXISTS orderBookLevels_snapshot '
+        'ON orderBookLevels (snapshot)'
+    )
+
+
+def write_delta(conn, book, timestamp, keyframe, changes):
+    """Insert a keyframe or delta produced by :class:`OrderBookDiffer`.
+
+    Nothing is written for a delta without changes.
+
+    :param conn: the database connection
+    :type conn: sqlite3.Connection
+    :param book: the name of the order book
+    :type book: str | unicode
+    :param timestamp: the UNIX timestamp of the snapshot
+    :type timestamp: int
+    :param keyframe: whether the changes are a full keyframe
+    :type keyframe: bool
+    :param changes: the ``(type, amount, price)`` levels
+    :type changes: [tuple]
+    :returns: the number of levels written
+    :rtype: int
+    """
+    if not changes:
+        return 0
+    cursor = conn.execute(
+        'INSERT INTO orderBookSnapshots (book, timeStamp, keyframe) '
+        'VALUES (?,?,?)', (book, timestamp, int(keyframe))
+    )
+    snapshot = cursor.lastrowid
+    conn.executemany(
+        'INSERT INTO orderBookLevels (snapshot, type, amount, price) '
+        'VALUES (?,?,?,?)',
+        [(snapshot, side, amount, price) for side, amount, price in changes]
+    )
+    return len(changes)
+
+
+def aggregate_levels(rows):
+    """Sum the amounts of the rows by side and price.
+
+    :param rows: the ``(timeStamp, type, amount, price, book)`` rows of a
+        snapshot
+    :type rows: [tuple]
+    :returns: the total amount for each ``(type, price)`` level
+    :rtype: dict
+    """
+    levels = {}
+    for _, side, amount, price, _ in rows:
+        key = (side, price)
+        levels[key] = levels.get(key, 0) + amount
+    return levels
+
+
+def diff_levels(old, new):
+    """Return the price levels which differ between two snapshots.
+
+    :param old: the levels of the previous snapshot
+    :type old: dict
+    :param new: the levels of the current snapshot
+    :type new: dict
+    :returns: the ``(type, amount, price)`` changes, where an amount of zero
+        means the level has been removed
+    :rtype: [tuple]
+    """
+    changes = [
+        (side, amount, price)
+        for (side, price), amount in new.items()
+        if old.get((side, price)) != amount
+    ]
+    changes.extend(
+        (side, 0, price)
+        for side, price in old
+        if (side, price) not in new
+    )
+    return changes
+
+
+class OrderBookDiffer(object):
+    """Turns consecutive order book snapshots into keyframes and deltas.
+
+    The first snapshot of each book, and every **keyframe_interval**-th
+    snapshot after it, is emitted in full as a keyframe. The snapshots in
+    between are emitted as the price levels added, changed or removed since
+    the previous snapshot. Levels are aggregated by price, so ungrouped
+    snapshots are stored as if they were grouped.
+
+    :param keyframe_interval: the number of snapshots between keyframes
+    :type keyframe_interval: int
+    """
+
+    def __init__(self, keyframe_interval=60):
+        self._keyframe_interval = keyframe_interval
+        self._levels = {}
+        self._counts = {}
+
+    def reset(self, book=None):
+        """Forget the previous snapshots, forcing new keyframes.
+
+        :param book: the name of the order book (defaults to all books)
+        :type book: str | unicode
+        """
+        if book is None:
+            self._levels.clear()
+            self._counts.clear()
+        else:
+            self._levels.pop(book, None)
+            self._counts.pop(book, None)
+
+    def update(self, book, rows):
+        """Diff the snapshot against the previous one of the same book.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param rows: the ``(timeStamp, type, amount, price, book)`` rows of
+            the snapshot, as returned by
+            :func:`quadriga.storage.snapshot_rows`
+        :type rows: [tuple]
+        :returns: whether the result is a keyframe, and its
+            ``(type, amount, price)`` levels
+        :rtype: (bool, [tuple])
+        """
+        levels = aggregate_levels(rows)
+        previous = self._levels.get(book)
+        count = self._counts.get(book, 0)
+
+        # An empty book cannot be stored as a keyframe, so the keyframe is
+        # postponed until the book has levels again
+        if levels and (previous is None or count >= self._keyframe_interval):
+            changes = [
+                (side, amount, price)
+                for (side, price), amount in levels.items()
+            ]
+            keyframe = True
+            count = 0
+        elif previous is None:
+            return False, []
+        else:
+            changes = diff_levels(previous, levels)
+            keyframe = False
+
+        self._levels[book] = levels
+        self._counts[book] = count + 1
+        return keyframe, changes
+
+
+def reconstruct(conn, book, timestamp):
+    """Rebuild an order book as it was at the given time.
+
+    :param conn: the database connection
+    :type conn: sqlite3.Connection
+    :param book: the name of the order book
+    :type book: str | unicode
+    :param timestamp: the UNIX timestamp
+    :type timestamp: int
+    :returns: the timestamp of the last change recorded at or before the
+        given time, and the bids (highest first) and asks (lowest first) as
+        ``(price, amount)`` pairs, or ``None`` if nothing was recorded
+    :rtype: dict | None
+    """
+    row = conn.execute(
+        'SELECT MAX(id) FROM orderBookSnapshots '
+        'WHERE book = ? AND keyframe = 1 AND timeStamp <= ?', (book, timestamp)
+    ).fetchone()
+    if row[0] is None:
+        return None
+
+    levels = {}
+    last = None
+    for ts, side, amount, price in conn.execute(
+            'SELECT s.timeStamp, l.type, l.amount, l.price '
+            'FROM orderBookSnapshots s '
+            'JOIN orderBookLevels l ON l.snapshot = s.id '
+            'WHERE s.book = ? AND s.id >= ? AND s.timeStamp <= ? '
+            'ORDER BY s.id', (book, row[0], timestamp)):
+        last = ts
+        if amount:
+            levels[(side, price)] = amount
+        else:
+            levels.pop((side, price), None)
+
+    bids = sorted(
+        ((price, amount) for (side, price), amount in levels.items()
+         if side == BID),
+        reverse=True
+    )
+    asks = sorted(
+        (price, amount) for (side, price), amount in levels.items()
+        if side == ASK
+    )
+    return {'timestamp': last, 'bids': bids, 'asks': asks}
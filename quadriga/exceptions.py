@@ -24,3 +24,23 @@ class InvalidCurrencyError(QuadrigaError):
 
 class InvalidOrderBookError(QuadrigaError):
     """Raised when an invalid order book name is specified."""
+
+
+class RateLimitError(QuadrigaError):
+    """Raised when the client-side request budget has been exhausted."""
+
+
+class StaleOrderBookError(QuadrigaError):
+    """Raised when a local order book has not been refreshed recently."""
+
+
+class ReplayError(QuadrigaError):
+    """Raised when a replayed request was never recorded."""
+
+
+class BinaryLogError(QuadrigaError):
+    """Raised when a binary snapshot log is invalid or cannot be written."""
+
+
+class ArchiveError(QuadrigaError):
+    """Raised when a file of an order book archive is invalid."""
@@ -0,0 +1,250 @@
+from __future__ import absolute_import, unicode_literals
+
+from functools import total_ordering
+from numbers import Integral
+
+# Number of decimal places of the smallest unit of each currency: satoshis
+# for bitcoin and its forks, wei for ether, and cents for fiat currencies
+CURRENCY_PLACES = {
+    'btc': 8,
+    'bch': 8,
+    'btg': 8,
+    'ltc': 8,
+    'eth': 18,
+    'cad': 2,
+    'usd': 2,
+}
+
+
+def book_places(book):
+    """Return the scales of the amounts and prices of an order book.
+
+    Amounts are in the major currency of the book and prices in its minor
+    currency, e.g. satoshis and cents for ``btc_cad``.
+
+    :param book: the name of the order book
+    :type book: str | unicode
+    :returns: the decimal places of the amounts and of the prices
+    :rtype: (int, int)
+    :raises KeyError: on an unknown currency
+    """
+    major, minor = book.split('_')
+    return CURRENCY_PLACES[major], CURRENCY_PLACES[minor]
+
+
+def parse_scaled(text, places, exact=True):
+    """Parse a decimal string into an integer number of 10^-places units.
+
+    The string is parsed digit by digit, without going through ``float``.
+
+    :param text: the decimal string (e.g. ``"1150.25"``)
+    :type text: str | unicode
+    :param places: the number of decimal places of the unit
+    :type places: int
+    :param exact: raise an error instead of truncating digits beyond
+        **places**
+    :type exact: bool
+    :returns: the scaled integer
+    :rtype: int
+    :raises ValueError: on an invalid string, or a string more precise than
+        the unit when **exact** is set
+    """
+    text = text.strip()
+    whole, _, fraction = text.partition('.')
+    sign = 1
+    if whole[:1] in ('-', '+'):
+        sign = -1 if whole[0] == '-' else 1
+        whole = whole[1:]
+    if not (whole or fraction) or not (whole + fraction).isdigit():
+        raise ValueError('Invalid decimal "{}"'.format(text))
+    if len(fraction) > places:
+        if exact and fraction[places:].strip('0'):
+            raise ValueError(
+                '"{}" has more than {} decimal places'.format(text, places)
+            )
+        fraction = fraction[:places]
+    digits = (whole or '0') + fraction.ljust(places, '0')
+    return sign * int(digits)
+
+
+@total_ordering
+class FixedPoint(object):
+    """Exact decimal number stored as an integer count of 10^-places units.
+
+    Values are parsed straight from the decimal strings returned by the API
+    and formatted back to strings when sent, so prices and amounts never go
+    through ``float``. Addition and subtraction align the scales, and
+    multiplying two values (e.g. a price by an amount) adds their scales, so
+    no arithmetic rounds.
+
+    .. code-block:: python
+
+        amount = FixedPoint.parse('0.5', 8)      # 50000000 satoshis
+        price = FixedPoint.parse('1150.25', 2)   # 115025 cents
+        print(amount * price)                    # 575.1250000000
+
+    :param value: the number of units
+    :type value: int
+    :param places: the number of decimal places of the unit
+    :type places: int
+    """
+
+    __slots__ = ('value', 'places')
+
+    def __init__(self, value, places):
+        self.value = value
+        self.places = places
+
+    @classmethod
+    def parse(cls, text, places):
+        """Parse a decimal string.
+
+        :param text: the decimal string (e.g. ``"1150.25"``)
+        :type text: str | unicode
+        :param places: the number of decimal places of the unit
+        :type places: int
+        :returns: the fixed-point number
+        :rtype: quadriga.fixedpoint.FixedPoint
+        :raises ValueError: on an invalid string, or a string more precise
+            than the unit
+        """
+        return cls(parse_scaled(text, places), places)
+
+    @classmethod
+    def amount(cls, text, book):
+        """Parse an amount of the major currency of an order book.
+
+        :param text: the decimal string
+        :type text: str | unicode
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the fixed-point amount
+        :rtype: quadriga.fixedpoint.FixedPoint
+        """
+        return cls.parse(text, book_places(book)[0])
+
+    @classmethod
+    def price(cls, text, book):
+        """Parse a price in the minor currency of an order book.
+
+        :param text: the decimal string
+        :type text: str | unicode
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the fixed-point price
+        :rtype: quadriga.fixedpoint.FixedPoint
+        """
+        return cls.parse(text, book_places(book)[1])
+
+    def rescale(self, places):
+        """Return the same number with a different unit.
+
+        :param places: the number of decimal places of the new unit
+        :type places: int
+        :returns: the rescaled number
+        :rtype: quadriga.fixedpoint.FixedPoint
+        :raises ValueError: if the number is too precise for the new unit
+        """
+        if places >= self.places:
+            return FixedPoint(
+                self.value * 10 ** (places - self.places), places
+            )
+        value, remainder = divmod(self.value, 10 ** (self.places - places))
+        if remainder:
+            raise ValueError('{} has more than {} decimal places'
+                             .format(self, places))
+        return FixedPoint(value, places)
+
+    def _align(self, other):
+        """Return the values of both numbers in the finer of their units.
+
+        :param other: the other number
+        :type other: quadriga.fixedpoint.FixedPoint | int
+        :returns: both values and the number of decimal places of the unit
+        :rtype: (int, int, int)
+        """
+        if not isinstance(other, FixedPoint):
+            other = FixedPoint(other, 0)
+        places = max(self.places, other.places)
+        return (self.value * 10 ** (places - self.places),
+                other.value * 10 ** (places - other.places), places)
+
+    def __repr__(self):
+        return 'FixedPoint({!r})'.format(str(self))
+
+    def __str__(self):
+        digits = str(abs(self.value)).rjust(self.places + 1, '0')
+        sign = '-' if self.value < 0 else ''
+        if not self.places:
+            return sign + digits
+        return '{}{}.{}'.format(
+            sign, digits[:-self.places], digits[-self.places:]
+        )
+
+    def __float__(self):
+        return self.value / 10.0 ** self.places
+
+    def __int__(self):
+        value = abs(self.value) // 10 ** self.places
+        return -value if self.value < 0 else value
+
+    def __bool__(self):
+        return bool(self.value)
+
+    __nonzero__ = __bool__
+
+    def __hash__(self):
+        value, places = self.value, self.places
+        while places and not value % 10:
+            value //= 10
+            places -= 1
+        return hash((value, places)) if places else hash(value)
+
+    def __eq__(self, other):
+        if not isinstance(other, (FixedPoint, Integral)):
+            return NotImplemented
+        left, right, _ = self._align(other)
+        return left == right
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __lt__(self, other):
+        if not isinstance(other, (FixedPoint, Integral)):
+            return NotImplemented
+        left, right, _ = self._align(other)
+        return left < right
+
+    def __neg__(self):
+        return FixedPoint(-self.value, self.places)
+
+    def __abs__(self):
+        return FixedPoint(abs(self.value), self.places)
+
+    def __add__(self, other):
+        if not isinstance(other, (FixedPoint, Integral)):
+            return NotImplemented
+        left, right, places = self._align(other)
+        return FixedPoint(left + right, places)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if not isinstance(other, (FixedPoint, Integral)):
+            return NotImplemented
+        left, right, places = self._align(other)
+        return FixedPoint(left - right, places)
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        if isinstance(other, FixedPoint):
+            return FixedPoint(self.value * other.value,
+                              self.places + other.places)
+        if isinstance(other, Integral):
+            return FixedPoint(self.value * other, self.places)
+        return NotImplemented
+
+    __rmul__ = __mul__
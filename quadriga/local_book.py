@@ -0,0 +1,397 @@
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from quadriga.compat import monotonic
+from quadriga.delta import ASK, BID, diff_levels
+from quadriga.exceptions import StaleOrderBookError
+from quadriga.fixedpoint import FixedPoint, book_places, parse_scaled
+
+
+# Sides of the order book by name
+_SIDES = {'bid': BID, 'ask': ASK}
+
+
+class LocalOrderBook(object):
+    """In-memory mirror of an order book, refreshed in the background.
+
+    A refresher thread polls ``/order_book`` every **interval** seconds and
+    applies only the price levels which changed since the previous poll. The
+    prices of each side are kept in a sorted list of integer units (see
+    :mod:`quadriga.fixedpoint`), so levels are found by binary search and
+    queries are answered from memory without waiting on HTTP.
+
+    Queries raise :class:`quadriga.exceptions.StaleOrderBookError` when the
+    last successful refresh is older than **max_age** seconds, so callers
+    never act on a book which has silently stopped updating.
+
+    .. code-block:: python
+
+        with LocalOrderBook(client, book='btc_cad') as book:
+            price, amount = book.best_bid
+            liquidity = book.depth_within(0.01, 'ask')
+
+    :param client: the client used to fetch the order book
+    :type client: quadriga.QuadrigaClient
+    :param book: the name of the order book (defaults to the client's
+        default book)
+    :type book: str | unicode
+    :param interval: the number of seconds between refreshes
+    :type interval: int | float
+    :param max_age: the maximum number of seconds since the last successful
+        refresh before queries raise an error
+    :type max_age: int | float
+    :param group: group orders with the same price
+    :type group: bool
+    :param clock: the monotonic clock measuring the age of the book
+    :type clock: callable
+    """
+
+    def __init__(self,
+                 client,
+                 book=None,
+                 interval=1.0,
+                 max_age=5.0,
+                 group=True,
+                 clock=monotonic):
+        self._logger = logging.getLogger('quadriga')
+        self._client = client
+        self.book = client._verify_book(book)
+        self._amount_places, self._price_places = book_places(self.book)
+        self._interval = interval
+        self._max_age = max_age
+        self._group = group
+        self._clock = clock
+        self._prices = {BID: [], ASK: []}
+        self._levels = {}
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._updated = None
+        self._stopping = threading.Event()
+        self._thread = None
+        self.timestamp = None
+        self.updates = 0
+        self.errors = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def running(self):
+        """Return ``True`` if the refresher thread is running.
+
+        :returns: whether the book is being refreshed
+        :rtype: bool
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def age(self):
+        """Return the number of seconds since the last successful refresh.
+
+        :returns: the age of the book, or ``None`` if it was never loaded
+        :rtype: float | None
+        """
+        if self._updated is None:
+            return None
+        return self._clock() - self._updated
+
+    def _log(self, message):
+        """Log a debug message.
+
+        :param message: the message to log
+        :type message: str | unicode
+        """
+        self._logger.debug('[local book: {}] {}'.format(self.book, message))
+
+    def _parse(self, snapshot):
+        """Aggregate the levels of a snapshot by side and price.
+
+        :param snapshot: the response from
+            :meth:`quadriga.QuadrigaClient.get_public_orders`
+        :type snapshot: dict
+        :returns: the total amount for each ``(type, price)`` level, in
+            integer units
+        :rtype: dict
+        """
+        levels = {}
+        for side, key in ((BID, 'bids'), (ASK, 'asks')):
+            for price, amount in snapshot[key]:
+                level = (side, parse_scaled(price, self._price_places))
+                levels[level] = levels.get(level, 0) + parse_scaled(
+                    amount, self._amount_places
+                )
+        return levels
+
+    def _apply(self, changes):
+        """Apply changed levels to the sorted price lists.
+
+        Must be called with the lock held.
+
+        :param changes: the ``(type, amount, price)`` changes, where an
+            amount of zero means the level has been removed
+        :type changes: [tuple]
+        """
+        for side, amount, price in changes:
+            prices = self._prices[side]
+            if not amount:
+                del prices[bisect_left(prices, price)]
+                del self._levels[(side, price)]
+                continue
+            if (side, price) not in self._levels:
+                insort(prices, price)
+            self._levels[(side, price)] = amount
+
+    def update(self, snapshot):
+        """Bring the book up to date with a snapshot.
+
+        :param snapshot: the response from
+            :meth:`quadriga.QuadrigaClient.get_public_orders`
+        :type snapshot: dict
+        :returns: the number of price levels which changed
+        :rtype: int
+        """
+        with self._update_lock:
+            changes = diff_levels(self._levels, self._parse(snapshot))
+            with self._lock:
+                self._apply(changes)
+                self.timestamp = int(snapshot['timestamp'])
+                self._updated = self._clock()
+            self.updates += 1
+            return len(changes)
+
+    def refresh(self):
+        """Fetch the order book and apply the changes synchronously.
+
+        :returns: the number of price levels which changed
+        :rtype: int
+        """
+        return self.update(self._client.get_public_orders(
+            group=self._group, book=self.book
+        ))
+
+    def _run(self):
+        """Refresh the book on schedule until it is stopped."""
+        deadline = self._clock()
+        while not self._stopping.is_set():
+            try:
+                self.refresh()
+            except Exception as exc:
+                self.errors += 1
+                self._log('failed to refresh: {}'.format(exc))
+            deadline += self._interval
+            self._stopping.wait(max(deadline - self._clock(), 0))
+
+    def start(self):
+        """Start refreshing the book in the background."""
+        if self.running:
+            return
+        self._log('start refreshing every {}s'.format(self._interval))
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop refreshing the book.
+
+        :param timeout: the maximum number of seconds to wait for the
+            refresher thread, or ``None`` to wait indefinitely
+        :type timeout: int | float | None
+        """
+        if self._thread is None:
+            return
+        self._log('stop refreshing')
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _check_fresh(self):
+        """Raise an error if the book is too old to be queried.
+
+        :raises StaleOrderBookError: if the book is stale
+        """
+        age = self.age
+        if age is None:
+            raise StaleOrderBookError(
+                'Order book {} has not been loaded'.format(self.book)
+            )
+        if age > self._max_age:
+            raise StaleOrderBookError(
+                'Order book {} was last refreshed {:.1f}s ago'
+                .format(self.book, age)
+            )
+
+    def _side(self, side):
+        """Return the type of a side.
+
+        :param side: ``"bid"`` or ``"ask"``
+        :type side: str | unicode
+        :returns: the type of the side
+        :rtype: int
+        :raises ValueError: on an invalid side
+        """
+        try:
+            return _SIDES[side]
+        except KeyError:
+            raise ValueError('Invalid side "{}" (choose from bid, ask)'
+                             .format(side))
+
+    def _level(self, side, price):
+        """Return a price level as fixed-point numbers.
+
+        :param side: the type of the side
+        :type side: int
+        :param price: the price in integer units
+        :type price: int
+        :returns: the price and amount
+        :rtype: (quadriga.fixedpoint.FixedPoint,
+            quadriga.fixedpoint.FixedPoint)
+        """
+        return (FixedPoint(price, self._price_places),
+                FixedPoint(self._levels[(side, price)], self._amount_places))
+
+    def _units(self, price):
+        """Convert a price to integer units.
+
+        :param price: the price
+        :type price: quadriga.fixedpoint.FixedPoint | str | unicode | int
+        :returns: the price in integer units
+        :rtype: int
+        """
+        if isinstance(price, FixedPoint):
+            return price.rescale(self._price_places).value
+        return parse_scaled(str(price), self._price_places, exact=False)
+
+    def _total(self, side, prices):
+        """Return the total amount of the levels at the given prices.
+
+        :param side: the type of the side
+        :type side: int
+        :param prices: the prices in integer units
+        :type prices: [int]
+        :returns: the total amount
+        :rtype: quadriga.fixedpoint.FixedPoint
+        """
+        return FixedPoint(
+            sum(self._levels[(side, price)] for price in prices),
+            self._amount_places
+        )
+
+    @property
+    def best_bid(self):
+        """Return the highest bid.
+
+        :returns: the price and amount, or ``None`` if there are no bids
+        :rtype: (quadriga.fixedpoint.FixedPoint,
+            quadriga.fixedpoint.FixedPoint) | None
+        :raises StaleOrderBookError: if the book is stale
+        """
+        with self._lock:
+            self._check_fresh()
+            prices = self._prices[BID]
+            return self._level(BID, prices[-1]) if prices else None
+
+    @property
+    def best_ask(self):
+        """Return the lowest ask.
+
+        :returns: the price and amount, or ``None`` if there are no asks
+        :rtype: (quadriga.fixedpoint.FixedPoint,
+            quadriga.fixedpoint.FixedPoint) | None
+        :raises StaleOrderBookError: if the book is stale
+        """
+        with self._lock:
+            self._check_fresh()
+            prices = self._prices[ASK]
+            return self._level(ASK, prices[0]) if prices else None
+
+    @property
+    def spread(self):
+        """Return the difference between the lowest ask and the highest bid.
+
+        :returns: the spread, or ``None`` if either side is empty
+        :rtype: quadriga.fixedpoint.FixedPoint | None
+        :raises StaleOrderBookError: if the book is stale
+        """
+        with self._lock:
+            self._check_fresh()
+            bids, asks = self._prices[BID], self._prices[ASK]
+            if not bids or not asks:
+                return None
+            return FixedPoint(asks[0] - bids[-1], self._price_places)
+
+    def top(self, side, count=10):
+        """Return the best price levels of a side.
+
+        :param side: ``"bid"`` or ``"ask"``
+        :type side: str | unicode
+        :param count: the maximum number of levels
+        :type count: int
+        :returns: the ``(price, amount)`` levels from the best price
+        :rtype: [(quadriga.fixedpoint.FixedPoint,
+            quadriga.fixedpoint.FixedPoint)]
+        :raises StaleOrderBookError: if the book is stale
+        """
+        side = self._side(side)
+        with self._lock:
+            self._check_fresh()
+            prices = self._prices[side]
+            if side == BID:
+                prices = reversed(prices[-count:]) if count else []
+            else:
+                prices = prices[:count]
+            return [self._level(side, price) for price in prices]
+
+    def depth_at(self, price, side):
+        """Return the amount available at the price or better.
+
+        :param price: the limit price
+        :type price: quadriga.fixedpoint.FixedPoint | str | unicode | int
+        :param side: ``"bid"`` or ``"ask"``
+        :type side: str | unicode
+        :returns: the total amount of the levels at the price or better
+        :rtype: quadriga.fixedpoint.FixedPoint
+        :raises StaleOrderBookError: if the book is stale
+        """
+        side = self._side(side)
+        limit = self._units(price)
+        with self._lock:
+            self._check_fresh()
+            prices = self._prices[side]
+            if side == BID:
+                return self._total(side, prices[bisect_left(prices, limit):])
+            return self._total(side, prices[:bisect_right(prices, limit)])
+
+    def depth_within(self, fraction, side):
+        """Return the amount available within a fraction of the best price.
+
+        For example, ``depth_within(0.01, 'ask')`` is the amount offered at
+        most 1% above the lowest ask.
+
+        :param fraction: the distance from the best price (e.g. ``0.01``)
+        :type fraction: float
+        :param side: ``"bid"`` or ``"ask"``
+        :type side: str | unicode
+        :returns: the total amount of the levels within the range
+        :rtype: quadriga.fixedpoint.FixedPoint
+        :raises StaleOrderBookError: if the book is stale
+        """
+        side = self._side(side)
+        with self._lock:
+            self._check_fresh()
+            prices = self._prices[side]
+            if not prices:
+                return FixedPoint(0, self._amount_places)
+            if side == BID:
+                limit = int(math.ceil(prices[-1] * (1 - fraction)))
+                return self._total(side, prices[bisect_left(prices, limit):])
+            limit = int(math.floor(prices[0] * (1 + fraction)))
+            return self._total(side, prices[:bisect_right(prices, limit)])
@@ -0,0 +1,394 @@
+"""Instrumentation of the requests sent by :class:`quadriga.RestClient`.
+
+Each request is timed in phases:
+
+* ``wait``: waiting for the rate limiter.
+* ``request``: sending the request and receiving the response, which
+  includes connecting when no pooled connection is available.
+* ``headers``: the part of ``request`` until the response headers arrived
+  (as measured by :mod:`requests`), i.e. roughly the server time plus one
+  round trip.
+* ``decode``: checking and decoding the response body.
+
+Timings, statuses and errors are passed to sinks, which aggregate or export
+them. A sink is any object with a ``record(method, endpoint, status, error,
+phases)`` method.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import bisect
+import logging
+import threading
+
+from quadriga.compat import monotonic, replace
+
+# Upper bounds in seconds of the histogram buckets: 1ms to about 30s, with
+# each bucket 1.41 times wider than the previous one
+DEFAULT_BUCKETS = tuple(0.001 * 2 ** (i / 2.0) for i in range(31))
+
+
+class RequestTimer(object):
+    """Times the phases of a single request and reports it to sinks.
+
+    :param sinks: the sinks to report to
+    :type sinks: list
+    :param method: the HTTP method
+    :type method: str | unicode
+    :param endpoint: the API endpoint/path
+    :type endpoint: str | unicode
+    """
+
+    __slots__ = ('_sinks', '_method', '_endpoint', '_last', 'phases')
+
+    def __init__(self, sinks, method, endpoint):
+        self._sinks = sinks
+        self._method = method
+        self._endpoint = endpoint
+        self._last = monotonic()
+        self.phases = {}
+
+    def mark(self, phase):
+        """End a phase, which started when the previous one ended.
+
+        :param phase: the name of the phase
+        :type phase: str | unicode
+        """
+        now = monotonic()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    def response(self, response):
+        """Record the phases measured by the HTTP library.
+
+        :param response: the HTTP response
+        :type response: requests.models.Response
+        """
+        elapsed = getattr(response, 'elapsed', None)
+        if elapsed is not None:
+            self.phases['headers'] = elapsed.total_seconds()
+
+    def finish(self, status=None, error=None):
+        """Report the request to the sinks.
+
+        :param status: the HTTP status code, or ``None`` if no response was
+            received
+        :type status: int | None
+        :param error: the name of the error raised, if any
+        :type error: str | unicode | None
+        """
+        for sink in self._sinks:
+            sink.record(
+                self._method, self._endpoint, status, error, self.phases
+            )
+
+
+class _NullTimer(object):
+    """Request timer which does nothing, used when metrics are disabled."""
+
+    __slots__ = ()
+
+    def mark(self, phase):
+        pass
+
+    def response(self, response):
+        pass
+
+    def finish(self, status=None, error=None):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Histogram(object):
+    """Distribution of values counted in fixed buckets.
+
+    Memory use is constant, and percentiles are interpolated within the
+    bucket holding them.
+
+    :param buckets: the increasing upper bounds of the buckets
+    :type buckets: [float]
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Count a value.
+
+        :param value: the value
+        :type value: float
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Return an estimate of a percentile.
+
+        :param q: the percentile (e.g. ``99``)
+        :type q: int | float
+        :returns: the estimated value, or ``None`` if nothing was counted
+        :rtype: float | None
+        """
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else self.min
+                upper = (self.buckets[index]
+                         if index < len(self.buckets) else self.max)
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+class MemorySink(object):
+    """Sink aggregating the requests in memory.
+
+    It counts the requests by status and the errors by name, and keeps a
+    latency histogram of each phase (and of the total) per endpoint.
+
+    :param buckets: the upper bounds of the histogram buckets in seconds
+    :type buckets: [float]
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.errors = {}
+        self.histograms = {}
+
+    def record(self, method, endpoint, status, error, phases):
+        """Aggregate a request.
+
+        :param method: the HTTP method
+        :type method: str | unicode
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :param status: the HTTP status code, or ``None``
+        :type status: int | None
+        :param error: the name of the error raised, or ``None``
+        :type error: str | unicode | None
+        :param phases: the duration of each phase in seconds
+        :type phases: dict
+        """
+        with self._lock:
+            key = (method, endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if error is not None:
+                key = (method, endpoint, error)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            durations = list(phases.items())
+            durations.append(('total', sum(
+                duration for phase, duration in phases.items()
+                if phase != 'headers'
+            )))
+            for phase, duration in durations:
+                key = (method, endpoint, phase)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(
+                        self._buckets
+                    )
+                histogram.add(duration)
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """Return the count and latency percentiles of each phase.
+
+        :param percentiles: the percentiles to estimate
+        :type percentiles: [int | float]
+        :returns: the count, mean and percentiles in seconds, keyed by
+            ``(method, endpoint, phase)``
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                key: dict(
+                    count=histogram.count,
+                    mean=histogram.sum / histogram.count,
+                    **{'p{}'.format(q): histogram.percentile(q)
+                       for q in percentiles}
+                )
+                for key, histogram in self.histograms.items()
+            }
+
+    def clear(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.requests.clear()
+            self.errors.clear()
+            self.histograms.clear()
+
+
+class LoggingSink(object):
+    """Sink logging one line per request to the ``quadriga`` logger.
+
+    :param level: the logging level
+    :type level: int
+    """
+
+    def __init__(self, level=logging.DEBUG):
+        self._logger = logging.getLogger('quadriga')
+        self._level = level
+
+    def record(self, method, endpoint, status, error, phases):
+        """Log a request.
+
+        :param method: the HTTP method
+        :type method: str | unicode
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :param status: the HTTP status code, or ``None``
+        :type status: int | None
+        :param error: the name of the error raised, or ``None``
+        :type error: str | unicode | None
+        :param phases: the duration of each phase in seconds
+        :type phases: dict
+        """
+        self._logger.log(self._level, '[metrics] {} {} {}{} {}'.format(
+            method, endpoint, status,
+            '' if error is None else ' ({})'.format(error),
+            ' '.join('{}={:.1f}ms'.format(phase, phases[phase] * 1000)
+                     for phase in sorted(phases))
+        ))
+
+
+def _labels(**labels):
+    """Format Prometheus labels.
+
+    :returns: the labels in braces
+    :rtype: str | unicode
+    """
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for name, value in sorted(labels.items())
+    ) + '}'
+
+
+class PrometheusSink(MemorySink):
+    """Sink exporting the aggregated requests in the Prometheus text format.
+
+    The metrics can be written to a file read by the node exporter's
+    textfile collector, or served over HTTP:
+
+    .. code-block:: python
+
+        sink = PrometheusSink()
+        client = QuadrigaClient(metrics=sink)
+        server = sink.serve(9100)
+
+    :param buckets: the upper bounds of the histogram buckets in seconds
+    :type buckets: [float]
+    :param prefix: the prefix of the metric names
+    :type prefix: str | unicode
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='quadriga'):
+        super(PrometheusSink, self).__init__(buckets)
+        self._prefix = prefix
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format.
+
+        :returns: the metrics
+        :rtype: str | unicode
+        """
+        name = self._prefix + '_requests_total'
+        lines = ['# TYPE {} counter'.format(name)]
+        with self._lock:
+            for (method, endpoint, status), count in sorted(
+                    self.requests.items(), key=lambda item: str(item[0])):
+                lines.append('{}{} {}'.format(name, _labels(
+                    method=method, endpoint=endpoint, status=status
+                ), count))
+
+            name = self._prefix + '_errors_total'
+            lines.append('# TYPE {} counter'.format(name))
+            for (method, endpoint, error), count in sorted(
+                    self.errors.items()):
+                lines.append('{}{} {}'.format(name, _labels(
+                    method=method, endpoint=endpoint, error=error
+                ), count))
+
+            name = self._prefix + '_request_seconds'
+            lines.append('# TYPE {} histogram'.format(name))
+            for (method, endpoint, phase), histogram in sorted(
+                    self.histograms.items()):
+                labels = dict(method=method, endpoint=endpoint, phase=phase)
+                total = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',),
+                                        histogram.counts):
+                    total += count
+                    lines.append('{}_bucket{} {}'.format(name, _labels(
+                        le=bound if bound == '+Inf' else repr(bound),
+                        **labels
+                    ), total))
+                lines.append('{}_sum{} {!r}'.format(
+                    name, _labels(**labels), histogram.sum
+                ))
+                lines.append('{}_count{} {}'.format(
+                    name, _labels(**labels), histogram.count
+                ))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to a file, replacing it atomically.
+
+        :param path: the path to the file
+        :type path: str | unicode
+        """
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as fp:
+            fp.write(self.render().encode('utf-8'))
+        replace(temp_path, path)
+
+    def serve(self, port, host=''):
+        """Serve the metrics over HTTP from a background thread.
+
+        :param port: the port to listen on
+        :type port: int
+        :param host: the address to listen on (defaults to all)
+        :type host: str | unicode
+        :returns: the server, which stops on ``shutdown()``
+        :rtype: http.server.HTTPServer
+        """
+        try:
+            from http.server import BaseHTTPRequestHandler, HTTPServer
+        except ImportError:  # pragma: no cover
+            from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = sink.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        server = HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
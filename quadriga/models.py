@@ -0,0 +1,426 @@
+"""Compact result models for the responses of :class:`quadriga.QuadrigaClient`.
+
+With **result_models** set, the client returns these models instead of the
+decoded JSON dicts and lists. Each model keeps the raw values of the
+response in ``__slots__``, which takes a fraction of the memory of a dict,
+and decodes a value only when its attribute is read: decimal strings become
+exact :class:`quadriga.fixedpoint.FixedPoint` numbers and timestamps become
+integers.
+
+.. code-block:: python
+
+    client = QuadrigaClient(default_book='btc_cad', result_models=True)
+    for trade in client.get_public_trades():
+        print(trade.date, trade.price * trade.amount)
+
+Models can also be read like the dicts they replace (``trade['price']``
+returns the raw ``"5000.00"``), so code written for raw responses keeps
+working.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from quadriga.fixedpoint import FixedPoint
+
+# Single copies of the values repeated across items (e.g. "buy" and "sell"),
+# shared by all models instead of one string per item
+_shared_values = {}
+
+
+def decimal(text):
+    """Parse a decimal string with the precision it was written with.
+
+    :param text: the decimal string (e.g. ``"1150.25"``)
+    :type text: str | unicode | int | float
+    :returns: the exact fixed-point number
+    :rtype: quadriga.fixedpoint.FixedPoint
+    :raises ValueError: on an invalid string
+    """
+    text = str(text)
+    return FixedPoint.parse(text, len(text.partition('.')[2]))
+
+
+class _Field(object):
+    """Attribute decoding a raw value of the response when it is read.
+
+    :param key: the key of the value in the response
+    :type key: str | unicode
+    :param decode: the function decoding the raw value
+    :type decode: callable
+    """
+
+    def __init__(self, key, decode):
+        self._slot = '_' + key
+        self._decode = decode
+
+    def __get__(self, model, owner):
+        if model is None:
+            return self
+        value = getattr(model, self._slot)
+        return None if value is None else self._decode(value)
+
+
+class _Model(object):
+    """Response object stored in slots, one per key of the response.
+
+    The raw value of each key is kept in the slot of the same name prefixed
+    with an underscore.
+    """
+
+    __slots__ = ()
+
+    # Keys of the response, in the order they are listed
+    _keys = ()
+
+    # Keys whose values take only a few distinct values, which are shared
+    _shared = ()
+
+    def __init__(self, body):
+        for key in self._keys:
+            setattr(self, '_' + key, body.get(key))
+        for key in self._shared:
+            value = body.get(key)
+            setattr(self, '_' + key,
+                    _shared_values.setdefault(value, value))
+
+    @classmethod
+    def many(cls, items, *args):
+        """Build a model from each response item.
+
+        :param items: the response items
+        :type items: [dict]
+        :returns: the models
+        :rtype: list
+        """
+        return [cls(item, *args) for item in items]
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, '_' + key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def get(self, key, default=None):
+        """Return the raw value of a key, or the default if it is missing.
+
+        :param key: the key of the response
+        :type key: str | unicode
+        :param default: the value returned for an unknown or missing key
+        :returns: the raw value
+        """
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def keys(self):
+        """Return the keys of the response.
+
+        :returns: the keys
+        :rtype: [str | unicode]
+        """
+        return list(self._keys)
+
+    def as_dict(self):
+        """Return the raw response values as a dict.
+
+        :returns: the values, keyed like the response
+        :rtype: dict
+        """
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.as_dict())
+
+
+class Ticker(_Model):
+    """Trading summary, as returned by ``/ticker``.
+
+    :param body: the response body
+    :type body: dict
+    :param book: the name of the order book
+    :type book: str | unicode
+    """
+
+    __slots__ = ('book', '_timestamp', '_last', '_high', '_low', '_vwap',
+                 '_volume', '_bid', '_ask')
+    _keys = ('timestamp', 'last', 'high', 'low', 'vwap', 'volume', 'bid',
+             'ask')
+
+    timestamp = _Field('timestamp', int)
+    last = _Field('last', decimal)
+    high = _Field('high', decimal)
+    low = _Field('low', decimal)
+    vwap = _Field('vwap', decimal)
+    volume = _Field('volume', decimal)
+    bid = _Field('bid', decimal)
+    ask = _Field('ask', decimal)
+
+    def __init__(self, body, book=None):
+        super(Ticker, self).__init__(body)
+        self.book = book
+
+
+class Trade(_Model):
+    """Public trade, as returned by ``/transactions``.
+
+    :param body: the trade from the response
+    :type body: dict
+    :param book: the name of the order book
+    :type book: str | unicode
+    """
+
+    __slots__ = ('book', '_date', '_tid', '_price', '_amount', '_side')
+    _keys = ('date', 'tid', 'price', 'amount', 'side')
+    _shared = ('side',)
+
+    date = _Field('date', int)
+    tid = _Field('tid', int)
+    price = _Field('price', decimal)
+    amount = _Field('amount', decimal)
+    side = _Field('side', str)
+
+    def __init__(self, body, book=None):
+        super(Trade, self).__init__(body)
+        self.book = book
+
+
+class UserTrade(_Model):
+    """Trade of the user, as returned by ``/user_transactions``.
+
+    The amounts exchanged are listed under the names of the currencies of
+    the order book (e.g. ``trade['btc']`` and ``trade['cad']``), and are
+    decoded by :attr:`major` and :attr:`minor`.
+
+    :param body: the trade from the response
+    :type body: dict
+    :param book: the name of the order book
+    :type book: str | unicode
+    """
+
+    __slots__ = ('book', '_datetime', '_id', '_type', '_method', '_order_id',
+                 '_rate', '_fee', '_major', '_minor')
+    _keys = ('datetime', 'id', 'type', 'method', 'order_id', 'rate', 'fee')
+    _shared = ('method',)
+
+    datetime = _Field('datetime', str)
+    id = _Field('id', int)
+    type = _Field('type', int)
+    method = _Field('method', str)
+    order_id = _Field('order_id', str)
+    rate = _Field('rate', decimal)
+    fee = _Field('fee', decimal)
+    major = _Field('major', decimal)
+    minor = _Field('minor', decimal)
+
+    def __init__(self, body, book):
+        super(UserTrade, self).__init__(body)
+        self.book = book
+        major, minor = book.split('_')
+        self._major = body.get(major)
+        self._minor = body.get(minor)
+
+    def __getitem__(self, key):
+        currencies = self.book.split('_')
+        if key in currencies:
+            return self._major if key == currencies[0] else self._minor
+        return super(UserTrade, self).__getitem__(key)
+
+    def __contains__(self, key):
+        return key in self._keys or key in self.book.split('_')
+
+    def keys(self):
+        return list(self._keys) + self.book.split('_')
+
+
+class Order(_Model):
+    """Order of the user, as returned by the order endpoints.
+
+    Limit orders placed with ``/buy`` and ``/sell``, and the orders listed by
+    ``/open_orders`` and ``/lookup_order``, are returned as orders.
+
+    :param body: the order from the response
+    :type body: dict
+    :param book: the name of the order book, if missing from the response
+    :type book: str | unicode
+    """
+
+    __slots__ = ('_id', '_book', '_type', '_status', '_price', '_amount',
+                 '_datetime', '_created', '_updated')
+    _keys = ('id', 'book', 'type', 'status', 'price', 'amount', 'datetime',
+             'created', 'updated')
+
+    # Order statuses
+    CANCELLED, ACTIVE, PARTIAL, COMPLETE = -1, 0, 1, 2
+
+    id = _Field('id', str)
+    book = _Field('book', str)
+    type = _Field('type', int)
+    status = _Field('status', int)
+    price = _Field('price', decimal)
+    amount = _Field('amount', decimal)
+    datetime = _Field('datetime', str)
+    created = _Field('created', str)
+    updated = _Field('updated', str)
+
+    def __init__(self, body, book=None):
+        super(Order, self).__init__(body)
+        if self._book is None:
+            self._book = book
+
+    @property
+    def side(self):
+        """Return the side of the order.
+
+        :returns: ``"buy"`` or ``"sell"``
+        :rtype: str | unicode
+        """
+        return 'buy' if self.type == 0 else 'sell'
+
+    def keys(self):
+        return [key for key in self._keys if self[key] is not None]
+
+
+class Balance(_Model):
+    """Account balances, as returned by ``/balance``.
+
+    The response lists the balance, reserved and available amounts of each
+    currency (e.g. ``balance['cad_available']``), which are decoded by
+    :meth:`balance`, :meth:`reserved` and :meth:`available`.
+
+    :param body: the response body
+    :type body: dict
+    """
+
+    __slots__ = ('_body',)
+
+    def __init__(self, body):
+        self._body = body
+
+    def __getitem__(self, key):
+        return self._body[key]
+
+    def __contains__(self, key):
+        return key in self._body
+
+    def keys(self):
+        return list(self._body)
+
+    @property
+    def fee(self):
+        """Return the trading fee in percent.
+
+        :rtype: quadriga.fixedpoint.FixedPoint
+        """
+        return decimal(self._body['fee'])
+
+    def balance(self, currency):
+        """Return the total balance of a currency.
+
+        :param currency: the currency code (e.g. ``"cad"``)
+        :type currency: str | unicode
+        :returns: the balance
+        :rtype: quadriga.fixedpoint.FixedPoint
+        """
+        return decimal(self._body[currency + '_balance'])
+
+    def reserved(self, currency):
+        """Return the amount of a currency reserved by open orders.
+
+        :param currency: the currency code (e.g. ``"cad"``)
+        :type currency: str | unicode
+        :returns: the reserved amount
+        :rtype: quadriga.fixedpoint.FixedPoint
+        """
+        return decimal(self._body[currency + '_reserved'])
+
+    def available(self, currency):
+        """Return the amount of a currency available for trading.
+
+        :param currency: the currency code (e.g. ``"cad"``)
+        :type currency: str | unicode
+        :returns: the available amount
+        :rtype: quadriga.fixedpoint.FixedPoint
+        """
+        return decimal(self._body[currency + '_available'])
+
+
+class BookLevel(object):
+    """Price level of an order book, as listed by ``/order_book``.
+
+    It can be unpacked like the ``[price, amount]`` pair it replaces.
+
+    :param level: the ``[price, amount]`` pair from the response
+    :type level: [str | unicode]
+    """
+
+    __slots__ = ('_price', '_amount')
+
+    price = _Field('price', decimal)
+    amount = _Field('amount', decimal)
+
+    def __init__(self, level):
+        self._price, self._amount = level
+
+    @classmethod
+    def many(cls, levels):
+        """Build a level from each ``[price, amount]`` pair.
+
+        :param levels: the pairs from the response
+        :type levels: [[str | unicode]]
+        :returns: the levels
+        :rtype: [quadriga.models.BookLevel]
+        """
+        return [cls(level) for level in levels]
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return (self._price, self._amount)[index]
+
+    def __iter__(self):
+        yield self._price
+        yield self._amount
+
+    def __eq__(self, other):
+        if not isinstance(other, BookLevel):
+            return NotImplemented
+        return (self._price, self._amount) == (other._price, other._amount)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'BookLevel({!r}, {!r})'.format(self._price, self._amount)
+
+
+def order_book(body):
+    """Replace the ``[price, amount]`` pairs of an order book with levels.
+
+    :param body: the response body of ``/order_book``
+    :type body: dict
+    :returns: the body, with lists of :class:`BookLevel` as bids and asks
+    :rtype: dict
+    """
+    return {
+        'timestamp': body['timestamp'],
+        'bids': BookLevel.many(body['bids']),
+        'asks': BookLevel.many(body['asks']),
+    }
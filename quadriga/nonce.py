@@ -0,0 +1,130 @@
+from __future__ import absolute_import, unicode_literals
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+
+def _lock_file(fd):
+    """Acquire an exclusive lock on the open file, blocking if necessary.
+
+    :param fd: the file descriptor
+    :type fd: int
+    """
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:  # pragma: no cover
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(fd):
+    """Release the lock on the open file.
+
+    :param fd: the file descriptor
+    :type fd: int
+    """
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:  # pragma: no cover
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class NonceGenerator(object):
+    """Thread-safe source of strictly increasing nonces.
+
+    Nonces are millisecond timestamps, bumped past the last nonce issued
+    whenever two requests fall in the same millisecond or the system clock
+    is set back. A single instance can therefore be shared by any number of
+    threads signing requests with the same API key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = 0
+
+    def __call__(self):
+        """Return the next nonce.
+
+        :returns: a nonce greater than any previously returned
+        :rtype: int
+        """
+        with self._lock:
+            nonce = max(int(time.time() * 1000), self._last + 1)
+            self._last = nonce = self._commit(nonce)
+            return nonce
+
+    def _commit(self, nonce):
+        """Reserve the nonce with other processes sharing the API key.
+
+        :param nonce: the candidate nonce
+        :type nonce: int
+        :returns: the reserved nonce, which may be greater than the candidate
+        :rtype: int
+        """
+        return nonce
+
+
+class SharedNonceGenerator(NonceGenerator):
+    """Nonce generator coordinated through a shared-memory counter.
+
+    Create it before starting worker processes (e.g. with
+    :mod:`multiprocessing`), so that all of them inherit the same counter.
+
+    :param counter: the shared counter holding the last nonce issued
+        (defaults to a new one)
+    :type counter: multiprocessing.Value
+    """
+
+    def __init__(self, counter=None):
+        super(SharedNonceGenerator, self).__init__()
+        if counter is None:
+            import ctypes
+            import multiprocessing
+            counter = multiprocessing.Value(ctypes.c_int64, 0)
+        self.counter = counter
+
+    def _commit(self, nonce):
+        with self.counter.get_lock():
+            nonce = max(nonce, self.counter.value + 1)
+            self.counter.value = nonce
+        return nonce
+
+
+class FileNonceGenerator(NonceGenerator):
+    """Nonce generator coordinated through a lock file.
+
+    Any number of unrelated processes may share the API key, as long as they
+    use the same file. The last nonce issued is persisted in the file, so
+    nonces keep increasing across restarts even if the clock is set back.
+
+    :param path: the path to the lock file
+    :type path: str | unicode
+    """
+
+    def __init__(self, path):
+        super(FileNonceGenerator, self).__init__()
+        self.path = path
+
+    def _commit(self, nonce):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            _lock_file(fd)
+            try:
+                os.lseek(fd, 0, os.SEEK_SET)
+                last = os.read(fd, 32).strip()
+                nonce = max(nonce, int(last or 0) + 1)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, '{:<32d}'.format(nonce).encode('ascii'))
+            finally:
+                _unlock_file(fd)
+        finally:
+            os.close(fd)
+        return nonce
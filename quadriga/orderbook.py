@@ -0,0 +1,209 @@
+from __future__ import absolute_import, unicode_literals
+
+from array import array
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def parse_levels(levels):
+    """Parse ``[price, amount]`` string pairs into contiguous columns.
+
+    With NumPy installed, the pairs are parsed in a single vectorized call
+    and returned as float64 arrays. Otherwise they are parsed into
+    :class:`array.array` columns of doubles.
+
+    :param levels: the ``[price, amount]`` pairs from the API
+    :type levels: [[str | unicode]]
+    :returns: the prices and the amounts
+    :rtype: (numpy.ndarray, numpy.ndarray) | (array.array, array.array)
+    """
+    if np is not None:
+        columns = np.array(levels, dtype=np.float64).reshape(-1, 2).T
+        columns = np.ascontiguousarray(columns)
+        return columns[0], columns[1]
+    flat = array('d', map(float, chain.from_iterable(levels)))
+    return flat[0::2], flat[1::2]
+
+
+class OrderBook(object):
+    """Snapshot of an order book stored as contiguous price/amount columns.
+
+    Bids are ordered from the highest price and asks from the lowest price,
+    as returned by the API. The columns are NumPy arrays when NumPy is
+    installed, and :class:`array.array` objects otherwise.
+
+    :param book: the name of the order book
+    :type book: str | unicode
+    :param timestamp: the UNIX timestamp of the snapshot
+    :type timestamp: int
+    :param bids: the bid prices and amounts
+    :type bids: (numpy.ndarray, numpy.ndarray) | (array.array, array.array)
+    :param asks: the ask prices and amounts
+    :type asks: (numpy.ndarray, numpy.ndarray) | (array.array, array.array)
+    """
+
+    def __init__(self, book, timestamp, bids, asks):
+        self.book = book
+        self.timestamp = timestamp
+        self.bid_prices, self.bid_amounts = bids
+        self.ask_prices, self.ask_amounts = asks
+
+    def __repr__(self):
+        return '<OrderBook {} @ {}: {} bids, {} asks>'.format(
+            self.book, self.timestamp, len(self.bid_prices),
+            len(self.ask_prices)
+        )
+
+    @classmethod
+    def from_response(cls, response, book=None):
+        """Build the order book from the response of ``/order_book``.
+
+        :param response: the response from
+            :meth:`quadriga.QuadrigaClient.get_public_orders`
+        :type response: dict
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the order book
+        :rtype: quadriga.orderbook.OrderBook
+        """
+        return cls(
+            book=book,
+            timestamp=int(response['timestamp']),
+            bids=parse_levels(response['bids']),
+            asks=parse_levels(response['asks'])
+        )
+
+    def _side(self, side):
+        """Return the price and amount columns of a side.
+
+        :param side: ``"bid"`` or ``"ask"``
+        :type side: str | unicode
+        :returns: the prices and amounts
+        :rtype: tuple
+        :raises ValueError: on an invalid side
+        """
+        if side == 'bid':
+            return self.bid_prices, self.bid_amounts
+        if side == 'ask':
+            return self.ask_prices, self.ask_amounts
+        raise ValueError('Invalid side "{}" (choose from bid, ask)'
+                         .format(side))
+
+    @property
+    def best_bid(self):
+        """Return the highest bid.
+
+        :returns: the price and amount, or ``None`` if there are no bids
+        :rtype: (float, float) | None
+        """
+        if not len(self.bid_prices):
+            return None
+        return float(self.bid_prices[0]), float(self.bid_amounts[0])
+
+    @property
+    def best_ask(self):
+        """Return the lowest ask.
+
+        :returns: the price and amount, or ``None`` if there are no asks
+        :rtype: (float, float) | None
+        """
+        if not len(self.ask_prices):
+            return None
+        return float(self.ask_prices[0]), float(self.ask_amounts[0])
+
+    @property
+    def spread(self):
+        """Return the difference between the lowest ask and the highest bid.
+
+        :returns: the spread, or ``None`` if either side is empty
+        :rtype: float | None
+        """
+        if not len(self.bid_prices) or not len(self.ask_prices):
+            return None
+        return float(self.ask_prices[0] - self.bid_prices[0])
+
+    @property
+    def mid(self):
+        """Return the midpoint between the lowest ask and the highest bid.
+
+        :returns: the mid price, or ``None`` if either side is empty
+        :rtype: float | None
+        """
+        if not len(self.bid_prices) or not len(self.ask_prices):
+            return None
+        return float(self.ask_prices[0] + self.bid_prices[0]) / 2
+
+    def cumulative_depth(self, side):
+        """Return the running total of the amounts from the best price.
+
+        :param side: ``"bid"`` or ``"ask"``
+        :type side: str | unicode
+        :returns: the cumulative amount at each level
+        :rtype: numpy.ndarray | array.array
+        """
+        _, amounts = self._side(side)
+        if np is not None:
+            return np.cumsum(amounts)
+        total = 0.0
+        depth = array('d')
+        for amount in amounts:
+            total += amount
+            depth.append(total)
+        return depth
+
+    def depth_at(self, price, side):
+        """Return the amount available at the price or better.
+
+        :param price: the limit price
+        :type price: int | float
+        :param side: ``"bid"`` or ``"ask"``
+        :type side: str | unicode
+        :returns: the total amount of the levels at the price or better
+        :rtype: float
+        """
+        prices, amounts = self._side(side)
+        if np is not None:
+            mask = prices >= price if side == 'bid' else prices <= price
+            return float(amounts[mask].sum())
+        if side == 'bid':
+            return sum(a for p, a in zip(prices, amounts) if p >= price)
+        return sum(a for p, a in zip(prices, amounts) if p <= price)
+
+    def vwap(self, size, side):
+        """Return the average price of filling an amount against a side.
+
+        For example, ``vwap(2, 'ask')`` is the average price paid when buying
+        2 units at market.
+
+        :param size: the amount to fill
+        :type size: int | float
+        :param side: the side consumed (``"bid"`` or ``"ask"``)
+        :type side: str | unicode
+        :returns: the volume-weighted average price, or ``None`` if the side
+            does not have enough liquidity
+        :rtype: float | None
+        """
+        prices, amounts = self._side(side)
+        if size <= 0:
+            raise ValueError('Size must be positive')
+        if np is not None:
+            depth = np.cumsum(amounts)
+            if not len(depth) or depth[-1] < size:
+                return None
+            last = int(np.searchsorted(depth, size))
+            filled = depth[last - 1] if last else 0.0
+            cost = float(np.dot(prices[:last], amounts[:last]))
+            return (cost + float(prices[last]) * (size - filled)) / size
+        remaining = size
+        cost = 0.0
+        for price, amount in zip(prices, amounts):
+            taken = min(amount, remaining)
+            cost += price * taken
+            remaining -= taken
+            if remaining <= 0:
+                return cost / size
+        return None
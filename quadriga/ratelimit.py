@@ -0,0 +1,225 @@
+from __future__ import absolute_import, unicode_literals
+
+import heapq
+import itertools
+import threading
+
+from quadriga.compat import monotonic
+from quadriga.exceptions import RateLimitError
+
+
+# Request priorities (lower values are served first)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket which serves waiters by priority.
+
+    Tokens are added continuously at **rate** per second, up to **capacity**.
+    Waiters with a higher priority (lower value) are always served before
+    waiters with a lower priority, and waiters with equal priority are served
+    in arrival order.
+
+    :param rate: the number of tokens added per second
+    :type rate: int | float
+    :param capacity: the maximum number of tokens, i.e. the largest burst
+        allowed (defaults to **rate**)
+    :type capacity: int | float
+    :param clock: the function returning the current time in seconds
+    :type clock: callable
+    """
+
+    def __init__(self, rate, capacity=None, clock=monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._cond = threading.Condition(threading.Lock())
+        self._waiters = []
+        self._counter = itertools.count()
+
+    @property
+    def tokens(self):
+        """Return the number of tokens currently available.
+
+        :returns: the number of tokens
+        :rtype: float
+        """
+        with self._cond:
+            self._refill()
+            return self._tokens
+
+    def _refill(self):
+        """Add the tokens accrued since the last refill."""
+        now = self._clock()
+        elapsed = max(now - self._updated, 0)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def try_acquire(self, priority=PRIORITY_NORMAL):
+        """Take a token without waiting.
+
+        :param priority: the priority of the request
+        :type priority: int
+        :returns: ``True`` if a token was taken, ``False`` if none was
+            available or a request with the same or a higher priority is
+            already waiting
+        :rtype: bool
+        """
+        with self._cond:
+            if self._waiters and self._waiters[0][0] <= priority:
+                return False
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self, priority=PRIORITY_NORMAL, timeout=None):
+        """Take a token, waiting until one becomes available.
+
+        :param priority: the priority of the request
+        :type priority: int
+        :param timeout: the maximum number of seconds to wait, or ``None`` to
+            wait indefinitely
+        :type timeout: int | float | None
+        :returns: ``True`` if a token was taken, ``False`` on timeout
+        :rtype: bool
+        """
+        waiter = (priority, next(self._counter))
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            heapq.heappush(self._waiters, waiter)
+            try:
+                while True:
+                    self._refill()
+                    first = self._waiters[0] == waiter
+                    if first and self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    # The first waiter sleeps until its token accrues, the
+                    # others until they are notified of a change in order
+                    delay = (1 - self._tokens) / self.rate if first else None
+                    if deadline is not None:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            return False
+                        delay = remaining if delay is None \
+                            else min(delay, remaining)
+                    self._cond.wait(delay)
+            finally:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def drain(self):
+        """Discard all available tokens (e.g. after the server throttled)."""
+        with self._cond:
+            self._refill()
+            self._tokens = 0
+
+
+class RateLimiter(object):
+    """Client-side request scheduler with separate budgets for public GET
+    requests and signed POST requests.
+
+    Trading calls (``/buy``, ``/sell`` and ``/cancel_order``) are scheduled
+    ahead of any other waiting request in the same budget.
+
+    :param public_rate: the number of public requests allowed per second
+    :type public_rate: int | float
+    :param private_rate: the number of signed requests allowed per second
+    :type private_rate: int | float
+    :param public_burst: the largest burst of public requests allowed
+        (defaults to **public_rate**)
+    :type public_burst: int | float
+    :param private_burst: the largest burst of signed requests allowed
+        (defaults to **private_rate**)
+    :type private_burst: int | float
+    :param blocking: wait for the budget to allow a request, or raise
+        :class:`quadriga.exceptions.RateLimitError` immediately
+    :type blocking: bool
+    :param timeout: the maximum number of seconds to wait when blocking
+        before raising :class:`quadriga.exceptions.RateLimitError`, or
+        ``None`` to wait indefinitely
+    :type timeout: int | float | None
+    """
+
+    # Endpoints which are scheduled with a high priority
+    priority_endpoints = {'/buy', '/sell', '/cancel_order'}
+
+    def __init__(self,
+                 public_rate=2,
+                 private_rate=1,
+                 public_burst=None,
+                 private_burst=None,
+                 blocking=True,
+                 timeout=None):
+        self.public = TokenBucket(public_rate, public_burst)
+        self.private = TokenBucket(private_rate, private_burst)
+        self._blocking = blocking
+        self._timeout = timeout
+
+    def _bucket(self, method):
+        """Return the token bucket for the HTTP method.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        :returns: the token bucket
+        :rtype: quadriga.ratelimit.TokenBucket
+        """
+        return self.public if method == 'GET' else self.private
+
+    def priority(self, endpoint):
+        """Return the scheduling priority of the API endpoint.
+
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :returns: the priority
+        :rtype: int
+        """
+        if endpoint in self.priority_endpoints:
+            return PRIORITY_HIGH
+        return PRIORITY_NORMAL
+
+    def try_acquire(self, method, endpoint):
+        """Reserve budget for a request without waiting.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :returns: ``True`` if the request may be sent now
+        :rtype: bool
+        """
+        return self._bucket(method).try_acquire(self.priority(endpoint))
+
+    def acquire(self, method, endpoint):
+        """Reserve budget for a request, waiting if configured to do so.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :raises RateLimitError: if the budget does not allow the request
+        """
+        bucket = self._bucket(method)
+        priority = self.priority(endpoint)
+        if self._blocking:
+            allowed = bucket.acquire(priority, self._timeout)
+        else:
+            allowed = bucket.try_acquire(priority)
+        if not allowed:
+            raise RateLimitError(
+                'Request budget exhausted for {} {}'.format(method, endpoint)
+            )
+
+    def throttle(self, method):
+        """Discard the remaining budget after the server throttled a request.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        """
+        self._bucket(method).drain()
@@ -0,0 +1,286 @@
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import threading
+
+from quadriga.compat import monotonic, queue
+from quadriga.delta import OrderBookDiffer
+from quadriga.storage import OrderBookStore
+
+# Marks the end of the snapshot queue
+_STOP = object()
+
+
+class OrderBookRecorder(object):
+    """Long-running recorder of order book snapshots into SQLite.
+
+    A poller thread fetches the order books concurrently every **interval**
+    seconds and pushes the snapshots onto a bounded queue. A dedicated writer
+    thread drains the queue and inserts the snapshots in large transactions
+    into a :class:`quadriga.storage.OrderBookStore`. When the
+    writer falls behind and the queue fills up, the poller waits for room
+    instead of dropping snapshots.
+
+    With **keyframe_interval** set, only the price levels which changed since
+    the previous snapshot are stored, plus a full keyframe every so many
+    snapshots (see :mod:`quadriga.delta`). Use
+    :func:`quadriga.delta.reconstruct` to rebuild the books.
+
+    .. code-block:: python
+
+        client = QuadrigaClient()
+        with OrderBookRecorder(client, 'quadrigaData.db') as recorder:
+            time.sleep(3600)
+
+    :param client: the client used to fetch the order books
+    :type client: quadriga.QuadrigaClient
+    :param db_path: the path to the SQLite database, or to the file of
+        the store
+    :type db_path: str | unicode
+    :param books: the names of the order books to record (defaults to all)
+    :type books: [str | unicode]
+    :param interval: the number of seconds between polls
+    :type interval: int | float
+    :param group: group orders with the same price
+    :type group: bool
+    :param queue_size: the maximum number of snapshots waiting to be written
+    :type queue_size: int
+    :param batch_size: the maximum number of snapshots written in one
+        transaction
+    :type batch_size: int
+    :param keyframe_interval: the number of snapshots between full
+        keyframes when storing deltas, or ``None`` to store every snapshot
+        in full
+    :type keyframe_interval: int | None
+    :param store_class: the class of the store, created with the path to
+        the database (e.g. :class:`quadriga.binlog.BinaryLog`)
+    :type store_class: type
+    :raises ValueError: if deltas are requested from a store which only
+        records full snapshots
+    """
+
+    def __init__(self,
+                 client,
+                 db_path,
+                 books=None,
+                 interval=1.0,
+                 group=True,
+                 queue_size=1000,
+                 batch_size=100,
+                 keyframe_interval=None,
+                 store_class=OrderBookStore):
+        self._logger = logging.getLogger('quadriga')
+        self._client = client
+        self._db_path = db_path
+        self._books = sorted(books or client.order_books)
+        self._interval = interval
+        self._group = group
+        self._batch_size = batch_size
+        self._store_class = store_class
+        self._differ = None
+        if keyframe_interval is not None:
+            if not hasattr(store_class, 'insert_deltas'):
+                raise ValueError('{} does not store deltas'
+                                 .format(store_class.__name__))
+            self._differ = OrderBookDiffer(keyframe_interval)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._poller = None
+        self._writer = None
+        self.polls = 0
+        self.snapshots = 0
+        self.rows = 0
+        self.errors = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def running(self):
+        """Return ``True`` if any of the recorder threads is running.
+
+        :returns: whether the recorder is running
+        :rtype: bool
+        """
+        return any(thread is not None and thread.is_alive()
+                   for thread in (self._poller, self._writer))
+
+    def _log(self, message):
+        """Log a debug message.
+
+        :param message: the message to log
+        :type message: str | unicode
+        """
+        self._logger.debug('[recorder: {}] {}'.format(self._db_path, message))
+
+    def _write(self, store, snapshots):
+        """Insert the snapshots in a single transaction.
+
+        :param store: the store to write to
+        :type store: quadriga.storage.OrderBookStore |
+            quadriga.binlog.BinaryLog
+        :param snapshots: the ``(book, snapshot)`` pairs to insert
+        :type snapshots: [tuple]
+        """
+        try:
+            if self._differ is None:
+                self.rows += store.insert_snapshots(snapshots)
+            else:
+                self.rows += store.insert_deltas(self._differ, snapshots)
+        except ValueError as exc:
+            # A level which cannot be stored exactly fails the batch before
+            # anything is written, so the other snapshots are written alone
+            if len(snapshots) > 1:
+                for snapshot in snapshots:
+                    self._write(store, [snapshot])
+                return
+            self.errors += 1
+            self._logger.warning('[recorder: {}] cannot store {}: {}'.format(
+                self._db_path, snapshots[0][0], exc
+            ))
+            return
+        self.snapshots += len(snapshots)
+
+    def _fetch(self):
+        """Fetch a snapshot of every order book.
+
+        :returns: the ``(book, snapshot)`` pairs fetched successfully
+        :rtype: [tuple]
+        """
+        results = self._client.get_many(
+            'get_public_orders', books=self._books, group=self._group
+        )
+        self.polls += 1
+        snapshots = []
+        for book in self._books:
+            result = results[book]
+            if isinstance(result, Exception):
+                self.errors += 1
+                self._log('failed to fetch {}: {}'.format(book, result))
+            else:
+                snapshots.append((book, result))
+        return snapshots
+
+    def _poll(self):
+        """Fetch the order books on schedule until the recorder stops.
+
+        A poll which fails as a whole is counted as an error and retried at
+        the next interval, and the writer is always told to finish.
+        """
+        deadline = monotonic()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    snapshots = self._fetch()
+                except Exception as exc:
+                    self.errors += 1
+                    self._logger.exception(
+                        '[recorder: {}] poll failed: {}'
+                        .format(self._db_path, exc)
+                    )
+                else:
+                    for snapshot in snapshots:
+                        self._put(snapshot)
+                deadline += self._interval
+                self._stopping.wait(max(deadline - monotonic(), 0))
+        finally:
+            self._put(_STOP)
+
+    def _put(self, snapshot):
+        """Queue the snapshot, waiting for room if the writer lags behind.
+
+        :param snapshot: the ``(book, snapshot)`` pair
+        :type snapshot: tuple
+        """
+        while self._writer.is_alive():
+            try:
+                self._queue.put(snapshot, timeout=self._interval)
+                return
+            except queue.Full:
+                self._log('queue full, waiting for the writer')
+
+    def _drain(self):
+        """Write the queued snapshots until the poller signals the end."""
+        store = self._store_class(self._db_path)
+        try:
+            stopped = False
+            while not stopped:
+                batch = []
+                item = self._queue.get()
+                while item is not _STOP:
+                    batch.append(item)
+                    if len(batch) >= self._batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                stopped = item is _STOP
+                if batch:
+                    self._write(store, batch)
+        except Exception as exc:
+            self._logger.exception(
+                '[recorder: {}] writer failed: {}'.format(self._db_path, exc)
+            )
+            raise
+        finally:
+            store.close()
+
+    def record_once(self):
+        """Fetch and write a snapshot of every order book synchronously.
+
+        This is meant for short-lived collectors run periodically (e.g. by
+        cron) rather than for continuous recording.
+
+        :returns: the number of snapshots written
+        :rtype: int
+        """
+        snapshots = self._fetch()
+        with self._store_class(self._db_path) as store:
+            self._write(store, snapshots)
+        return len(snapshots)
+
+    def start(self):
+        """Start recording in the background."""
+        if self.running:
+            return
+        self._log('start recording {}'.format(', '.join(self._books)))
+        self._stopping.clear()
+        self._writer = threading.Thread(target=self._drain)
+        self._writer.daemon = True
+        self._writer.start()
+        self._poller = threading.Thread(target=self._poll)
+        self._poller.daemon = True
+        self._poller.start()
+
+    def stop(self, timeout=None):
+        """Stop recording and wait until all queued snapshots are written.
+
+        If the threads are still running after the timeout, the recorder
+        keeps track of them: it cannot be started again, and a later call
+        waits for them again.
+
+        :param timeout: the maximum number of seconds to wait for each of
+            the recorder threads, or ``None`` to wait indefinitely
+        :type timeout: int | float | None
+        :returns: ``True`` if the recorder threads have finished
+        :rtype: bool
+        """
+        if self._poller is None:
+            return True
+        self._log('stop recording')
+        self._stopping.set()
+        self._poller.join(timeout)
+        self._writer.join(timeout)
+        if self.running:
+            self._logger.warning(
+                '[recorder: {}] still running after {}s'
+                .format(self._db_path, timeout)
+            )
+            return False
+        self._poller = self._writer = None
+        return True
@@ -0,0 +1,270 @@
+"""Recording and replaying of HTTP interactions with QuadrigaCX.
+
+Responses from the real API are captured to a cassette on disk with
+:class:`RecordingSession`, then served back offline by
+:class:`ReplaySession`, optionally with simulated latency. Both plug into the
+client through its **wrap_session** parameter:
+
+.. code-block:: python
+
+    cassette = Cassette()
+    client = QuadrigaClient(
+        wrap_session=lambda session: RecordingSession(cassette, session)
+    )
+    client.get_public_orders(book='btc_cad')
+    cassette.save('btc_cad.jsonl')
+
+    client = QuadrigaClient(
+        wrap_session=lambda _: ReplaySession(Cassette.load('btc_cad.jsonl'))
+    )
+"""
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+import io
+import json
+import random
+import threading
+import time
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from quadriga.exceptions import ReplayError
+
+# Payload fields which change on every signed request and are therefore
+# ignored when matching requests
+_VOLATILE_FIELDS = {'key', 'nonce', 'signature'}
+
+
+def _request_key(method, url, params=None, payload=None):
+    """Return the key matching a request to its recorded responses.
+
+    :param method: the HTTP method
+    :type method: str | unicode
+    :param url: the request URL
+    :type url: str | unicode
+    :param params: the query string parameters
+    :type params: dict
+    :param payload: the JSON request body
+    :type payload: dict
+    :returns: the key
+    :rtype: str | unicode
+    """
+    payload = {
+        field: str(value) for field, value in (payload or {}).items()
+        if field not in _VOLATILE_FIELDS
+    }
+    params = {field: str(value) for field, value in (params or {}).items()}
+    return json.dumps([method, url, params, payload], sort_keys=True)
+
+
+class Cassette(object):
+    """Recorded HTTP interactions.
+
+    Each interaction holds the request (with the key, nonce and signature of
+    signed requests left out) and the response status, reason, headers and
+    body. Requests made several times keep all of their responses, which
+    are replayed in turn.
+
+    :param interactions: the recorded interactions
+    :type interactions: [dict]
+    """
+
+    def __init__(self, interactions=None):
+        self._lock = threading.Lock()
+        self.interactions = []
+        self._responses = {}
+        for interaction in interactions or []:
+            self._index(interaction)
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def _index(self, interaction):
+        """Add an interaction to the cassette.
+
+        :param interaction: the interaction
+        :type interaction: dict
+        """
+        request = interaction['request']
+        key = _request_key(request['method'], request['url'],
+                           request.get('params'), request.get('payload'))
+        self.interactions.append(interaction)
+        self._responses.setdefault(key, []).append(interaction['response'])
+
+    @classmethod
+    def load(cls, path):
+        """Load a cassette saved with :meth:`save`.
+
+        :param path: the path to the cassette file
+        :type path: str | unicode
+        :returns: the cassette
+        :rtype: quadriga.replay.Cassette
+        """
+        with io.open(path, encoding='utf-8') as fp:
+            return cls([json.loads(line) for line in fp if line.strip()])
+
+    def save(self, path):
+        """Save the cassette as one JSON interaction per line.
+
+        :param path: the path to the cassette file
+        :type path: str | unicode
+        """
+        with self._lock:
+            lines = [json.dumps(interaction, sort_keys=True) + '\n'
+                     for interaction in self.interactions]
+        with io.open(path, 'w', encoding='utf-8') as fp:
+            fp.writelines(lines)
+
+    def record(self, method, url, params, payload, response):
+        """Add a request and its response.
+
+        :param method: the HTTP method
+        :type method: str | unicode
+        :param url: the request URL
+        :type url: str | unicode
+        :param params: the query string parameters
+        :type params: dict
+        :param payload: the JSON request body
+        :type payload: dict
+        :param response: the HTTP response
+        :type response: requests.models.Response
+        """
+        interaction = {
+            'request': {
+                'method': method,
+                'url': url,
+                'params': params,
+                'payload': {
+                    field: value for field, value in (payload or {}).items()
+                    if field not in _VOLATILE_FIELDS
+                } if payload is not None else None,
+            },
+            'response': {
+                'status': response.status_code,
+                'reason': response.reason,
+                'headers': dict(response.headers),
+                'body': response.content.decode('utf-8', 'replace'),
+            },
+        }
+        with self._lock:
+            self._index(interaction)
+
+    def responses(self, method, url, params=None, payload=None):
+        """Return the responses recorded for a request.
+
+        :param method: the HTTP method
+        :type method: str | unicode
+        :param url: the request URL
+        :type url: str | unicode
+        :param params: the query string parameters
+        :type params: dict
+        :param payload: the JSON request body
+        :type payload: dict
+        :returns: the recorded responses, oldest first
+        :rtype: [dict]
+        :raises ReplayError: if the request was never recorded
+        """
+        key = _request_key(method, url, params, payload)
+        try:
+            return self._responses[key]
+        except KeyError:
+            raise ReplayError(
+                'No recorded response for {} {} (params: {}, payload: {})'
+                .format(method, url, params, payload)
+            )
+
+
+class RecordingSession(object):
+    """Session which sends requests and records them to a cassette.
+
+    :param cassette: the cassette to record to
+    :type cassette: quadriga.replay.Cassette
+    :param session: the session sending the requests
+    :type session: requests.Session
+    """
+
+    def __init__(self, cassette, session):
+        self.cassette = cassette
+        self._session = session
+
+    def get(self, url, params=None, **kwargs):
+        response = self._session.get(url=url, params=params, **kwargs)
+        self.cassette.record('GET', url, params, None, response)
+        return response
+
+    def post(self, url, json=None, **kwargs):
+        response = self._session.post(url=url, json=json, **kwargs)
+        self.cassette.record('POST', url, None, json, response)
+        return response
+
+    def close(self):
+        self._session.close()
+
+
+class ReplaySession(object):
+    """Session which serves recorded responses without any network access.
+
+    The responses of a request are served in the order they were recorded,
+    starting over after the last one. Each response is delayed by
+    **latency** seconds, plus up to **jitter** seconds at random.
+
+    :param cassette: the cassette to replay
+    :type cassette: quadriga.replay.Cassette
+    :param latency: the simulated latency in seconds
+    :type latency: int | float
+    :param jitter: the maximum random latency added in seconds
+    :type jitter: int | float
+    :param sleep: the function waiting for the latency
+    :type sleep: callable
+    """
+
+    def __init__(self, cassette, latency=0, jitter=0, sleep=time.sleep):
+        self.cassette = cassette
+        self._latency = latency
+        self._jitter = jitter
+        self._sleep = sleep
+        self._positions = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _replay(self, method, url, params, payload):
+        """Serve the next recorded response for a request.
+
+        :returns: the HTTP response
+        :rtype: requests.models.Response
+        :raises ReplayError: if the request was never recorded
+        """
+        responses = self.cassette.responses(method, url, params, payload)
+        key = _request_key(method, url, params, payload)
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = (position + 1) % len(responses)
+            self.requests += 1
+        recorded = responses[position]
+
+        delay = self._latency
+        if self._jitter:
+            delay += random.uniform(0, self._jitter)
+        if delay:
+            self._sleep(delay)
+
+        response = Response()
+        response.url = url
+        response.status_code = recorded['status']
+        response.reason = recorded['reason']
+        response.headers = CaseInsensitiveDict(recorded['headers'])
+        response.encoding = 'utf-8'
+        response._content = recorded['body'].encode('utf-8')
+        response.elapsed = datetime.timedelta(seconds=delay)
+        return response
+
+    def get(self, url, params=None, **_):
+        return self._replay('GET', url, params, None)
+
+    def post(self, url, json=None, **_):
+        return self._replay('POST', url, None, json)
+
+    def close(self):
+        pass
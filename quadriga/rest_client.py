@@ -2,11 +2,48 @@ from __future__ import absolute_import, unicode_literals
 
 import hashlib
 import hmac
-import time
+import threading
 
-import requests
+from quadriga.compat import monotonic
+from quadriga.decoders import get_decoder
+from quadriga.exceptions import RateLimitError, RequestError
+from quadriga.fixedpoint import FixedPoint
+from quadriga.metrics import NULL_TIMER, RequestTimer
+from quadriga.nonce import NonceGenerator
 
-from quadriga.exceptions import RequestError
+
+# HTTP adapter class applying a default timeout, defined when the first
+# session is created: importing requests takes longer than importing the
+# rest of the package, so it is deferred until a request is actually sent
+_timeout_adapter = None
+
+
+def _get_timeout_adapter():
+    """Return the HTTP adapter class which applies a default timeout.
+
+    :returns: the adapter class
+    :rtype: type
+    """
+    global _timeout_adapter
+    if _timeout_adapter is None:
+        from requests.adapters import HTTPAdapter
+
+        class _TimeoutHTTPAdapter(HTTPAdapter):
+            """HTTP adapter applying a default timeout to every request."""
+
+            def __init__(self, timeout=None, **kwargs):
+                self._timeout = timeout
+                super(_TimeoutHTTPAdapter, self).__init__(**kwargs)
+
+            def send(self, request, **kwargs):
+                if kwargs.get('timeout') is None:
+                    kwargs['timeout'] = self._timeout
+                return super(_TimeoutHTTPAdapter, self).send(
+                    request, **kwargs
+                )
+
+        _timeout_adapter = _TimeoutHTTPAdapter
+    return _timeout_adapter
 
 
 class RestClient(object):
@@ -14,13 +51,31 @@ class RestClient(object):
 
     endpoint_prefix = 'https://api.quadrigacx.com/v2'
 
+    # Number of times a request rejected for its nonce is signed again. Nonces
+    # of concurrent requests can reach the server out of order, and a rejected
+    # request has not been processed, so it is always safe to resend it.
+    nonce_retries = 3
+
     def __init__(self,
                  api_key=None,
                  api_secret=None,
-                 client_id=None):
+                 client_id=None,
+                 pool_size=10,
+                 idle_timeout=60,
+                 cache=None,
+                 rate_limiter=None,
+                 retry_policy=None,
+                 timeout=30,
+                 nonce_generator=None,
+                 decoder='json',
+                 metrics=None,
+                 wrap_session=None,
+                 endpoint_prefix=None):
         """Wrapper for sending requests to QuadrigaCX.
 
-        Authentication using HMAC SHA256 is carried out here.
+        Authentication using HMAC SHA256 is carried out here. Requests are
+        sent over a persistent session so that TCP and TLS connections are
+        kept alive and reused between calls.
 
         :param api_key: the API key from QuadrigaCX
         :type api_key: str | unicode
@@ -28,11 +83,126 @@ class RestClient(object):
         :type api_secret: str | unicode
         :param client_id: the QuadrigaCX client ID
         :type client_id: str | unicode
+        :param pool_size: the maximum number of connections kept alive per
+            host (should be at least the number of threads sharing the client)
+        :type pool_size: int
+        :param idle_timeout: the number of seconds the client may sit idle
+            before its pooled connections are dropped, or ``None`` to keep
+            them indefinitely
+        :type idle_timeout: int | float | None
+        :param cache: the cache for responses from public endpoints
+        :type cache: quadriga.cache.ResponseCache
+        :param rate_limiter: the scheduler enforcing the request budget
+        :type rate_limiter: quadriga.ratelimit.RateLimiter
+        :param retry_policy: the policy for retrying failed requests, or
+            ``None`` to never retry
+        :type retry_policy: quadriga.retry.RetryPolicy
+        :param timeout: the number of seconds to wait for the server to
+            connect or send data (or a ``(connect, read)`` tuple), or ``None``
+            to wait indefinitely
+        :type timeout: int | float | tuple | None
+        :param nonce_generator: the source of nonces for signed requests,
+            which must be shared by everything signing with the same API key
+            (defaults to a new thread-safe generator)
+        :type nonce_generator: quadriga.nonce.NonceGenerator
+        :param decoder: the response decoder (``"json"``, ``"fast"`` or
+            ``"raw"``, see :mod:`quadriga.decoders`) or a callable taking the
+            HTTP response and returning its body
+        :type decoder: str | unicode | callable
+        :param metrics: the sink (or list of sinks) receiving the timings,
+            status and error of every request, or ``None`` to disable
+            instrumentation (see :mod:`quadriga.metrics`)
+        :type metrics: object | list | None
+        :param wrap_session: the function applied to each new pooled session,
+            returning the object which sends the requests (e.g. a recording or
+            replaying session from :mod:`quadriga.replay`)
+        :type wrap_session: callable
+        :param endpoint_prefix: the base URL of the API, e.g. that of a local
+            simulator from :mod:`quadriga.simulator` (defaults to the
+            QuadrigaCX v2 API)
+        :type endpoint_prefix: str | unicode
         """
+        if endpoint_prefix is not None:
+            self.endpoint_prefix = endpoint_prefix
         self._api_key = str(api_key)
         self._hmac_key = str(api_secret).encode('utf-8')
         self._client_id = str(client_id)
         self._http_success = {code for code in range(200, 210)}
+        self._pool_size = pool_size
+        self._idle_timeout = idle_timeout
+        self._session = None
+        self._last_used = None
+        self._session_lock = threading.Lock()
+        self._cache = cache
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy
+        self._timeout = timeout
+        self._nonce_generator = nonce_generator or NonceGenerator()
+        self._decoder = get_decoder(decoder)
+        if metrics is not None and not isinstance(metrics, (list, tuple)):
+            metrics = [metrics]
+        self._metrics = metrics
+        self._wrap_session = wrap_session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _create_session(self):
+        """Create a new HTTP session backed by a keep-alive connection pool.
+
+        :returns: the new session (or the object wrapping it)
+        :rtype: requests.Session
+        """
+        import requests
+        session = requests.Session()
+        adapter = _get_timeout_adapter()(
+            timeout=self._timeout,
+            pool_connections=1,
+            pool_maxsize=self._pool_size
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if self._wrap_session is not None:
+            return self._wrap_session(session)
+        return session
+
+    def _get_session(self):
+        """Return the pooled HTTP session, creating it if necessary.
+
+        If the client has been idle for longer than the idle timeout, the
+        pooled connections are closed first, as the server has most likely
+        dropped them already and reusing them would fail.
+
+        :returns: the HTTP session
+        :rtype: requests.Session
+        """
+        now = monotonic()
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._create_session()
+            elif (self._idle_timeout is not None and
+                  now - self._last_used > self._idle_timeout):
+                self.reap_idle_connections()
+            self._last_used = now
+            return self._session
+
+    def reap_idle_connections(self):
+        """Close all pooled connections which are not currently in use.
+
+        The session remains usable and reconnects on the next request.
+        """
+        if self._session is not None:
+            self._session.close()
+
+    def close(self):
+        """Close the HTTP session and all of its pooled connections."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
 
     def _compute_signature(self, nonce):
         """Compute the signature using HMAC SHA256 for authentication.
@@ -49,13 +219,34 @@ class RestClient(object):
             digestmod=hashlib.sha256
         ).hexdigest()
 
+    def _sign_payload(self, payload=None):
+        """Add the API key, a fresh nonce and its signature to the payload.
+
+        :param payload: the request payload
+        :type payload: dict
+        :returns: the signed request payload
+        :rtype: dict
+        """
+        nonce = self._nonce_generator()
+        signature = self._compute_signature(nonce)
+
+        # Fixed-point prices and amounts are sent as exact decimal strings
+        payload = {
+            key: str(value) if isinstance(value, FixedPoint) else value
+            for key, value in (payload or {}).items()
+        }
+        payload['key'] = self._api_key
+        payload['nonce'] = nonce
+        payload['signature'] = signature
+        return payload
+
     def _handle_response(self, response):
         """Handle the response from QuadrigaCX.
 
         :param response: the response from QuadrigaCX
         :type response: requests.models.Response
-        :returns: the JSON response body
-        :rtype: dict
+        :returns: the response body, as returned by the decoder
+        :rtype: dict | list | bytes
         :raises QuadrigaRequestError: HTTP 2XX was not returned
         """
         http_code = response.status_code
@@ -67,7 +258,7 @@ class RestClient(object):
                 )
             )
         try:
-            body = response.json()
+            body = self._decoder(response)
         except ValueError:
             raise RequestError(
                 response=response,
@@ -76,7 +267,7 @@ class RestClient(object):
                 )
             )
         else:
-            if 'error' in body:
+            if isinstance(body, dict) and 'error' in body:
                 error_code = body['error'].get('code', '?')
                 raise RequestError(
                     response=response,
@@ -89,6 +280,126 @@ class RestClient(object):
                 )
             return body
 
+    def _should_resign(self, exc, attempt):
+        """Return ``True`` if a signed request should be sent again.
+
+        :param exc: the error returned for the request
+        :type exc: quadriga.exceptions.RequestError
+        :param attempt: the number of times the request was signed again
+        :type attempt: int
+        :returns: whether the request was rejected for its nonce and may be
+            signed again with a fresh one
+        :rtype: bool
+        """
+        return (
+            attempt < self.nonce_retries and
+            exc.error_code is not None and
+            'nonce' in exc.error_msg.lower()
+        )
+
+    @staticmethod
+    def _is_idempotent(method, endpoint):
+        """Return ``True`` if the request can be safely repeated.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :returns: whether the request is idempotent
+        :rtype: bool
+        """
+        if method == 'GET':
+            return True
+        return not (
+            endpoint in {'/buy', '/sell'} or endpoint.endswith('_withdrawal')
+        )
+
+    def _request(self, method, endpoint, params=None, payload=None):
+        """Send an HTTP request to QuadrigaCX, retrying it if configured.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :param params: the request parameters (GET only)
+        :type params: dict
+        :param payload: the request payload (POST only)
+        :type payload: dict
+        :returns: the JSON response body from QuadrigaCX
+        :rtype: dict
+        """
+        if self._retry_policy is None:
+            return self._send(method, endpoint, params, payload)
+        return self._retry_policy.call(
+            lambda: self._send(method, endpoint, params, payload),
+            idempotent=self._is_idempotent(method, endpoint)
+        )
+
+    def _send(self, method, endpoint, params=None, payload=None):
+        """Send an HTTP request to QuadrigaCX within the request budget.
+
+        POST payloads are signed right before sending, after any wait for the
+        rate limiter, and signed again with a fresh nonce if the server
+        rejects their nonce.
+
+        :param method: the HTTP method (``"GET"`` or ``"POST"``)
+        :type method: str | unicode
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :param params: the request parameters (GET only)
+        :type params: dict
+        :param payload: the request payload (POST only)
+        :type payload: dict
+        :returns: the JSON response body from QuadrigaCX
+        :rtype: dict
+        :raises RateLimitError: if the request budget is exhausted
+        """
+        url = self.endpoint_prefix + endpoint
+        for attempt in range(self.nonce_retries + 1):
+            timer = NULL_TIMER
+            if self._metrics:
+                timer = RequestTimer(self._metrics, method, endpoint)
+
+            if self._rate_limiter is not None:
+                try:
+                    self._rate_limiter.acquire(method, endpoint)
+                except RateLimitError:
+                    timer.mark('wait')
+                    timer.finish(error='RateLimitError')
+                    raise
+            timer.mark('wait')
+
+            session = self._get_session()
+            try:
+                if method == 'GET':
+                    response = session.get(url=url, params=params)
+                else:
+                    response = session.post(
+                        url=url, json=self._sign_payload(payload)
+                    )
+            except Exception as exc:
+                timer.mark('request')
+                timer.finish(error=type(exc).__name__)
+                raise
+            timer.mark('request')
+            timer.response(response)
+
+            status = response.status_code
+            if status == 429 and self._rate_limiter is not None:
+                self._rate_limiter.throttle(method)
+            try:
+                body = self._handle_response(response)
+            except RequestError as exc:
+                timer.mark('decode')
+                timer.finish(status, 'RequestError' if exc.error_code is None
+                             else 'ERR {}'.format(exc.error_code))
+                if method == 'GET' or not self._should_resign(exc, attempt):
+                    raise
+            else:
+                timer.mark('decode')
+                timer.finish(status)
+                return body
+
     def get(self, endpoint, params=None):
         """Send an HTTP GET request to QuadrigaCX.
 
@@ -99,11 +410,13 @@ class RestClient(object):
         :returns: the JSON response body from QuadrigaCX
         :rtype: dict
         """
-        response = requests.get(
-            url=self.endpoint_prefix + endpoint,
-            params=params
-        )
-        return self._handle_response(response)
+        if self._cache is not None:
+            return self._cache.get_or_fetch(
+                endpoint,
+                params,
+                lambda: self._request('GET', endpoint, params)
+            )
+        return self._request('GET', endpoint, params)
 
     def post(self, endpoint, payload=None):
         """Send an HTTP POST request to QuadrigaCX.
@@ -115,17 +428,4 @@ class RestClient(object):
         :return: the JSON response body from QuadrigaCX
         :rtype: dict
         """
-        nonce = int(time.time() * 1000)
-        signature = self._compute_signature(nonce)
-
-        if payload is None:
-            payload = {}
-        payload['key'] = self._api_key
-        payload['nonce'] = nonce
-        payload['signature'] = signature
-
-        response = requests.post(
-            url=self.endpoint_prefix + endpoint,
-            json=payload
-        )
-        return self._handle_response(response)
+        return self._request('POST', endpoint, payload=payload)
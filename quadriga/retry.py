@@ -0,0 +1,148 @@
+from __future__ import absolute_import, unicode_literals
+
+import random
+import time
+
+from quadriga.compat import monotonic
+from quadriga.exceptions import RequestError
+
+
+def is_transient(exc):
+    """Return ``True`` if the error is likely to go away on its own.
+
+    Connection errors, timeouts, HTTP 429 and HTTP 5XX responses are
+    considered transient.
+
+    :param exc: the error raised by the request
+    :type exc: Exception
+    :returns: whether the error is transient
+    :rtype: bool
+    """
+    if isinstance(exc, RequestError):
+        return exc.http_code == 429 or 500 <= exc.http_code < 600
+    # Imported on the first failure, so that the policy is cheap to create
+    from requests.exceptions import ConnectionError, Timeout
+    return isinstance(exc, (ConnectionError, Timeout))
+
+
+def is_unsent(exc):
+    """Return ``True`` if the request failed before it reached the server.
+
+    This is the case when a connection could not be established, so the
+    request can be retried even if it is not idempotent.
+
+    :param exc: the error raised by the request
+    :type exc: Exception
+    :returns: whether the request has definitely not been sent
+    :rtype: bool
+    """
+    from requests.exceptions import ConnectionError, ConnectTimeout
+    from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+    if isinstance(exc, ConnectTimeout):
+        return True
+    if isinstance(exc, ConnectionError) and exc.args:
+        reason = getattr(exc.args[0], 'reason', exc.args[0])
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    return False
+
+
+class RetryPolicy(object):
+    """Policy for retrying failed requests with exponential backoff.
+
+    The delay before the n-th retry is ``backoff * 2 ** (n - 1)`` seconds,
+    capped at **max_backoff**. With **jitter** enabled, the actual delay is
+    drawn uniformly between zero and that value, so that clients which
+    failed together do not retry together. A ``Retry-After`` header sent by
+    the server is honoured as a lower bound.
+
+    Idempotent requests are retried on any error accepted by **retry_on**.
+    Other requests (e.g. placing orders) are retried only if they failed
+    before being sent to the server.
+
+    :param max_attempts: the maximum number of attempts, including the first
+    :type max_attempts: int
+    :param backoff: the delay before the first retry in seconds
+    :type backoff: int | float
+    :param max_backoff: the maximum delay between attempts in seconds
+    :type max_backoff: int | float
+    :param max_elapsed: the maximum number of seconds to keep retrying,
+        counted from the first attempt, or ``None`` for no limit
+    :type max_elapsed: int | float | None
+    :param jitter: randomize the delays between attempts
+    :type jitter: bool
+    :param retry_on: the predicate which decides if an error is worth
+        retrying (defaults to :func:`is_transient`)
+    :type retry_on: callable
+    :param sleep: the function used to wait between attempts
+    :type sleep: callable
+    :param clock: the function returning the current time in seconds
+    :type clock: callable
+    """
+
+    def __init__(self,
+                 max_attempts=3,
+                 backoff=0.1,
+                 max_backoff=5,
+                 max_elapsed=30,
+                 jitter=True,
+                 retry_on=is_transient,
+                 sleep=time.sleep,
+                 clock=monotonic):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_elapsed = max_elapsed
+        self.jitter = jitter
+        self.retry_on = retry_on
+        self._sleep = sleep
+        self._clock = clock
+
+    def delay(self, attempt, exc=None):
+        """Return the number of seconds to wait before the next attempt.
+
+        :param attempt: the number of attempts made so far
+        :type attempt: int
+        :param exc: the error raised by the last attempt
+        :type exc: Exception
+        :returns: the delay in seconds
+        :rtype: float
+        """
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        headers = getattr(exc, 'headers', None) or {}
+        try:
+            delay = max(delay, float(headers.get('Retry-After', 0)))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+    def call(self, func, idempotent=True):
+        """Call the function, retrying it according to the policy.
+
+        :param func: the function which sends the request
+        :type func: callable
+        :param idempotent: whether the request can be safely repeated
+        :type idempotent: bool
+        :returns: the return value of the function
+        :raises Exception: the error raised by the last attempt
+        """
+        start = self._clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func()
+            except Exception as exc:
+                if attempt >= self.max_attempts:
+                    raise
+                if not self.retry_on(exc):
+                    raise
+                if not idempotent and not is_unsent(exc):
+                    raise
+                delay = self.delay(attempt, exc)
+                if self.max_elapsed is not None:
+                    elapsed = self._clock() - start
+                    if elapsed + delay > self.max_elapsed:
+                        raise
+                self._sleep(delay)
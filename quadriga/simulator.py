@@ -0,0 +1,877 @@
+"""Local simulator of the QuadrigaCX v2 API, for testing and load testing.
+
+:class:`Exchange` keeps accounts, order books and trades in memory and
+matches orders with price-time priority. :class:`ExchangeSimulator` serves
+it over HTTP, verifying the signatures of private requests exactly like the
+real API, and can inject latency and errors:
+
+.. code-block:: python
+
+    exchange = Exchange()
+    exchange.add_account('key', 'secret', 'client', {'cad': '10000'})
+    exchange.seed_book('btc_cad', bids=[('4990', '1')], asks=[('5010', '1')])
+
+    with ExchangeSimulator(exchange, latency=0.02, error_rate=0.01) as sim:
+        client = QuadrigaClient('key', 'secret', 'client',
+                                endpoint_prefix=sim.url)
+        client.buy_market_order('0.5', book='btc_cad')
+
+Amounts and prices are integer counts of the smallest unit of their
+currency (see :mod:`quadriga.fixedpoint`), so matching never rounds. The
+cost of a trade is rounded up for the buyer and down for the seller.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import threading
+import time
+from bisect import bisect_left, insort
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlparse
+except ImportError:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlparse
+
+from quadriga import QuadrigaClient
+from quadriga.fixedpoint import CURRENCY_PLACES, FixedPoint, parse_scaled
+
+# Order statuses and types, as returned by the API
+CANCELLED, ACTIVE, PARTIAL, COMPLETE = '-1', '0', '1', '2'
+_TYPES = {'buy': '0', 'sell': '1'}
+
+# Number of recent trades kept per order book
+_TRADE_HISTORY = 100000
+
+# Seconds covered by each time frame of /transactions
+_TIME_FRAMES = {'minute': 60, 'hour': 3600}
+
+
+class SimulatorError(Exception):
+    """Error returned to the client in the body of a response.
+
+    :param code: the API error code
+    :type code: int
+    :param message: the error message
+    :type message: str | unicode
+    """
+
+    # API error codes returned by the simulator
+    INVALID_SIGNATURE = 101
+    INVALID_PARAMETER = 102
+    NOT_FOUND = 104
+    INVALID_NONCE = 106
+    INSUFFICIENT_FUNDS = 21
+
+    def __init__(self, code, message):
+        super(SimulatorError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+    def body(self):
+        """Return the error as a response body.
+
+        :returns: the body
+        :rtype: dict
+        """
+        return {'error': {'code': self.code, 'message': self.message}}
+
+
+def _ceil_div(numerator, denominator):
+    return -(-numerator // denominator)
+
+
+def _format(units, places):
+    return str(FixedPoint(units, places))
+
+
+def _datetime(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp))
+
+
+class _Account(object):
+    """Balances of a trader, in units of each currency."""
+
+    __slots__ = ('api_key', 'api_secret', 'client_id', 'balances',
+                 'reserved', 'last_nonce')
+
+    def __init__(self, api_key, api_secret, client_id, balances):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.client_id = client_id
+        self.balances = balances
+        self.reserved = collections.defaultdict(int)
+        self.last_nonce = 0
+
+    def available(self, currency):
+        return self.balances[currency] - self.reserved[currency]
+
+
+class _Order(object):
+    """Order placed on the simulated exchange."""
+
+    __slots__ = ('id', 'book', 'side', 'price', 'amount', 'remaining',
+                 'account', 'reserved', 'status', 'created', 'updated')
+
+    def __init__(self, id, book, side, price, amount, account, created):
+        self.id = id
+        self.book = book
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.remaining = amount
+        self.account = account
+        self.reserved = 0
+        self.status = ACTIVE
+        self.created = self.updated = created
+
+
+class _Book(object):
+    """Resting orders of an order book, queued by price level.
+
+    The prices of each side are kept in an ascending list of integer units,
+    so the best level is at one end and levels are found by binary search.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.major, self.minor = name.split('_')
+        self.amount_places = CURRENCY_PLACES[self.major]
+        self.price_places = CURRENCY_PLACES[self.minor]
+        self.prices = {'buy': [], 'sell': []}
+        self.levels = {'buy': {}, 'sell': {}}
+        self.trades = collections.deque(maxlen=_TRADE_HISTORY)
+
+    def cost(self, amount, price, side):
+        """Return the minor currency units paid or received for a trade."""
+        total = amount * price
+        scale = 10 ** self.amount_places
+        if side == 'buy':
+            return _ceil_div(total, scale)
+        return total // scale
+
+    def best(self, side):
+        """Return the best price of a side, or ``None`` if it is empty."""
+        prices = self.prices[side]
+        if not prices:
+            return None
+        return prices[-1] if side == 'buy' else prices[0]
+
+    def makers(self, side, limit=None):
+        """Yield the resting orders a taker on a side would match, in turn.
+
+        :param side: the side of the taker (``"buy"`` or ``"sell"``)
+        :param limit: the limit price of the taker, or ``None`` for a
+            market order
+        """
+        maker_side = 'sell' if side == 'buy' else 'buy'
+        prices = self.prices[maker_side]
+        levels = self.levels[maker_side]
+        index = 0
+        while index < len(prices):
+            price = prices[index] if side == 'buy' else prices[-1 - index]
+            if limit is not None and (
+                    price > limit if side == 'buy' else price < limit):
+                return
+            for order in list(levels[price]):
+                yield order
+            # A level emptied by the taker is removed, and the next level
+            # takes its place
+            if price in levels:
+                index += 1
+
+    def add(self, order):
+        level = self.levels[order.side].get(order.price)
+        if level is None:
+            level = self.levels[order.side][order.price] = (
+                collections.deque()
+            )
+            insort(self.prices[order.side], order.price)
+        level.append(order)
+
+    def remove(self, order):
+        level = self.levels[order.side][order.price]
+        level.remove(order)
+        if not level:
+            del self.levels[order.side][order.price]
+            prices = self.prices[order.side]
+            del prices[bisect_left(prices, order.price)]
+
+
+class Exchange(object):
+    """In-memory exchange matching orders with price-time priority.
+
+    Orders from the accounts added with :meth:`add_account` are matched
+    against each other and against the liquidity added with
+    :meth:`seed_book`, which belongs to a house account with unlimited
+    funds. All methods are thread-safe.
+
+    :param books: the names of the order books (defaults to those of
+        :class:`quadriga.QuadrigaClient`)
+    :type books: [str | unicode]
+    :param clock: the wall clock timestamping orders and trades
+    :type clock: callable
+    """
+
+    def __init__(self, books=None, clock=time.time):
+        self._books = {
+            name: _Book(name)
+            for name in (books or QuadrigaClient.order_books)
+        }
+        self._currencies = sorted(
+            {book.major for book in self._books.values()} |
+            {book.minor for book in self._books.values()}
+        )
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._accounts = {}
+        self._orders = {}
+        self._ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+
+    def add_account(self, api_key, api_secret, client_id, balances=None):
+        """Open an account, funded with the given balances.
+
+        :param api_key: the API key of the account
+        :type api_key: str | unicode
+        :param api_secret: the API secret of the account
+        :type api_secret: str | unicode
+        :param client_id: the client ID of the account
+        :type client_id: str | unicode
+        :param balances: the decimal balance of each currency (e.g.
+            ``{"cad": "1000"}``), zero if missing
+        :type balances: dict
+        """
+        units = {currency: 0 for currency in self._currencies}
+        for currency, amount in (balances or {}).items():
+            units[currency] = parse_scaled(
+                str(amount), CURRENCY_PLACES[currency]
+            )
+        with self._lock:
+            self._accounts[api_key] = _Account(
+                api_key, api_secret, client_id, units
+            )
+
+    def seed_book(self, book, bids=(), asks=()):
+        """Add resting orders from the house account.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param bids: the ``(price, amount)`` pairs of the buy orders
+        :type bids: [(str | unicode, str | unicode)]
+        :param asks: the ``(price, amount)`` pairs of the sell orders
+        :type asks: [(str | unicode, str | unicode)]
+        """
+        for side, levels in (('buy', bids), ('sell', asks)):
+            for price, amount in levels:
+                self.place_order(None, side, book, amount, price)
+
+    def authenticate(self, payload):
+        """Return the account signing a request.
+
+        The signature must be the HMAC SHA256 of the nonce, client ID and API
+        key, keyed with the API secret, and the nonce must be greater than
+        that of any previous request of the account.
+
+        :param payload: the JSON body of the request
+        :type payload: dict
+        :returns: the account
+        :raises SimulatorError: on an invalid key, signature or nonce
+        """
+        try:
+            key = payload['key']
+            nonce = int(payload['nonce'])
+            signature = payload['signature']
+        except (KeyError, TypeError, ValueError):
+            raise SimulatorError(
+                SimulatorError.INVALID_SIGNATURE,
+                'Missing key, nonce or signature'
+            )
+        account = self._accounts.get(key)
+        if account is not None:
+            expected = hmac.new(
+                key=account.api_secret.encode('utf-8'),
+                msg=(str(nonce) + account.client_id + key).encode('utf-8'),
+                digestmod=hashlib.sha256
+            ).hexdigest()
+        if account is None or not hmac.compare_digest(
+                expected, str(signature)):
+            raise SimulatorError(
+                SimulatorError.INVALID_SIGNATURE,
+                'Invalid API Code or Invalid Signature'
+            )
+        with self._lock:
+            if nonce <= account.last_nonce:
+                raise SimulatorError(
+                    SimulatorError.INVALID_NONCE,
+                    'Invalid nonce: must be greater than {}'.format(
+                        account.last_nonce
+                    )
+                )
+            account.last_nonce = nonce
+        return account
+
+    def _book(self, name):
+        book = self._books.get(name)
+        if book is None:
+            raise SimulatorError(
+                SimulatorError.INVALID_PARAMETER,
+                'Invalid book "{}"'.format(name)
+            )
+        return book
+
+    @staticmethod
+    def _parse(value, places, name):
+        try:
+            units = parse_scaled(str(value), places)
+        except ValueError:
+            units = 0
+        if units <= 0:
+            raise SimulatorError(
+                SimulatorError.INVALID_PARAMETER,
+                'Invalid {} "{}"'.format(name, value)
+            )
+        return units
+
+    def _order(self, account, order_id):
+        order = self._orders.get(order_id)
+        if order is None or order.account is not account:
+            raise SimulatorError(
+                SimulatorError.NOT_FOUND,
+                'Order "{}" not found'.format(order_id)
+            )
+        return order
+
+    def ticker(self, book):
+        """Return the trading summary of the last 24 hours.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the summary, as returned by ``/ticker``
+        :rtype: dict
+        """
+        book = self._book(book)
+        with self._lock:
+            now = self._clock()
+            day = [trade for trade in book.trades if trade[0] > now - 86400]
+            bid, ask = book.best('buy'), book.best('sell')
+            last = book.trades[-1][2] if book.trades else None
+        volume = sum(trade[3] for trade in day)
+        summary = {
+            'timestamp': str(int(now)),
+            'volume': _format(volume, book.amount_places),
+            'bid': None if bid is None else _format(bid, book.price_places),
+            'ask': None if ask is None else _format(ask, book.price_places),
+        }
+        prices = [trade[2] for trade in day]
+        for name, price in (('last', last),
+                            ('high', max(prices) if prices else last),
+                            ('low', min(prices) if prices else last)):
+            summary[name] = (
+                None if price is None else _format(price, book.price_places)
+            )
+        summary['vwap'] = summary['last']
+        if volume:
+            summary['vwap'] = _format(
+                sum(trade[2] * trade[3] for trade in day) // volume,
+                book.price_places
+            )
+        return summary
+
+    def order_book(self, book, group=True):
+        """Return the resting orders, best first.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param group: merge the orders with the same price
+        :type group: bool
+        :returns: the order book, as returned by ``/order_book``
+        :rtype: dict
+        """
+        book = self._book(book)
+        result = {}
+        with self._lock:
+            for side, key in (('buy', 'bids'), ('sell', 'asks')):
+                prices = book.prices[side]
+                levels = []
+                for price in (reversed(prices) if side == 'buy' else prices):
+                    orders = book.levels[side][price]
+                    amounts = (
+                        [sum(order.remaining for order in orders)] if group
+                        else [order.remaining for order in orders]
+                    )
+                    text = _format(price, book.price_places)
+                    levels.extend(
+                        [text, _format(amount, book.amount_places)]
+                        for amount in amounts
+                    )
+                result[key] = levels
+            result['timestamp'] = str(int(self._clock()))
+        return result
+
+    def transactions(self, book, time_frame='hour'):
+        """Return the trades of the last minute or hour, newest first.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param time_frame: ``"minute"`` or ``"hour"``
+        :type time_frame: str | unicode
+        :returns: the trades, as returned by ``/transactions``
+        :rtype: [dict]
+        """
+        book = self._book(book)
+        since = self._clock() - _TIME_FRAMES.get(time_frame, 3600)
+        with self._lock:
+            trades = [trade for trade in reversed(book.trades)
+                      if trade[0] > since]
+        return [{
+            'date': str(int(timestamp)),
+            'tid': tid,
+            'price': _format(price, book.price_places),
+            'amount': _format(amount, book.amount_places),
+            'side': side,
+        } for timestamp, tid, price, amount, side in trades]
+
+    def balance(self, account):
+        """Return the balances of an account.
+
+        :param account: the authenticated account
+        :returns: the balances, as returned by ``/balance``
+        :rtype: dict
+        """
+        result = {'fee': '0.0000'}
+        with self._lock:
+            for currency in self._currencies:
+                places = CURRENCY_PLACES[currency]
+                result[currency + '_balance'] = _format(
+                    account.balances[currency], places
+                )
+                result[currency + '_reserved'] = _format(
+                    account.reserved[currency], places
+                )
+                result[currency + '_available'] = _format(
+                    account.available(currency), places
+                )
+        return result
+
+    def _fill(self, book, taker, maker, amount, timestamp):
+        """Settle a trade between a taker and a resting maker order."""
+        price = maker.price
+        buyer, seller = (taker, maker) if taker.side == 'buy' else (
+            maker, taker
+        )
+        for order, currency, paid, received, income in (
+                (buyer, book.minor, book.cost(amount, price, 'buy'),
+                 book.major, amount),
+                (seller, book.major, amount,
+                 book.minor, book.cost(amount, price, 'sell'))):
+            account = order.account
+            if account is None:
+                continue
+            released = min(paid, order.reserved)
+            order.reserved -= released
+            account.reserved[currency] -= released
+            account.balances[currency] -= paid
+            account.balances[received] += income
+
+        for order in (taker, maker):
+            order.remaining -= amount
+            order.status = COMPLETE if not order.remaining else PARTIAL
+            order.updated = timestamp
+        if not maker.remaining:
+            book.remove(maker)
+            self._release(book, maker)
+        book.trades.append(
+            (timestamp, next(self._trade_ids), price, amount, taker.side)
+        )
+
+    def _release(self, book, order):
+        """Return the funds still reserved by a closed order."""
+        if order.account is not None and order.reserved:
+            currency = book.minor if order.side == 'buy' else book.major
+            order.account.reserved[currency] -= order.reserved
+            order.reserved = 0
+
+    def place_order(self, account, side, book, amount, price=None):
+        """Place an order, matching it against the resting orders.
+
+        A limit order rests in the book for the amount not filled right
+        away. A market order fills what it can and never rests.
+
+        :param account: the authenticated account, or ``None`` for the
+            house account
+        :param side: ``"buy"`` or ``"sell"``
+        :type side: str | unicode
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param amount: the decimal amount of major currency
+        :type amount: str | unicode
+        :param price: the decimal limit price, or ``None`` for a market order
+        :type price: str | unicode | None
+        :returns: the response to ``/buy`` or ``/sell``
+        :rtype: dict
+        :raises SimulatorError: on invalid parameters or insufficient funds
+        """
+        book = self._book(book)
+        amount = self._parse(amount, book.amount_places, 'amount')
+        if price is not None:
+            price = self._parse(price, book.price_places, 'price')
+
+        with self._lock:
+            timestamp = self._clock()
+            order = _Order(
+                '{:064x}'.format(next(self._ids)), book.name, side, price,
+                amount, account, timestamp
+            )
+            if account is not None:
+                self._reserve(book, order)
+
+            fills = []
+            for maker in book.makers(side, price):
+                if not order.remaining:
+                    break
+                if maker.account is not None and maker.account is account:
+                    continue
+                filled = min(order.remaining, maker.remaining)
+                fills.append({
+                    'price': _format(maker.price, book.price_places),
+                    'amount': _format(filled, book.amount_places),
+                })
+                self._fill(book, order, maker, filled, timestamp)
+
+            if price is None:
+                self._release(book, order)
+                return {
+                    'amount': _format(amount - order.remaining,
+                                      book.amount_places),
+                    'orders_matched': fills,
+                }
+            self._orders[order.id] = order
+            if order.remaining:
+                book.add(order)
+            else:
+                self._release(book, order)
+            return self._describe(order, book)
+
+    def _reserve(self, book, order):
+        """Reserve the funds an order may spend, checking the balance.
+
+        Market buy orders reserve the cost of walking the book for their
+        amount, which is all they can spend.
+        """
+        if order.side == 'sell':
+            currency, needed = book.major, order.amount
+        elif order.price is not None:
+            currency = book.minor
+            needed = book.cost(order.amount, order.price, 'buy')
+        else:
+            currency, needed, remaining = book.minor, 0, order.amount
+            for maker in book.makers('buy'):
+                if not remaining:
+                    break
+                if maker.account is order.account:
+                    continue
+                filled = min(remaining, maker.remaining)
+                needed += book.cost(filled, maker.price, 'buy')
+                remaining -= filled
+        account = order.account
+        if needed > account.available(currency):
+            raise SimulatorError(
+                SimulatorError.INSUFFICIENT_FUNDS,
+                'Exceeds available {} balance'.format(currency)
+            )
+        account.reserved[currency] += needed
+        order.reserved = needed
+
+    def _describe(self, order, book):
+        return {
+            'id': order.id,
+            'book': order.book,
+            'type': _TYPES[order.side],
+            'status': order.status,
+            'price': _format(order.price, book.price_places),
+            'amount': _format(order.remaining, book.amount_places),
+            'datetime': _datetime(order.created),
+        }
+
+    def open_orders(self, account, book):
+        """Return the orders of an account still resting in a book.
+
+        :param account: the authenticated account
+        :param book: the name of the order book
+        :type book: str | unicode
+        :returns: the orders, as returned by ``/open_orders``
+        :rtype: [dict]
+        """
+        book = self._book(book)
+        with self._lock:
+            return [
+                self._describe(order, book)
+                for order in self._orders.values()
+                if order.account is account and order.book == book.name and
+                order.status in (ACTIVE, PARTIAL)
+            ]
+
+    def lookup_order(self, account, order_id):
+        """Return an order of an account.
+
+        :param account: the authenticated account
+        :param order_id: the ID of the order
+        :type order_id: str | unicode
+        :returns: the order, as returned by ``/lookup_order``
+        :rtype: [dict]
+        :raises SimulatorError: if the account has no such order
+        """
+        with self._lock:
+            order = self._order(account, order_id)
+            book = self._books[order.book]
+            result = self._describe(order, book)
+            result['created'] = result.pop('datetime')
+            result['updated'] = _datetime(order.updated)
+            return [result]
+
+    def cancel_order(self, account, order_id):
+        """Cancel a resting order of an account.
+
+        :param account: the authenticated account
+        :param order_id: the ID of the order
+        :type order_id: str | unicode
+        :returns: ``True``
+        :rtype: bool
+        :raises SimulatorError: if the account has no such open order
+        """
+        with self._lock:
+            order = self._order(account, order_id)
+            if order.status not in (ACTIVE, PARTIAL):
+                raise SimulatorError(
+                    SimulatorError.NOT_FOUND,
+                    'Order "{}" is not open'.format(order_id)
+                )
+            book = self._books[order.book]
+            book.remove(order)
+            self._release(book, order)
+            order.status = CANCELLED
+            order.updated = self._clock()
+            return True
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class ExchangeSimulator(object):
+    """HTTP server exposing an :class:`Exchange` as the QuadrigaCX v2 API.
+
+    Connections are kept alive and each one is served by its own thread, so
+    a pooled client can send thousands of requests per second. Point the
+    client at :attr:`url` with its **endpoint_prefix** parameter.
+
+    Every request is delayed by **latency** seconds plus up to **jitter**
+    seconds at random, and fails with one of **error_statuses** with
+    probability **error_rate**, before reaching the exchange.
+
+    :param exchange: the simulated exchange (defaults to a new one)
+    :type exchange: quadriga.simulator.Exchange
+    :param host: the address to listen on
+    :type host: str | unicode
+    :param port: the port to listen on (defaults to any free port)
+    :type port: int
+    :param latency: the delay of each response in seconds
+    :type latency: int | float
+    :param jitter: the maximum random delay added in seconds
+    :type jitter: int | float
+    :param error_rate: the probability of failing a request
+    :type error_rate: float
+    :param error_statuses: the HTTP statuses of the failed requests
+    :type error_statuses: [int]
+    :param seed: the seed of the random delays and errors
+    :type seed: int
+    :param sleep: the function waiting for the delays
+    :type sleep: callable
+    """
+
+    def __init__(self,
+                 exchange=None,
+                 host='127.0.0.1',
+                 port=0,
+                 latency=0,
+                 jitter=0,
+                 error_rate=0,
+                 error_statuses=(429, 500, 502, 503),
+                 seed=None,
+                 sleep=time.sleep):
+        self.exchange = exchange or Exchange()
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._error_statuses = tuple(error_statuses)
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._sleep = sleep
+        self._server = _ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def url(self):
+        """Return the endpoint prefix of the simulated API.
+
+        :returns: the URL
+        :rtype: str | unicode
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/v2'.format(host, port)
+
+    def start(self):
+        """Serve requests from a background thread.
+
+        :returns: the simulator
+        :rtype: quadriga.simulator.ExchangeSimulator
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def _inject(self):
+        """Return the delay and the injected error status of a request.
+
+        :returns: the delay in seconds and the status, or ``None``
+        :rtype: (float, int | None)
+        """
+        with self._random_lock:
+            delay = self._latency
+            if self._jitter:
+                delay += self._random.uniform(0, self._jitter)
+            status = None
+            if self._error_rate and self._random.random() < self._error_rate:
+                status = self._random.choice(self._error_statuses)
+        return delay, status
+
+    def dispatch(self, method, endpoint, params):
+        """Answer a request to the API.
+
+        :param method: the HTTP method
+        :type method: str | unicode
+        :param endpoint: the API endpoint/path
+        :type endpoint: str | unicode
+        :param params: the query string (GET) or JSON body (POST)
+        :type params: dict
+        :returns: the HTTP status and the response body
+        :rtype: (int, object)
+        """
+        exchange = self.exchange
+        try:
+            if method == 'GET':
+                book = params.get('book', 'btc_cad')
+                if endpoint == '/ticker':
+                    return 200, exchange.ticker(book)
+                if endpoint == '/order_book':
+                    group = str(params.get('group', '1')) != '0'
+                    return 200, exchange.order_book(book, group)
+                if endpoint == '/transactions':
+                    return 200, exchange.transactions(
+                        book, params.get('time', 'hour')
+                    )
+                return 404, {'error': {'code': 404, 'message': 'Not found'}}
+
+            account = exchange.authenticate(params)
+            book = params.get('book', 'btc_cad')
+            if endpoint == '/balance':
+                return 200, exchange.balance(account)
+            if endpoint in ('/buy', '/sell'):
+                return 200, exchange.place_order(
+                    account, endpoint[1:], book, params.get('amount'),
+                    params.get('price')
+                )
+            if endpoint == '/open_orders':
+                return 200, exchange.open_orders(account, book)
+            if endpoint == '/lookup_order':
+                return 200, exchange.lookup_order(account, params.get('id'))
+            if endpoint == '/cancel_order':
+                return 200, exchange.cancel_order(account, params.get('id'))
+            return 404, {'error': {'code': 404, 'message': 'Not found'}}
+        except SimulatorError as exc:
+            return 200, exc.body()
+
+    def _handler(self):
+        """Return the request handler class bound to the simulator."""
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            # Headers and body are written separately, which would otherwise
+            # stall each keep-alive response on a delayed ACK
+            disable_nagle_algorithm = True
+
+            def _respond(self, status, body):
+                content = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _serve(self, method):
+                url = urlparse(self.path)
+                if method == 'GET':
+                    params = dict(parse_qsl(url.query))
+                else:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    try:
+                        params = json.loads(
+                            self.rfile.read(length).decode('utf-8') or '{}'
+                        )
+                    except ValueError:
+                        params = None
+                    if not isinstance(params, dict):
+                        return self._respond(400, {'error': {
+                            'code': 400, 'message': 'Invalid JSON body'
+                        }})
+
+                delay, status = simulator._inject()
+                if delay:
+                    simulator._sleep(delay)
+                if status is not None:
+                    return self._respond(status, {'error': {
+                        'code': status, 'message': 'Injected error'
+                    }})
+                endpoint = url.path
+                if endpoint.startswith('/v2/'):
+                    endpoint = endpoint[3:]
+                self._respond(*simulator.dispatch(method, endpoint, params))
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+            def log_message(self, *_):
+                pass
+
+        return Handler
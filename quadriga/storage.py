@@ -0,0 +1,409 @@
+from __future__ import absolute_import, unicode_literals
+
+import sqlite3
+
+from quadriga.delta import ASK, BID, create_tables, reconstruct, write_delta
+from quadriga.fixedpoint import book_places, parse_scaled
+
+# Most decimal places stored for amounts: in wei (10^-18 ether), a 64-bit
+# integer could not even hold 10 ether
+MAX_AMOUNT_PLACES = 10
+
+# Range of the 64-bit integers stored by SQLite and the binary formats
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+# Scales of the original collector, which stored every book in satoshis and
+# cents
+_LEGACY_PLACES = (8, 2)
+
+
+def storage_places(book):
+    """Return the scales at which the levels of an order book are stored.
+
+    Prices are stored in the smallest unit of the minor currency (e.g.
+    cents for ``btc_cad``, satoshis for ``eth_btc``), and amounts in the
+    smallest unit of the major currency, but with at most
+    :data:`MAX_AMOUNT_PLACES` decimal places.
+
+    :param book: the name of the order book
+    :type book: str | unicode
+    :returns: the decimal places of the amounts and of the prices
+    :rtype: (int, int)
+    :raises KeyError: on an unknown currency
+    """
+    amount_places, price_places = book_places(book)
+    return min(amount_places, MAX_AMOUNT_PLACES), price_places
+
+
+def _stored(text, places):
+    """Parse a decimal string into the integer stored for it.
+
+    :param text: the decimal string
+    :type text: str | unicode
+    :param places: the decimal places of the stored unit
+    :type places: int
+    :returns: the scaled integer
+    :rtype: int
+    :raises ValueError: on a string more precise than the unit, or too
+        large for a 64-bit integer
+    """
+    value = parse_scaled(text, places)
+    if not _INT64_MIN <= value <= _INT64_MAX:
+        raise ValueError('{} does not fit in 64 bits at 10^-{}'
+                         .format(text, places))
+    return value
+
+
+def snapshot_rows(book, snapshot):
+    """Convert an order book snapshot into rows of the recorder table.
+
+    Amounts and prices are parsed exactly from the decimal strings of the
+    API, into integers at the scales of :func:`storage_places`.
+
+    :param book: the name of the order book
+    :type book: str | unicode
+    :param snapshot: the response from
+        :meth:`quadriga.QuadrigaClient.get_public_orders`
+    :type snapshot: dict
+    :returns: the ``(timeStamp, type, amount, price, book)`` rows
+    :rtype: [tuple]
+    :raises ValueError: on an amount or price which cannot be stored exactly
+    """
+    amount_places, price_places = storage_places(book)
+    timestamp = int(snapshot['timestamp'])
+    rows = []
+    for side, levels in ((BID, snapshot['bids']), (ASK, snapshot['asks'])):
+        rows.extend(
+            (timestamp, side, _stored(amount, amount_places),
+             _stored(price, price_places), book)
+            for price, amount in levels
+        )
+    return rows
+
+
+def _migrate_legacy_table(conn, legacy_book):
+    """Create the ``transactionOrders`` table of the original collector."""
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS transactionOrders '
+        '(timeStamp INT, type INT, amount INT, price INT)'
+    )
+
+
+def _migrate_book_column(conn, legacy_book):
+    """Add the book column and index the table by book and time."""
+    columns = [row[1] for row in conn.execute(
+        'PRAGMA table_info(transactionOrders)'
+    )]
+    if 'book' not in columns:
+        conn.execute('ALTER TABLE transactionOrders ADD COLUMN book TEXT')
+    conn.execute(
+        'CREATE INDEX IF NOT EXISTS transactionOrders_book_timeStamp '
+        'ON transactionOrders (book, timeStamp)'
+    )
+
+
+def _migrate_delta_tables(conn, legacy_book):
+    """Create the tables holding keyframes and deltas."""
+    create_tables(conn)
+
+
+def _legacy_factors(book):
+    """Return the factors rescaling levels stored in satoshis and cents.
+
+    :param book: the name of the order book
+    :type book: str | unicode
+    :returns: the factors of the amounts and prices, or ``None`` if the
+        book is unknown or still stored at those scales
+    :rtype: (int, int) | None
+    """
+    try:
+        places = storage_places(book)
+    except (KeyError, ValueError):
+        return None
+    if places == _LEGACY_PLACES:
+        return None
+    return (10 ** (places[0] - _LEGACY_PLACES[0]),
+            10 ** (places[1] - _LEGACY_PLACES[1]))
+
+
+def _migrate_book_scales(conn, legacy_book):
+    """Rescale the levels stored in satoshis and cents for every book."""
+    books = [row[0] for row in conn.execute(
+        'SELECT DISTINCT book FROM transactionOrders WHERE book IS NOT NULL '
+        'UNION SELECT DISTINCT book FROM orderBookSnapshots'
+    )]
+    for book in books:
+        factors = _legacy_factors(book)
+        if factors is None:
+            continue
+        conn.execute(
+            'UPDATE transactionOrders SET amount = amount * ?, '
+            'price = price * ? WHERE book = ?', factors + (book,)
+        )
+        conn.execute(
+            'UPDATE orderBookLevels SET amount = amount * ?, '
+            'price = price * ? WHERE snapshot IN '
+            '(SELECT id FROM orderBookSnapshots WHERE book = ?)',
+            factors + (book,)
+        )
+
+
+# Schema migrations in order; the database's user_version is the number of
+# migrations applied to it
+MIGRATIONS = [
+    _migrate_legacy_table,
+    _migrate_book_column,
+    _migrate_delta_tables,
+    _migrate_book_scales,
+]
+
+
+def _assign_legacy_book(conn, legacy_book):
+    """Assign the rows recorded without a book, rescaling their levels.
+
+    :param conn: the database connection
+    :type conn: sqlite3.Connection
+    :param legacy_book: the name of the order book of the rows
+    :type legacy_book: str | unicode
+    """
+    factors = _legacy_factors(legacy_book) or (1, 1)
+    conn.execute(
+        'UPDATE transactionOrders SET book = ?, amount = amount * ?, '
+        'price = price * ? WHERE book IS NULL', (legacy_book,) + factors
+    )
+
+
+def migrate(conn, legacy_book=None):
+    """Bring the database schema up to date.
+
+    Each pending migration runs in its own transaction, and the schema
+    version is stored in the database's ``user_version``. Rows recorded
+    before the book column existed are assigned to **legacy_book** whenever
+    it is given, even if the schema was migrated without it.
+
+    :param conn: the database connection
+    :type conn: sqlite3.Connection
+    :param legacy_book: the name of the order book to assign to rows
+        recorded before the book column existed
+    :type legacy_book: str | unicode
+    :returns: the schema version
+    :rtype: int
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for index in range(version, len(MIGRATIONS)):
+        with conn:
+            MIGRATIONS[index](conn, legacy_book)
+            conn.execute('PRAGMA user_version = {:d}'.format(index + 1))
+    if legacy_book is not None:
+        with conn:
+            _assign_legacy_book(conn, legacy_book)
+    return len(MIGRATIONS)
+
+
+class OrderBookStore(object):
+    """SQLite store of recorded order books.
+
+    Full snapshots live in the ``transactionOrders`` table, with the side of
+    each level in the ``type`` column (0 for bids, 1 for asks), and are
+    indexed by book and time. Deltas live in the tables described in
+    :func:`quadriga.delta.create_tables`. The schema is migrated when the
+    store is opened.
+
+    A store holds a single connection and must only be used by the thread
+    which created it.
+
+    :param path: the path to the SQLite database
+    :type path: str | unicode
+    :param legacy_book: the name of the order book to assign to rows
+        recorded before the book column existed
+    :type legacy_book: str | unicode
+    :param fetch_size: the number of rows fetched at a time by the queries
+    :type fetch_size: int
+    """
+
+    def __init__(self, path, legacy_book=None, fetch_size=10000):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._fetch_size = fetch_size
+        self.version = migrate(self._conn, legacy_book)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Close the database connection."""
+        self._conn.close()
+
+    def _stream(self, query, args):
+        """Run the query and yield its rows in chunks of **fetch_size**.
+
+        :param query: the SQL query
+        :type query: str | unicode
+        :param args: the query arguments
+        :type args: tuple
+        :returns: the rows
+        :rtype: collections.Iterator[tuple]
+        """
+        cursor = self._conn.execute(query, args)
+        try:
+            while True:
+                rows = cursor.fetchmany(self._fetch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+
+    def insert_snapshots(self, snapshots):
+        """Insert full snapshots in a single transaction.
+
+        :param snapshots: the ``(book, snapshot)`` pairs, where each snapshot
+            is a response from
+            :meth:`quadriga.QuadrigaClient.get_public_orders`
+        :type snapshots: [tuple]
+        :returns: the number of rows inserted
+        :rtype: int
+        """
+        rows = []
+        for book, snapshot in snapshots:
+            rows.extend(snapshot_rows(book, snapshot))
+        return self.insert_rows(rows)
+
+    def insert_rows(self, rows):
+        """Insert snapshot rows in a single transaction.
+
+        :param rows: the ``(timeStamp, type, amount, price, book)`` rows, as
+            returned by :func:`snapshot_rows`
+        :type rows: [tuple]
+        :returns: the number of rows inserted
+        :rtype: int
+        """
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO transactionOrders '
+                '(timeStamp, type, amount, price, book) VALUES (?,?,?,?,?)',
+                rows
+            )
+        return len(rows)
+
+    def insert_deltas(self, differ, snapshots):
+        """Insert snapshots as keyframes and deltas in a single transaction.
+
+        :param differ: the differ tracking the previous snapshots
+        :type differ: quadriga.delta.OrderBookDiffer
+        :param snapshots: the ``(book, snapshot)`` pairs, where each snapshot
+            is a response from
+            :meth:`quadriga.QuadrigaClient.get_public_orders`
+        :type snapshots: [tuple]
+        :returns: the number of levels inserted
+        :rtype: int
+        """
+        return self.insert_delta_rows(differ, [
+            (book, int(snapshot['timestamp']), snapshot_rows(book, snapshot))
+            for book, snapshot in snapshots
+        ])
+
+    def insert_delta_rows(self, differ, snapshots):
+        """Insert snapshot rows as keyframes and deltas in one transaction.
+
+        :param differ: the differ tracking the previous snapshots
+        :type differ: quadriga.delta.OrderBookDiffer
+        :param snapshots: the ``(book, timestamp, rows)`` triples, where the
+            rows are as returned by :func:`snapshot_rows`
+        :type snapshots: [tuple]
+        :returns: the number of levels inserted
+        :rtype: int
+        """
+        count = 0
+        with self._conn:
+            for book, timestamp, rows in snapshots:
+                keyframe, changes = differ.update(book, rows)
+                count += write_delta(
+                    self._conn, book, timestamp, keyframe, changes
+                )
+        return count
+
+    def books(self):
+        """Return the names of the order books with full snapshots.
+
+        :returns: the names of the order books
+        :rtype: [str | unicode]
+        """
+        return [row[0] for row in self._conn.execute(
+            'SELECT DISTINCT book FROM transactionOrders '
+            'WHERE book IS NOT NULL ORDER BY book'
+        )]
+
+    def range(self, book, start, end):
+        """Stream the full snapshot rows recorded in a time range.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param start: the first UNIX timestamp (inclusive)
+        :type start: int
+        :param end: the last UNIX timestamp (inclusive)
+        :type end: int
+        :returns: the ``(timeStamp, type, amount, price)`` rows in
+            chronological order
+        :rtype: collections.Iterator[tuple]
+        """
+        return self._stream(
+            'SELECT timeStamp, type, amount, price FROM transactionOrders '
+            'WHERE book = ? AND timeStamp BETWEEN ? AND ? '
+            'ORDER BY timeStamp', (book, start, end)
+        )
+
+    def timestamps(self, book, start, end):
+        """Stream the timestamps of the full snapshots in a time range.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param start: the first UNIX timestamp (inclusive)
+        :type start: int
+        :param end: the last UNIX timestamp (inclusive)
+        :type end: int
+        :returns: the timestamps in chronological order
+        :rtype: collections.Iterator[int]
+        """
+        for row in self._stream(
+                'SELECT DISTINCT timeStamp FROM transactionOrders '
+                'WHERE book = ? AND timeStamp BETWEEN ? AND ? '
+                'ORDER BY timeStamp', (book, start, end)):
+            yield row[0]
+
+    def book_at(self, book, timestamp):
+        """Return the order book as it was at the given time.
+
+        Both full snapshots and deltas are considered, and the most recent
+        of them at or before the given time is returned.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param timestamp: the UNIX timestamp
+        :type timestamp: int
+        :returns: the timestamp of the order book, and its bids (highest
+            first) and asks (lowest first) as ``(price, amount)`` pairs, or
+            ``None`` if nothing was recorded
+        :rtype: dict | None
+        """
+        result = reconstruct(self._conn, book, timestamp)
+        latest = self._conn.execute(
+            'SELECT MAX(timeStamp) FROM transactionOrders '
+            'WHERE book = ? AND timeStamp <= ?', (book, timestamp)
+        ).fetchone()[0]
+        if latest is None or (result and result['timestamp'] > latest):
+            return result
+
+        bids, asks = [], []
+        for side, amount, price in self._conn.execute(
+                'SELECT type, amount, price FROM transactionOrders '
+                'WHERE book = ? AND timeStamp = ?', (book, latest)):
+            (bids if side == BID else asks).append((price, amount))
+        bids.sort(reverse=True)
+        asks.sort()
+        return {'timestamp': latest, 'bids': bids, 'asks': asks}
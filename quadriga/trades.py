@@ -0,0 +1,212 @@
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import threading
+from collections import deque
+
+from quadriga.compat import monotonic
+
+# Length in seconds of each window returned by /transactions
+_WINDOWS = (('minute', 60), ('hour', 3600))
+
+
+class _Tape(object):
+    """Trades seen so far in one order book.
+
+    :param size: the maximum number of trade IDs remembered
+    :type size: int
+    """
+
+    def __init__(self, size):
+        self.last_date = None
+        self.tids = set()
+        self.order = deque()
+        self.size = size
+
+    def add(self, tid):
+        """Remember a trade ID, forgetting the oldest one if full.
+
+        :param tid: the trade ID
+        :type tid: int | str | unicode
+        """
+        if len(self.order) >= self.size:
+            self.tids.discard(self.order.popleft())
+        self.order.append(tid)
+        self.tids.add(tid)
+
+
+class TradeFollower(object):
+    """Follows the public trades of order books, yielding each trade once.
+
+    ``/transactions`` returns every trade of the last minute or hour, so
+    consecutive polls overlap. The follower remembers the date of the latest
+    trade of each book and a bounded index of recent trade IDs: a poll only
+    scans trades down to that date (the API returns the newest first) and
+    drops the ones already seen.
+
+    The minute window is requested whenever the previous poll is recent
+    enough, falling back to the hour window after longer gaps. The poll
+    interval halves (down to **min_interval**) when new trades come in and
+    grows by half (up to **max_interval**) when none do, so quiet books are
+    polled less often.
+
+    .. code-block:: python
+
+        follower = TradeFollower(client, books=['btc_cad', 'eth_cad'])
+        for book, trade in follower.follow():
+            print(book, trade['price'], trade['amount'])
+
+    :param client: the client used to fetch the trades
+    :type client: quadriga.QuadrigaClient
+    :param books: the names of the order books to follow (defaults to all)
+    :type books: [str | unicode]
+    :param min_interval: the minimum number of seconds between polls
+    :type min_interval: int | float
+    :param max_interval: the maximum number of seconds between polls, which
+        should stay below a minute to keep using the minute window
+    :type max_interval: int | float
+    :param dedup_size: the maximum number of trade IDs remembered per book
+    :type dedup_size: int
+    :param backfill: yield the trades already in the window on the first
+        poll, instead of only the ones made afterwards
+    :type backfill: bool
+    :param clock: the monotonic clock measuring the time between polls
+    :type clock: callable
+    """
+
+    def __init__(self,
+                 client,
+                 books=None,
+                 min_interval=1.0,
+                 max_interval=30.0,
+                 dedup_size=10000,
+                 backfill=True,
+                 clock=monotonic):
+        self._logger = logging.getLogger('quadriga')
+        self._client = client
+        self._books = sorted(books or client.order_books)
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backfill = backfill
+        self._clock = clock
+        self._tapes = {book: _Tape(dedup_size) for book in self._books}
+        self._last_poll = None
+        self._stopping = threading.Event()
+        self.interval = min_interval
+        self.polls = 0
+        self.trades = 0
+        self.errors = 0
+
+    def _log(self, message):
+        """Log a debug message.
+
+        :param message: the message to log
+        :type message: str | unicode
+        """
+        self._logger.debug('[trades: {}] {}'.format(
+            ', '.join(self._books), message
+        ))
+
+    def _window(self):
+        """Return the smallest window covering the time since the last poll.
+
+        :returns: the window (``"minute"`` or ``"hour"``)
+        :rtype: str | unicode
+        """
+        if self._last_poll is not None:
+            elapsed = self._clock() - self._last_poll
+            for window, length in _WINDOWS:
+                # Leave a margin for the latency of the previous poll
+                if elapsed < length * 0.9:
+                    return window
+            self._log('{:.0f}s since last poll, trades may have been missed'
+                      .format(elapsed))
+        return 'hour'
+
+    def _new_trades(self, book, trades):
+        """Return the trades not seen before, oldest first.
+
+        :param book: the name of the order book
+        :type book: str | unicode
+        :param trades: the trades returned by ``/transactions``, newest first
+        :type trades: [dict]
+        :returns: the new trades
+        :rtype: [dict]
+        """
+        tape = self._tapes[book]
+        new = []
+        for trade in trades:
+            date = int(trade['date'])
+            if tape.last_date is not None and date < tape.last_date:
+                break
+            if trade['tid'] not in tape.tids:
+                new.append(trade)
+        for trade in reversed(new):
+            tape.add(trade['tid'])
+            tape.last_date = max(tape.last_date or 0, int(trade['date']))
+        new.reverse()
+        return new
+
+    def poll(self):
+        """Fetch the trades of every book once and return the new ones.
+
+        :returns: the ``(book, trade)`` pairs of the new trades, oldest first
+            within each book
+        :rtype: [tuple]
+        """
+        first = self._last_poll is None
+        window = self._window()
+        self._last_poll = self._clock()
+        results = self._client.get_many(
+            'get_public_trades', books=self._books, time=window
+        )
+        self.polls += 1
+
+        new = []
+        for book in self._books:
+            result = results[book]
+            if isinstance(result, Exception):
+                self.errors += 1
+                self._log('failed to fetch {}: {}'.format(book, result))
+                continue
+            trades = self._new_trades(book, result)
+            if first and not self._backfill:
+                continue
+            new.extend((book, trade) for trade in trades)
+        self.trades += len(new)
+
+        if new:
+            self.interval = max(self.interval / 2, self._min_interval)
+        else:
+            self.interval = min(self.interval * 1.5, self._max_interval)
+        return new
+
+    def follow(self):
+        """Poll continuously and yield each new trade.
+
+        The generator returns after :meth:`stop` is called.
+
+        :returns: the ``(book, trade)`` pairs of the new trades
+        :rtype: collections.Iterator[tuple]
+        """
+        self._stopping.clear()
+        while not self._stopping.is_set():
+            for item in self.poll():
+                yield item
+            self._stopping.wait(self.interval)
+
+    def run(self, callback):
+        """Poll continuously and call the callback with each new trade.
+
+        This blocks until :meth:`stop` is called (e.g. from the callback or
+        another thread).
+
+        :param callback: the function called with the book and the trade
+        :type callback: callable
+        """
+        for book, trade in self.follow():
+            callback(book, trade)
+
+    def stop(self):
+        """Stop following the trades."""
+        self._stopping.set()
@@ -13,7 +13,7 @@ setup(
     url='https://github.com/joowani/quadriga',
     packages=find_packages(),
     license='MIT',
-    install_requires=['requests'],
+    install_requires=['requests', 'futures; python_version < "3"'],
     tests_require=['pytest', 'mock'],
     classifiers=[
         'Intended Audience :: Developers',
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, unicode_literals
 
+import sys
 import time
 
 import mock
@@ -38,7 +39,7 @@ def patch_time_module(monkeypatch):
 def requests_get(monkeypatch):
     mock_get = mock.MagicMock()
     set_response(mock_get)
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
     return mock_get
 
 
@@ -46,7 +47,7 @@ def requests_get(monkeypatch):
 def requests_post(monkeypatch):
     mock_post = mock.MagicMock()
     set_response(mock_post)
-    monkeypatch.setattr(requests, 'post', mock_post)
+    monkeypatch.setattr(requests.Session, 'post', mock_post)
     return mock_post
 
 
@@ -125,7 +126,7 @@ def test_request_fail_1(monkeypatch):
     mock_get = mock.MagicMock()
     error_body = {'error': {'code': '123', 'message': 'failed'}}
     set_response(mock_get, code=200, body=error_body)
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
 
     client = build_client()
     with pytest.raises(RequestError) as error:
@@ -140,7 +141,7 @@ def test_request_fail_1(monkeypatch):
 def test_request_fail_2(monkeypatch):
     mock_get = mock.MagicMock()
     set_response(mock_get, code=400)
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
 
     client = build_client()
     with pytest.raises(RequestError) as error:
@@ -156,7 +157,7 @@ def test_request_fail_3(monkeypatch):
     mock_get = mock.MagicMock()
     mock_response = set_response(mock_get, code=200, body='foo')
     mock_response.json.side_effect = ValueError
-    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(requests.Session, 'get', mock_get)
 
     client = build_client()
     with pytest.raises(RequestError) as error:
@@ -270,7 +271,7 @@ def test_get_trades(requests_post, logger):
             'offset': 10,
             'sort': 'asc',
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 1,
             'signature': mock.ANY
         }
     )
@@ -322,7 +323,7 @@ def test_buy_market_order(requests_post, logger):
             'book': 'eth_cad',
             'amount': 20,
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 1,
             'signature': mock.ANY
         }
     )
@@ -360,7 +361,7 @@ def test_buy_limit_order(requests_post, logger):
             'amount': 20,
             'price': 1,
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 1,
             'signature': mock.ANY
         }
     )
@@ -396,7 +397,7 @@ def test_sell_market_order(requests_post, logger):
             'book': 'eth_cad',
             'amount': 20,
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 1,
             'signature': mock.ANY
         }
     )
@@ -434,7 +435,7 @@ def test_sell_limit_order(requests_post, logger):
             'amount': 20,
             'price': 1,
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 1,
             'signature': mock.ANY
         }
     )
@@ -500,7 +501,7 @@ def test_get_deposit_address(requests_post, logger):
         url=build_url('/bitcoin_deposit_address'),
         json={
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 1,
             'signature': mock.ANY
         }
     )
@@ -513,7 +514,7 @@ def test_get_deposit_address(requests_post, logger):
         url=build_url('/litecoin_deposit_address'),
         json={
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 2,
             'signature': mock.ANY
         }
     )
@@ -549,7 +550,7 @@ def test_withdraw(requests_post, logger):
             'address': test_address,
             'amount': 1000,
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 1,
             'signature': mock.ANY
         }
     )
@@ -564,7 +565,7 @@ def test_withdraw(requests_post, logger):
             'address': test_address,
             'amount': 1000,
             'key': test_key,
-            'nonce': test_nonce,
+            'nonce': test_nonce + 2,
             'signature': mock.ANY
         }
     )
@@ -573,3 +574,1653 @@ def test_withdraw(requests_post, logger):
 
     with pytest.raises(InvalidCurrencyError):
         client.withdraw('invalid_currency', 1000, test_address)
+
+
+def test_session_pooling(requests_get):
+    rest_client = RestClient(pool_size=4)
+    rest_client.get('/ticker')
+    session = getattr(rest_client, '_session')
+    assert isinstance(session, requests.Session)
+    adapter = session.get_adapter(build_url('/ticker'))
+    assert getattr(adapter, '_pool_maxsize') == 4
+    assert getattr(adapter, '_timeout') == 30
+
+    rest_client.get('/ticker')
+    rest_client.post('/balance')
+    assert getattr(rest_client, '_session') is session
+
+    rest_client.close()
+    assert getattr(rest_client, '_session') is None
+    rest_client.get('/ticker')
+    assert getattr(rest_client, '_session') is not session
+
+
+def test_session_idle_reaping(monkeypatch):
+    mock_close = mock.MagicMock()
+    monkeypatch.setattr(requests.Session, 'close', mock_close)
+
+    rest_client = RestClient(idle_timeout=30)
+    rest_client.get('/ticker')
+    rest_client.get('/ticker')
+    assert mock_close.call_count == 0
+
+    last_used = getattr(rest_client, '_last_used')
+    monkeypatch.setattr(rest_client, '_last_used', last_used - 31)
+    rest_client.get('/ticker')
+    assert mock_close.call_count == 1
+
+
+def test_client_close(requests_get, logger):
+    with build_client() as client:
+        client.get_summary()
+        rest_client = getattr(client, '_rest_client')
+        assert getattr(rest_client, '_session') is not None
+    assert getattr(rest_client, '_session') is None
+    logger.debug.assert_called_with('[client: test_client_id] close client')
+
+
+def test_get_many(monkeypatch, requests_get, logger):
+    client = build_client()
+    output = client.get_summaries()
+    assert output == {book: test_body for book in QuadrigaClient.order_books}
+    assert requests_get.call_count == len(QuadrigaClient.order_books)
+    for book in QuadrigaClient.order_books:
+        requests_get.assert_any_call(
+            url=build_url('/ticker'),
+            params={'book': book}
+        )
+
+    output = client.get_all_public_orders(group=False, books=['eth_cad'])
+    assert output == {'eth_cad': test_body}
+    requests_get.assert_called_with(
+        url=build_url('/order_book'),
+        params={'book': 'eth_cad', 'group': 0}
+    )
+    logger.debug.assert_any_call(
+        '[client: test_client_id] call get_public_orders for eth_cad')
+
+    with pytest.raises(InvalidOrderBookError):
+        client.get_summaries(books=['btc_cad', 'invalid_book'])
+    with pytest.raises(ValueError):
+        client.get_many('buy_market_order', amount=1)
+
+    # A failed book is reported without failing the others
+    error_response = mock.MagicMock()
+    error_response.status_code = 500
+
+    def get(_, url, params):
+        if params['book'] == 'btc_cad':
+            return error_response
+        return set_response(mock.MagicMock())
+
+    monkeypatch.setattr(requests.Session, 'get', get)
+    output = client.get_summaries(books=['btc_cad', 'eth_cad'])
+    assert isinstance(output['btc_cad'], RequestError)
+    assert output['btc_cad'].http_code == 500
+    assert output['eth_cad'] == test_body
+    client.close()
+    assert getattr(client, '_executor') is None
+
+
+def test_response_cache(requests_get):
+    from quadriga.cache import ResponseCache
+
+    now = [0.0]
+    cache = ResponseCache(
+        ttls={'/transactions': None},
+        maxsize=2,
+        clock=lambda: now[0]
+    )
+    client = QuadrigaClient(default_book=test_book, cache=cache)
+
+    assert client.get_summary() == test_body
+    assert client.get_summary() == test_body
+    assert requests_get.call_count == 1
+    assert cache.stats == {'hits': 1, 'misses': 1, 'coalesced': 0, 'size': 1}
+
+    # Different parameters are cached separately
+    client.get_summary(book='eth_cad')
+    assert requests_get.call_count == 2
+
+    # Expired entries are fetched again
+    now[0] = 1.5
+    client.get_summary()
+    assert requests_get.call_count == 3
+
+    # Least recently used entries are evicted
+    client.get_public_orders()
+    assert len(cache) == 2
+    client.get_summary(book='eth_cad')
+    assert requests_get.call_count == 5
+
+    # Endpoints without a TTL and private endpoints are not cached
+    client.get_public_trades()
+    client.get_public_trades()
+    assert requests_get.call_count == 7
+
+    cache.clear()
+    assert cache.stats == {'hits': 0, 'misses': 0, 'coalesced': 0, 'size': 0}
+
+
+def test_response_cache_coalescing():
+    import threading
+    from quadriga.cache import ResponseCache
+
+    cache = ResponseCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return test_body
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(
+        cache.get_or_fetch('/ticker', {'book': test_book}, fetch)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(
+            cache.get_or_fetch('/ticker', {'book': test_book}, fetch)))
+        for _ in range(3)
+    ]
+    for follower in followers:
+        follower.start()
+    while cache.stats['coalesced'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert results == [test_body] * 4
+    assert len(calls) == 1
+
+    # Errors are propagated to all waiters and nothing is cached
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        cache.get_or_fetch('/order_book', None, fail)
+    assert cache.stats['size'] == 1
+
+
+def test_token_bucket():
+    from quadriga.ratelimit import TokenBucket, PRIORITY_HIGH
+
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0])
+    assert [bucket.try_acquire() for _ in range(4)] == [True] * 3 + [False]
+    now[0] = 0.5
+    assert bucket.tokens == 1
+    assert bucket.try_acquire(PRIORITY_HIGH) is True
+    assert bucket.acquire(timeout=0) is False
+
+    now[0] = 100
+    assert bucket.tokens == 3
+    bucket.drain()
+    assert bucket.tokens == 0
+
+
+def test_token_bucket_priority():
+    import threading
+    from quadriga.ratelimit import TokenBucket, PRIORITY_HIGH
+
+    now = [0.0]
+    bucket = TokenBucket(rate=50, capacity=1, clock=lambda: now[0])
+    assert bucket.acquire() is True
+
+    order = []
+
+    def acquire(name, priority):
+        bucket.acquire(priority)
+        order.append(name)
+
+    waiters = getattr(bucket, '_waiters')
+    normal = threading.Thread(target=acquire, args=('normal', 1))
+    high = threading.Thread(target=acquire, args=('high', PRIORITY_HIGH))
+    normal.start()
+    while len(waiters) < 1:
+        time.sleep(0.001)
+    high.start()
+    while len(waiters) < 2:
+        time.sleep(0.001)
+
+    # Queued waiters with the same or a higher priority go first
+    assert bucket.try_acquire() is False
+
+    now[0] = 1.0
+    high.join(5)
+    assert order == ['high']
+    now[0] = 2.0
+    normal.join(5)
+    assert order == ['high', 'normal']
+
+
+def test_rate_limiter(requests_get, requests_post):
+    from quadriga.exceptions import RateLimitError
+    from quadriga.ratelimit import RateLimiter, PRIORITY_HIGH
+
+    rate_limiter = RateLimiter(
+        public_rate=1,
+        public_burst=2,
+        private_rate=1,
+        blocking=False
+    )
+    assert rate_limiter.priority('/buy') == PRIORITY_HIGH
+    assert rate_limiter.priority('/balance') != PRIORITY_HIGH
+
+    client = QuadrigaClient(default_book=test_book, rate_limiter=rate_limiter)
+    client.get_summary()
+    client.get_summary()
+    with pytest.raises(RateLimitError):
+        client.get_summary()
+    assert requests_get.call_count == 2
+
+    # Signed requests have a separate budget
+    client.get_balance()
+    with pytest.raises(RateLimitError):
+        client.get_balance()
+    assert requests_post.call_count == 1
+
+    # The budget is discarded when the server throttles the client
+    rate_limiter = RateLimiter(public_rate=1, public_burst=5)
+    set_response(requests_get, code=429)
+    client = QuadrigaClient(default_book=test_book, rate_limiter=rate_limiter)
+    with pytest.raises(RequestError):
+        client.get_summary()
+    assert rate_limiter.public.tokens < 1
+    assert rate_limiter.try_acquire('POST', '/buy') is True
+
+
+def test_retry_policy(monkeypatch, requests_get, requests_post):
+    from requests.exceptions import ConnectionError, ConnectTimeout
+    from urllib3.exceptions import MaxRetryError, NewConnectionError
+    from quadriga.retry import RetryPolicy, is_transient, is_unsent
+
+    delays = []
+    retry_policy = RetryPolicy(
+        max_attempts=4,
+        backoff=1,
+        jitter=False,
+        max_elapsed=None,
+        sleep=delays.append
+    )
+    client = QuadrigaClient(default_book=test_book, retry_policy=retry_policy)
+
+    # Safe requests are retried on transient errors with exponential backoff
+    ok_response = requests_get.return_value
+    error_response = set_response(mock.MagicMock(), code=503)
+    requests_get.side_effect = [error_response, ConnectionError(), ok_response]
+    assert client.get_summary() == test_body
+    assert requests_get.call_count == 3
+    assert delays == [1, 2]
+
+    # Errors which are not transient are raised immediately
+    requests_get.side_effect = None
+    set_response(requests_get, code=400)
+    with pytest.raises(RequestError):
+        client.get_summary()
+    assert requests_get.call_count == 4
+
+    # Giving up re-raises the last error
+    set_response(requests_get, code=500)
+    with pytest.raises(RequestError):
+        client.get_summary()
+    assert requests_get.call_count == 8
+    assert delays == [1, 2, 1, 2, 4]
+
+    # Orders are retried only if the request was never sent
+    unsent = ConnectionError(MaxRetryError(
+        None, test_url, NewConnectionError(None, 'refused')))
+    ok_response = requests_post.return_value
+    requests_post.side_effect = [unsent, ConnectTimeout(), ok_response]
+    assert client.buy_limit_order(1, 10) == test_body
+    assert requests_post.call_count == 3
+
+    requests_post.side_effect = [ConnectionError('reset'), ok_response]
+    with pytest.raises(ConnectionError):
+        client.buy_limit_order(1, 10)
+    requests_post.side_effect = [ConnectionError('reset'), ok_response]
+    with pytest.raises(ConnectionError):
+        client.withdraw('bitcoin', 1, test_address)
+
+    # Idempotent signed requests are retried like safe ones
+    requests_post.side_effect = [ConnectionError('reset'), ok_response]
+    assert client.get_balance() == test_body
+
+    assert is_transient(ValueError()) is False
+    assert is_unsent(ConnectionError('reset')) is False
+    assert is_unsent(unsent) is True
+
+
+def test_retry_policy_limits():
+    from quadriga.retry import RetryPolicy
+
+    now = [0.0]
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        now[0] += delay
+
+    response = set_response(mock.MagicMock(), code=503)
+    response.headers = {'Retry-After': '3'}
+    error = RequestError(response=response, message='unavailable')
+
+    def fail():
+        raise error
+
+    retry_policy = RetryPolicy(
+        max_attempts=10,
+        backoff=1,
+        max_elapsed=10,
+        jitter=False,
+        sleep=sleep,
+        clock=lambda: now[0]
+    )
+    assert retry_policy.delay(1, error) == 3
+    assert retry_policy.delay(5) == 5
+
+    # Retrying stops before the maximum elapsed time would be exceeded
+    with pytest.raises(RequestError):
+        retry_policy.call(fail)
+    assert delays == [3, 3, 4]
+
+
+def test_nonce_generator(monkeypatch):
+    import threading
+    from quadriga.nonce import NonceGenerator
+
+    generator = NonceGenerator()
+    assert [generator() for _ in range(3)] == [
+        test_nonce, test_nonce + 1, test_nonce + 2
+    ]
+
+    # Nonces keep increasing when the clock is set back
+    monkeypatch.setattr(time, 'time', lambda: test_nonce / 1000 - 60)
+    assert generator() == test_nonce + 3
+
+    monkeypatch.setattr(time, 'time', lambda: test_nonce / 1000 + 1)
+    assert generator() == test_nonce + 1000
+
+    nonces = []
+    threads = [
+        threading.Thread(
+            target=lambda: nonces.extend(generator() for _ in range(100)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(nonces)) == 400
+
+
+def test_shared_nonce_generators(tmpdir):
+    from quadriga.nonce import FileNonceGenerator, SharedNonceGenerator
+
+    path = str(tmpdir.join('nonce'))
+    first = FileNonceGenerator(path)
+    second = FileNonceGenerator(path)
+    assert first() == test_nonce
+    assert second() == test_nonce + 1
+    assert first() == test_nonce + 2
+    assert FileNonceGenerator(path)() == test_nonce + 3
+
+    first = SharedNonceGenerator()
+    second = SharedNonceGenerator(first.counter)
+    assert first() == test_nonce
+    assert second() == test_nonce + 1
+    assert first() == test_nonce + 2
+
+    rest_client = RestClient(nonce_generator=second)
+    assert rest_client._sign_payload()['nonce'] == test_nonce + 3
+
+
+test_order_book = {
+    'timestamp': '1491481256',
+    'bids': [['1150.00', '0.50000000'], ['1149.99', '1.25000000']],
+    'asks': [['1151.00', '2.00000000']],
+}
+
+
+def test_recorder(tmpdir, requests_get):
+    import sqlite3
+    from quadriga.recorder import OrderBookRecorder
+
+    set_response(requests_get, body=test_order_book)
+    db_path = str(tmpdir.join('orders.db'))
+    client = build_client()
+    recorder = OrderBookRecorder(client, db_path, books=['btc_cad', 'eth_cad'])
+    assert recorder.record_once() == 2
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    rows = conn.execute(
+        'SELECT timeStamp, type, amount, price, book FROM transactionOrders '
+        'WHERE book = ? ORDER BY type, price DESC', ('btc_cad',)
+    ).fetchall()
+    assert rows == [
+        (1491481256, 0, 50000000, 115000, 'btc_cad'),
+        (1491481256, 0, 125000000, 114999, 'btc_cad'),
+        (1491481256, 1, 200000000, 115100, 'btc_cad'),
+    ]
+
+    with OrderBookRecorder(client, db_path, interval=0.01,
+                           queue_size=2, batch_size=3) as recorder:
+        assert recorder.running is True
+        while recorder.polls < 3:
+            time.sleep(0.01)
+    assert recorder.running is False
+    assert recorder.errors == 0
+    assert recorder.snapshots == recorder.polls * len(client.order_books)
+    count = conn.execute('SELECT COUNT(*) FROM transactionOrders').fetchone()
+    assert count[0] == 6 + recorder.rows
+
+
+def test_recorder_poll_failure(tmpdir, logger):
+    from quadriga.recorder import OrderBookRecorder
+
+    client = build_client()
+    client.get_many = mock.MagicMock(side_effect=RuntimeError('shut down'))
+    db_path = str(tmpdir.join('orders.db'))
+    with OrderBookRecorder(client, db_path, interval=0.01) as recorder:
+        while recorder.errors < 2:
+            time.sleep(0.01)
+        assert recorder.running is True
+    # The writer finished even though no poll succeeded
+    assert recorder.running is False
+    assert recorder.snapshots == 0
+    assert logger.exception.call_count >= 2
+
+
+def test_recorder_stop_timeout(tmpdir, logger):
+    import threading
+    from quadriga.recorder import OrderBookRecorder
+
+    release = threading.Event()
+
+    def get_many(*args, **kwargs):
+        release.wait()
+        raise RuntimeError('shut down')
+
+    client = build_client()
+    client.get_many = mock.MagicMock(side_effect=get_many)
+    recorder = OrderBookRecorder(client, str(tmpdir.join('orders.db')),
+                                 interval=0.01)
+    recorder.start()
+    poller = recorder._poller
+    assert recorder.stop(timeout=0.05) is False
+    assert logger.warning.call_count == 1
+    # The threads still running are neither replaced nor forgotten
+    assert recorder.running is True
+    recorder.start()
+    assert recorder._poller is poller
+    release.set()
+    assert recorder.stop() is True
+    assert recorder.running is False
+    assert client.get_many.call_count == 1
+
+
+def test_recorder_legacy_table(tmpdir, requests_get):
+    import sqlite3
+    from quadriga.recorder import OrderBookRecorder
+
+    db_path = str(tmpdir.join('orders.db'))
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE transactionOrders '
+                 '(timeStamp INT, type INT, amount INT, price INT)')
+    conn.close()
+
+    set_response(requests_get, code=500)
+    recorder = OrderBookRecorder(build_client(), db_path, books=['btc_cad'])
+    assert recorder.record_once() == 0
+    assert recorder.errors == 1
+
+    set_response(requests_get, body=test_order_book)
+    assert recorder.record_once() == 1
+    conn = sqlite3.connect(db_path)
+    books = conn.execute('SELECT DISTINCT book FROM transactionOrders')
+    assert books.fetchall() == [('btc_cad',)]
+
+
+def test_order_book_differ():
+    from quadriga.delta import OrderBookDiffer
+    from quadriga.storage import snapshot_rows
+
+    def snapshot(timestamp, bids, asks):
+        return snapshot_rows(test_book, {
+            'timestamp': timestamp, 'bids': bids, 'asks': asks
+        })
+
+    differ = OrderBookDiffer(keyframe_interval=3)
+    assert differ.update(test_book, snapshot(1, [], [])) == (False, [])
+
+    keyframe, changes = differ.update(test_book, snapshot(
+        1, [['10.00', '1'], ['9.00', '2'], ['9.00', '1']], [['11.00', '1']]
+    ))
+    assert keyframe is True
+    assert sorted(changes) == [
+        (0, 100000000, 1000), (0, 300000000, 900), (1, 100000000, 1100)
+    ]
+
+    keyframe, changes = differ.update(test_book, snapshot(
+        2, [['10.00', '1'], ['9.50', '4']], [['11.00', '3']]
+    ))
+    assert keyframe is False
+    assert sorted(changes) == [
+        (0, 0, 900), (0, 400000000, 950), (1, 300000000, 1100)
+    ]
+    assert differ.update(test_book, snapshot(
+        3, [['10.00', '1'], ['9.50', '4']], [['11.00', '3']]
+    )) == (False, [])
+    assert differ.update(test_book, snapshot(4, [['1', '1']], []))[0] is True
+
+    differ.reset()
+    assert differ.update(test_book, snapshot(5, [['1', '1']], []))[0] is True
+
+
+def test_recorder_deltas(tmpdir, requests_get):
+    import sqlite3
+    from quadriga.delta import reconstruct
+    from quadriga.recorder import OrderBookRecorder
+
+    db_path = str(tmpdir.join('orders.db'))
+    client = build_client()
+    recorder = OrderBookRecorder(
+        client, db_path, books=['btc_cad'], keyframe_interval=2
+    )
+    books = [
+        {'timestamp': '100', 'bids': [['10.00', '1']], 'asks': []},
+        {'timestamp': '100', 'bids': [['10.00', '2']], 'asks': []},
+        {'timestamp': '101', 'bids': [['10.00', '2']], 'asks': []},
+        {'timestamp': '102', 'bids': [], 'asks': [['11.00', '1']]},
+        {'timestamp': '103', 'bids': [['9.00', '1']], 'asks': []},
+    ]
+    for book in books:
+        set_response(requests_get, body=book)
+        recorder.record_once()
+    assert recorder.snapshots == 5
+    # Keyframes are written even when nothing changed
+    assert recorder.rows == 1 + 1 + 1 + 2 + 1
+
+    conn = sqlite3.connect(db_path)
+    assert reconstruct(conn, 'btc_cad', 99) is None
+    assert reconstruct(conn, 'btc_cad', 100) == {
+        'timestamp': 100, 'bids': [(1000, 200000000)], 'asks': []
+    }
+    assert reconstruct(conn, 'btc_cad', 101) == {
+        'timestamp': 101, 'bids': [(1000, 200000000)], 'asks': []
+    }
+    assert reconstruct(conn, 'btc_cad', 102) == {
+        'timestamp': 102, 'bids': [], 'asks': [(1100, 100000000)]
+    }
+    assert reconstruct(conn, 'btc_cad', 200) == {
+        'timestamp': 103, 'bids': [(900, 100000000)], 'asks': []
+    }
+    assert reconstruct(conn, 'eth_cad', 200) is None
+    count = conn.execute('SELECT COUNT(*) FROM transactionOrders').fetchone()
+    assert count[0] == 0
+
+
+def test_legacy_book_assigned_later(tmpdir):
+    import sqlite3
+    from quadriga.storage import OrderBookStore
+
+    db_path = str(tmpdir.join('orders.db'))
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE transactionOrders '
+                 '(timeStamp INT, type INT, amount INT, price INT)')
+    conn.execute('INSERT INTO transactionOrders VALUES (50, 0, 1, 2)')
+    conn.commit()
+    conn.close()
+
+    # Migrated without a book, the rows cannot be attributed yet
+    with OrderBookStore(db_path) as store:
+        assert store.books() == []
+    # but are once it is given, at the scales of the book
+    with OrderBookStore(db_path, legacy_book='eth_cad') as store:
+        assert store.books() == ['eth_cad']
+        assert list(store.range('eth_cad', 0, 100)) == [(50, 0, 100, 2)]
+    with OrderBookStore(db_path, legacy_book='btc_cad') as store:
+        assert store.books() == ['eth_cad']
+
+
+def test_order_book_store(tmpdir):
+    import sqlite3
+    from quadriga.delta import OrderBookDiffer
+    from quadriga.storage import MIGRATIONS, OrderBookStore
+
+    db_path = str(tmpdir.join('orders.db'))
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE transactionOrders '
+                 '(timeStamp INT, type INT, amount INT, price INT)')
+    conn.execute('INSERT INTO transactionOrders VALUES (50, 0, 1, 2)')
+    conn.commit()
+    conn.close()
+
+    with OrderBookStore(db_path, legacy_book='bch_cad') as store:
+        assert store.version == len(MIGRATIONS)
+        assert store.books() == ['bch_cad']
+        assert store.insert_snapshots([
+            ('btc_cad', {'timestamp': '100', 'bids': [['10.00', '1'],
+                                                      ['9.00', '2']],
+                         'asks': [['11.00', '3']]}),
+            ('btc_cad', {'timestamp': '110', 'bids': [['10.50', '1']],
+                         'asks': []}),
+            ('eth_cad', {'timestamp': '105', 'bids': [['1.00', '1']],
+                         'asks': []}),
+        ]) == 5
+        assert store.books() == ['bch_cad', 'btc_cad', 'eth_cad']
+
+        rows = store.range('btc_cad', 100, 109)
+        assert not isinstance(rows, list)
+        assert sorted(rows) == [
+            (100, 0, 100000000, 1000),
+            (100, 0, 200000000, 900),
+            (100, 1, 300000000, 1100),
+        ]
+        assert list(store.timestamps('btc_cad', 0, 200)) == [100, 110]
+        assert list(store.range('btc_cad', 111, 200)) == []
+
+        assert store.book_at('btc_cad', 99) is None
+        assert store.book_at('btc_cad', 109) == {
+            'timestamp': 100,
+            'bids': [(1000, 100000000), (900, 200000000)],
+            'asks': [(1100, 300000000)],
+        }
+
+        # Deltas recorded later take precedence over older snapshots
+        differ = OrderBookDiffer()
+        store.insert_deltas(differ, [('btc_cad', {
+            'timestamp': '120', 'bids': [], 'asks': [['12', '1']]
+        })])
+        assert store.book_at('btc_cad', 130) == {
+            'timestamp': 120, 'bids': [], 'asks': [(1200, 100000000)]
+        }
+        assert store.book_at('btc_cad', 115)['timestamp'] == 110
+
+        plan = getattr(store, '_conn').execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM transactionOrders '
+            'WHERE book = ? AND timeStamp BETWEEN ? AND ?', ('btc_cad', 0, 1)
+        ).fetchall()
+        assert 'transactionOrders_book_timeStamp' in str(plan)
+
+    # Migrations are applied only once
+    with OrderBookStore(db_path) as store:
+        assert store.version == len(MIGRATIONS)
+        assert list(store.range('bch_cad', 0, 100)) == [(50, 0, 1, 2)]
+
+
+def check_order_book(order_book):
+    assert order_book.book == test_book
+    assert order_book.timestamp == 1491481256
+    assert list(order_book.bid_prices) == [1150.0, 1149.99]
+    assert list(order_book.bid_amounts) == [0.5, 1.25]
+    assert list(order_book.ask_prices) == [1151.0]
+    assert order_book.best_bid == (1150.0, 0.5)
+    assert order_book.best_ask == (1151.0, 2.0)
+    assert order_book.spread == 1.0
+    assert order_book.mid == 1150.5
+    assert list(order_book.cumulative_depth('bid')) == [0.5, 1.75]
+    assert order_book.depth_at(1150, 'bid') == 0.5
+    assert order_book.depth_at(1149, 'bid') == 1.75
+    assert order_book.depth_at(1150, 'ask') == 0
+    assert order_book.vwap(0.5, 'bid') == 1150.0
+    assert abs(order_book.vwap(1, 'bid') - 1149.995) < 1e-9
+    assert order_book.vwap(2, 'bid') is None
+    assert order_book.vwap(2, 'ask') == 1151.0
+    with pytest.raises(ValueError):
+        order_book.vwap(1, 'invalid_side')
+    with pytest.raises(ValueError):
+        order_book.vwap(0, 'ask')
+
+
+def test_storage_scales(tmpdir):
+    import sqlite3
+    from quadriga.collector import decode_snapshot, encode_snapshot
+    from quadriga.recorder import OrderBookRecorder
+    from quadriga.storage import (
+        OrderBookStore,
+        snapshot_rows,
+        storage_places
+    )
+
+    assert storage_places('btc_cad') == (8, 2)
+    assert storage_places('eth_btc') == (10, 8)
+    snapshot = {'timestamp': '100', 'bids': [['0.03215', '12.3456789012']],
+                'asks': [['0.03298', '0.5']]}
+    rows = [(100, 0, 123456789012, 3215000, 'eth_btc'),
+            (100, 1, 5000000000, 3298000, 'eth_btc')]
+    assert snapshot_rows('eth_btc', snapshot) == rows
+    assert decode_snapshot(encode_snapshot('eth_btc', snapshot))[2] == rows
+
+    # Digits beyond the stored scale, and overflows, are never truncated
+    with pytest.raises(ValueError):
+        snapshot_rows('eth_btc', {'timestamp': '1', 'asks': [],
+                                  'bids': [['0.03215', '1.00000000001']]})
+    with pytest.raises(ValueError):
+        snapshot_rows('btc_cad', {'timestamp': '1', 'asks': [],
+                                  'bids': [['1', '100000000000']]})
+
+    # Levels stored in satoshis and cents by older versions are rescaled
+    db_path = str(tmpdir.join('orders.db'))
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE transactionOrders '
+                 '(timeStamp INT, type INT, amount INT, price INT, book TEXT)')
+    conn.executemany('INSERT INTO transactionOrders VALUES (?,?,?,?,?)', [
+        (50, 0, 150000000, 3, 'eth_btc'),
+        (50, 0, 150000000, 100000, 'btc_cad'),
+    ])
+    conn.execute('PRAGMA user_version = 3')
+    conn.execute('CREATE TABLE orderBookSnapshots '
+                 '(id INTEGER PRIMARY KEY, book TEXT, timeStamp INT, '
+                 'keyframe INT)')
+    conn.execute('CREATE TABLE orderBookLevels '
+                 '(snapshot INT, type INT, amount INT, price INT)')
+    conn.execute("INSERT INTO orderBookSnapshots VALUES (1, 'eth_cad', 60, 1)")
+    conn.execute('INSERT INTO orderBookLevels VALUES (1, 1, 100000000, 500)')
+    conn.commit()
+    conn.close()
+
+    with OrderBookStore(db_path) as store:
+        assert list(store.range('eth_btc', 0, 100)) == [
+            (50, 0, 15000000000, 3000000)
+        ]
+        assert list(store.range('btc_cad', 0, 100)) == [
+            (50, 0, 150000000, 100000)
+        ]
+        assert store.book_at('eth_cad', 60)['asks'] == [(500, 10000000000)]
+        store.insert_snapshots([('eth_btc', snapshot)])
+        assert store.book_at('eth_btc', 100) == {
+            'timestamp': 100,
+            'bids': [(3215000, 123456789012)],
+            'asks': [(3298000, 5000000000)],
+        }
+
+    # The recorder writes the other snapshots of a batch it cannot store
+    client = mock.MagicMock()
+    client.get_many.return_value = {
+        'eth_btc': {'timestamp': '200', 'asks': [],
+                    'bids': [['0.032151001', '1']]},
+        'eth_cad': {'timestamp': '200', 'asks': [], 'bids': [['500', '1']]},
+    }
+    recorder = OrderBookRecorder(client, db_path, books=['eth_btc', 'eth_cad'])
+    assert recorder.record_once() == 2
+    assert (recorder.snapshots, recorder.errors) == (1, 1)
+    with OrderBookStore(db_path) as store:
+        assert store.book_at('eth_btc', 200)['timestamp'] == 100
+        assert store.book_at('eth_cad', 200)['timestamp'] == 200
+
+
+def test_get_order_book(requests_get):
+    from quadriga.orderbook import OrderBook
+
+    set_response(requests_get, body=test_order_book)
+    client = build_client()
+    order_book = client.get_order_book()
+    check_order_book(order_book)
+    requests_get.assert_called_with(
+        url=build_url('/order_book'),
+        params={'book': test_book, 'group': 1}
+    )
+    assert repr(order_book) == (
+        '<OrderBook btc_usd @ 1491481256: 2 bids, 1 asks>'
+    )
+
+    empty = OrderBook.from_response(
+        {'timestamp': '1', 'bids': [], 'asks': []}
+    )
+    assert empty.best_bid is None
+    assert empty.best_ask is None
+    assert empty.spread is None
+    assert empty.mid is None
+    assert empty.vwap(1, 'ask') is None
+
+    books = client.get_all_order_books(books=['btc_cad', 'eth_cad'])
+    assert books['eth_cad'].book == 'eth_cad'
+
+
+def test_order_book_without_numpy(monkeypatch, requests_get):
+    import quadriga.orderbook
+
+    monkeypatch.setattr(quadriga.orderbook, 'np', None)
+    set_response(requests_get, body=test_order_book)
+    order_book = build_client().get_order_book()
+    assert not hasattr(order_book.bid_prices, 'dtype')
+    check_order_book(order_book)
+
+
+def test_fixed_point():
+    from quadriga.fixedpoint import FixedPoint, book_places, parse_scaled
+
+    assert book_places('btc_cad') == (8, 2)
+    assert book_places('eth_btc') == (18, 8)
+    assert parse_scaled('0.29', 2) == 29
+    assert parse_scaled('1150', 2) == 115000
+    assert parse_scaled('-.5', 8) == -50000000
+    assert parse_scaled('1.999', 2, exact=False) == 199
+    assert parse_scaled('1.9900', 2) == 199
+    with pytest.raises(ValueError):
+        parse_scaled('1.999', 2)
+    for invalid in ('', '.', '1e5', 'abc', '1.2.3'):
+        with pytest.raises(ValueError):
+            parse_scaled(invalid, 2)
+
+    amount = FixedPoint.amount('0.50000000', 'btc_cad')
+    price = FixedPoint.price('1150.25', 'btc_cad')
+    assert (amount.value, amount.places) == (50000000, 8)
+    assert str(price) == '1150.25'
+    assert repr(amount) == "FixedPoint('0.50000000')"
+    assert str(amount * price) == '575.1250000000'
+    assert str(price + FixedPoint.parse('0.001', 3)) == '1150.251'
+    assert str(price - 1151) == '-0.75'
+    assert str(1 - amount) == '0.50000000'
+    assert str(amount * 3) == '1.50000000'
+    assert price == FixedPoint.parse('1150.250', 3)
+    assert hash(price) == hash(FixedPoint.parse('1150.250', 3))
+    assert FixedPoint.parse('2.00', 2) == 2
+    assert hash(FixedPoint.parse('2.00', 2)) == hash(2)
+    assert amount < price and price > 1150 and not FixedPoint(0, 8)
+    assert float(price) == 1150.25
+    assert int(-price) == -1150
+    assert str(amount.rescale(1)) == '0.5'
+    with pytest.raises(ValueError):
+        price.rescale(1)
+
+
+def test_fixed_point_payload(requests_post):
+    from quadriga.fixedpoint import FixedPoint
+
+    client = build_client()
+    client.buy_limit_order(
+        FixedPoint.amount('0.1', test_book),
+        FixedPoint.price('1150.25', test_book)
+    )
+    requests_post.assert_called_with(
+        url=build_url('/buy'),
+        json={
+            'book': test_book,
+            'amount': '0.10000000',
+            'price': '1150.25',
+            'key': test_key,
+            'nonce': test_nonce,
+            'signature': mock.ANY
+        }
+    )
+
+
+def test_decoders(requests_get):
+    import json
+    from quadriga.decoders import get_decoder
+
+    response = set_response(requests_get, body=test_order_book)
+    response.content = json.dumps(test_order_book).encode('utf-8')
+
+    client = QuadrigaClient(default_book=test_book, decoder='fast')
+    assert client.get_public_orders() == test_order_book
+
+    client = QuadrigaClient(default_book=test_book, decoder='raw')
+    assert client.get_public_orders() == response.content
+
+    client = QuadrigaClient(default_book=test_book,
+                            decoder=lambda r: r.content.upper())
+    assert client.get_public_orders() == response.content.upper()
+
+    error_body = {'error': {'code': '123', 'message': 'failed'}}
+    response.content = json.dumps(error_body).encode('utf-8')
+    for decoder in ('fast', 'raw'):
+        client = QuadrigaClient(default_book=test_book, decoder=decoder)
+        with pytest.raises(RequestError) as error:
+            client.get_public_orders()
+        assert error.value.error_code == '123'
+
+    # Only a top-level error object is decoded by the raw decoder
+    client = QuadrigaClient(default_book=test_book, decoder='raw')
+    for content in (b'[{"error": "1"}]', b'{"data": {"error": "1"}}',
+                    b'{"note": "\\"error\\"", "bids": [', b'not "error"'):
+        response.content = content
+        assert client.get_public_orders() == content
+
+    response.status_code = 500
+    response.content = b'{"data": "failed"}'
+    assert get_decoder('raw')(response) == {'data': 'failed'}
+    response.status_code = 200
+
+    response.content = b'not json'
+    client = QuadrigaClient(default_book=test_book, decoder='fast')
+    with pytest.raises(RequestError):
+        client.get_public_orders()
+
+    with pytest.raises(ValueError):
+        get_decoder('invalid_decoder')
+
+
+def test_local_order_book(requests_get):
+    from quadriga.exceptions import StaleOrderBookError
+    from quadriga.local_book import LocalOrderBook
+
+    now = [0.0]
+    client = build_client()
+    book = LocalOrderBook(client, max_age=5, clock=lambda: now[0])
+    with pytest.raises(StaleOrderBookError):
+        book.best_bid
+
+    set_response(requests_get, body=test_order_book)
+    assert book.refresh() == 3
+    assert book.timestamp == 1491481256
+    assert str(book.best_bid[0]) == '1150.00'
+    assert str(book.best_bid[1]) == '0.50000000'
+    assert str(book.best_ask[0]) == '1151.00'
+    assert str(book.spread) == '1.00'
+    assert [str(p) for p, _ in book.top('bid')] == ['1150.00', '1149.99']
+    assert str(book.depth_at('1149.99', 'bid')) == '1.75000000'
+    assert str(book.depth_at('1150.50', 'bid')) == '0.00000000'
+    assert str(book.depth_within(0.000005, 'bid')) == '0.50000000'
+    assert str(book.depth_within(0.01, 'ask')) == '2.00000000'
+
+    assert book.update({
+        'timestamp': '1491481257',
+        'bids': [['1150.00', '0.50000000'], ['1150.50', '0.10000000']],
+        'asks': [['1151.00', '1.00000000'], ['1151.00', '0.50000000']],
+    }) == 3
+    assert [str(p) for p, _ in book.top('bid')] == ['1150.50', '1150.00']
+    assert str(book.best_ask[1]) == '1.50000000'
+    assert str(book.spread) == '0.50'
+    with pytest.raises(ValueError):
+        book.top('invalid_side')
+
+    now[0] = 6.0
+    with pytest.raises(StaleOrderBookError):
+        book.spread
+
+    with LocalOrderBook(client, interval=0.01) as book:
+        while not book.updates:
+            time.sleep(0.01)
+        assert book.running
+        assert book.best_bid is not None
+    assert not book.running
+
+
+def test_trade_follower(requests_get):
+    from quadriga.trades import TradeFollower
+
+    def trade(tid, date):
+        return {'tid': tid, 'date': str(date), 'price': '1150.00',
+                'amount': '0.10000000', 'side': 'buy'}
+
+    bodies = [
+        [trade(2, 100), trade(1, 99)],
+        [trade(3, 101), trade(2, 100), trade(1, 99)],
+        [trade(5, 101), trade(3, 101), trade(2, 100)],
+        [trade(5, 101), trade(3, 101)],
+    ]
+    responses = [set_response(mock.MagicMock(), body=body) for body in bodies]
+    requests_get.side_effect = responses
+
+    now = [0.0]
+    follower = TradeFollower(
+        build_client(), books=[test_book], min_interval=1, max_interval=4,
+        dedup_size=2, clock=lambda: now[0]
+    )
+    assert [t['tid'] for _, t in follower.poll()] == [1, 2]
+    requests_get.assert_called_with(
+        url=build_url('/transactions'),
+        params={'book': test_book, 'time': 'hour'}
+    )
+    now[0] = 10
+    assert follower.poll() == [(test_book, trade(3, 101))]
+    requests_get.assert_called_with(
+        url=build_url('/transactions'),
+        params={'book': test_book, 'time': 'minute'}
+    )
+    assert [t['tid'] for _, t in follower.poll()] == [5]
+    assert follower.interval == 1
+    assert follower.poll() == []
+    assert follower.interval == 1.5
+    assert (follower.polls, follower.trades) == (4, 4)
+
+    requests_get.side_effect = None
+    set_response(requests_get, body=bodies[0])
+    follower = TradeFollower(build_client(), books=[test_book],
+                             min_interval=0.01, backfill=False)
+    assert follower.poll() == []
+
+    seen = []
+
+    def callback(book, trade):
+        seen.append(trade['tid'])
+        follower.stop()
+
+    set_response(requests_get, body=bodies[1])
+    follower.run(callback)
+    assert seen == [3]
+
+
+def test_iter_trades(tmpdir, requests_post):
+    import datetime
+    from quadriga.checkpoint import FileCheckpoint
+
+    history = [
+        {'id': i, 'datetime': '2017-04-0{} 12:00:00'.format(i + 1)}
+        for i in range(5)
+    ]
+    offsets = []
+
+    def post(_, url, json):
+        assert json['sort'] == 'asc'
+        offsets.append(json['offset'])
+        page = history[json['offset']:json['offset'] + json['limit']]
+        return set_response(mock.MagicMock(), body=page)
+
+    patch_post = mock.patch.object(requests.Session, 'post', post)
+    client = build_client()
+    with patch_post:
+        trades = client.iter_trades(page_size=2)
+        assert next(trades) == history[0]
+        assert list(trades) == history[1:]
+        assert offsets == [0, 2, 4]
+
+        del offsets[:]
+        since = datetime.datetime(2017, 4, 3, 12)
+        trades = client.iter_trades(page_size=4, since=since, prefetch=False)
+        assert [t['id'] for t in trades] == [2, 3, 4]
+        assert offsets == [0, 4]
+
+        del offsets[:]
+        checkpoint = FileCheckpoint(str(tmpdir.join('trades.checkpoint')))
+        assert checkpoint.offset == 0
+        trades = client.iter_trades(page_size=2, checkpoint=checkpoint)
+        assert [next(trades) for _ in range(3)] == history[:3]
+        assert checkpoint.offset == 2
+        trades.close()
+
+        trades = client.iter_trades(page_size=2, checkpoint=checkpoint)
+        assert list(trades) == history[2:]
+        assert checkpoint.offset == 5
+        assert list(client.iter_trades(checkpoint=checkpoint)) == []
+
+
+def test_place_and_cancel_orders(requests_post):
+    nonce_error = {'error': {'code': '106', 'message': 'Invalid nonce'}}
+    calls = []
+
+    def post(_, url, json):
+        calls.append((url, dict(json)))
+        if json.get('id') == 'bad_id':
+            return set_response(mock.MagicMock(), code=400)
+        if json.get('amount') == 3 and len(calls) < 4:
+            return set_response(mock.MagicMock(), body=nonce_error)
+        return set_response(mock.MagicMock(), body={'url': url})
+
+    client = build_client()
+    with mock.patch.object(requests.Session, 'post', post):
+        results = client.place_orders([
+            {'side': 'buy', 'amount': 1, 'price': 5},
+            {'side': 'sell', 'amount': 2, 'book': 'invalid_book'},
+            {'side': 'hold', 'amount': 2},
+            {'side': 'sell', 'amount': 3},
+        ])
+        assert results[0] == {'url': build_url('/buy')}
+        assert isinstance(results[1], InvalidOrderBookError)
+        assert isinstance(results[2], ValueError)
+        assert results[3] == {'url': build_url('/sell')}
+        resent = [json for url, json in calls if json['amount'] == 3]
+        assert len(resent) > 1
+        assert len({json['nonce'] for _, json in calls}) == len(calls)
+
+        results = client.cancel_orders(['good_id', 'bad_id'])
+        assert results[0] == {'url': build_url('/cancel_order')}
+        assert isinstance(results[1], RequestError)
+
+    set_response(requests_post, body=nonce_error)
+    with pytest.raises(RequestError):
+        client.cancel_order('order_id')
+    assert requests_post.call_count == RestClient.nonce_retries + 1
+
+
+def test_histogram():
+    from quadriga.metrics import Histogram
+
+    histogram = Histogram(buckets=[1, 2, 3])
+    assert histogram.percentile(50) is None
+    for value in (0.5, 1.5, 1.5, 2.5, 10):
+        histogram.add(value)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.percentile(0) == 0.5
+    assert histogram.percentile(50) == 1.75
+    assert histogram.percentile(100) == 10
+
+
+def test_metrics(tmpdir, requests_get, logger):
+    import datetime
+    from quadriga.exceptions import RateLimitError
+    from quadriga.metrics import LoggingSink, MemorySink, PrometheusSink
+
+    response = set_response(requests_get)
+    response.elapsed = datetime.timedelta(milliseconds=20)
+    memory, prometheus = MemorySink(), PrometheusSink()
+    client = QuadrigaClient(
+        default_book=test_book,
+        metrics=[memory, prometheus, LoggingSink()]
+    )
+    client.get_summary()
+    assert logger.log.call_args[0][1].startswith(
+        '[metrics] GET /ticker 200 decode='
+    )
+    set_response(requests_get, code=400).elapsed = response.elapsed
+    with pytest.raises(RequestError):
+        client.get_summary()
+    requests_get.side_effect = requests.ConnectionError
+    with pytest.raises(requests.ConnectionError):
+        client.get_public_orders()
+    limited = QuadrigaClient(default_book=test_book, metrics=memory,
+                             rate_limiter=mock.MagicMock())
+    limited._rest_client._rate_limiter.acquire.side_effect = RateLimitError
+    with pytest.raises(RateLimitError):
+        limited.get_public_trades()
+
+    assert memory.requests == {
+        ('GET', '/ticker', 200): 1,
+        ('GET', '/ticker', 400): 1,
+        ('GET', '/order_book', None): 1,
+        ('GET', '/transactions', None): 1,
+    }
+    assert memory.errors == {
+        ('GET', '/ticker', 'RequestError'): 1,
+        ('GET', '/order_book', 'ConnectionError'): 1,
+        ('GET', '/transactions', 'RateLimitError'): 1,
+    }
+    summary = memory.summary()
+    assert summary[('GET', '/ticker', 'headers')]['p50'] == 0.02
+    assert summary[('GET', '/ticker', 'total')]['count'] == 2
+    assert set(summary[('GET', '/order_book', 'total')]) == {
+        'count', 'mean', 'p50', 'p90', 'p99'
+    }
+
+    text = prometheus.render()
+    assert ('quadriga_requests_total{endpoint="/ticker",method="GET",'
+            'status="200"} 1') in text
+    assert ('quadriga_errors_total{endpoint="/order_book",'
+            'error="ConnectionError",method="GET"} 1') in text
+    assert ('quadriga_request_seconds_count{endpoint="/ticker",'
+            'method="GET",phase="total"} 2') in text
+    assert ('quadriga_request_seconds_bucket{endpoint="/ticker",'
+            'le="+Inf",method="GET",phase="headers"} 2') in text
+
+    path = str(tmpdir.join('quadriga.prom'))
+    prometheus.write(path)
+    with open(path) as fp:
+        assert fp.read() == text
+
+    try:
+        from urllib.request import urlopen
+    except ImportError:  # pragma: no cover
+        from urllib2 import urlopen
+    server = prometheus.serve(0, host='127.0.0.1')
+    try:
+        url = 'http://127.0.0.1:{}/metrics'.format(server.server_address[1])
+        assert urlopen(url).read().decode('utf-8') == text
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    memory.clear()
+    assert memory.summary() == {}
+
+
+def test_record_and_replay(tmpdir, requests_get, requests_post):
+    from quadriga.exceptions import ReplayError
+    from quadriga.replay import Cassette, RecordingSession, ReplaySession
+
+    response = set_response(requests_get, body=test_order_book)
+    response.content = b'{"timestamp": "1", "bids": [], "asks": []}'
+    post_response = set_response(requests_post)
+    post_response.content = b'{"id": "order_id"}'
+
+    cassette = Cassette()
+    client = QuadrigaClient(
+        api_key=test_key, api_secret=test_secret, client_id=test_client_id,
+        default_book=test_book,
+        wrap_session=lambda session: RecordingSession(cassette, session)
+    )
+    client.get_public_orders()
+    client.buy_limit_order('0.1', '5000')
+    assert len(cassette) == 2
+    path = str(tmpdir.join('cassette.jsonl'))
+    cassette.save(path)
+
+    sleeps = []
+    replay = ReplaySession(Cassette.load(path), latency=0.5,
+                           sleep=sleeps.append)
+    client = QuadrigaClient(
+        api_key=test_key, api_secret=test_secret, client_id=test_client_id,
+        default_book=test_book, wrap_session=lambda _: replay
+    )
+    assert client.get_public_orders() == {
+        'timestamp': '1', 'bids': [], 'asks': []
+    }
+    assert client.buy_limit_order('0.1', '5000') == {'id': 'order_id'}
+    assert client.buy_limit_order('0.1', '5000') == {'id': 'order_id'}
+    assert replay.requests == 3
+    assert sleeps == [0.5, 0.5, 0.5]
+    with pytest.raises(ReplayError):
+        client.get_public_orders(book='eth_cad')
+    with pytest.raises(ReplayError):
+        client.buy_limit_order('0.2', '5000')
+
+
+def test_simulator_matching():
+    from quadriga.simulator import Exchange, SimulatorError
+
+    exchange = Exchange(books=['btc_cad'], clock=lambda: 1000.0)
+    exchange.add_account('a', 'secret', 'client', {'cad': '10000'})
+    exchange.add_account('b', 'secret', 'client', {'btc': '1'})
+    exchange.seed_book('btc_cad', bids=[('4990', '1')],
+                       asks=[('5010', '1'), ('5020', '1')])
+    buyer, seller = exchange._accounts['a'], exchange._accounts['b']
+
+    result = exchange.place_order(buyer, 'buy', 'btc_cad', '1.5')
+    assert result == {'amount': '1.50000000', 'orders_matched': [
+        {'price': '5010.00', 'amount': '1.00000000'},
+        {'price': '5020.00', 'amount': '0.50000000'},
+    ]}
+    assert exchange.balance(buyer)['cad_available'] == '2480.00'
+    assert exchange.balance(buyer)['btc_balance'] == '1.50000000'
+
+    order = exchange.place_order(seller, 'sell', 'btc_cad', '0.5', '5000')
+    assert order['status'] == '0'
+    assert exchange.balance(seller)['btc_reserved'] == '0.50000000'
+    exchange.place_order(buyer, 'buy', 'btc_cad', '0.2', '5015')
+    assert exchange.lookup_order(seller, order['id'])[0]['amount'] == (
+        '0.30000000'
+    )
+    assert exchange.order_book('btc_cad') == {
+        'timestamp': '1000',
+        'bids': [['4990.00', '1.00000000']],
+        'asks': [['5000.00', '0.30000000'], ['5020.00', '0.50000000']],
+    }
+    assert exchange.transactions('btc_cad')[0] == {
+        'date': '1000', 'tid': 3, 'price': '5000.00',
+        'amount': '0.20000000', 'side': 'buy',
+    }
+    assert exchange.cancel_order(seller, order['id']) is True
+    assert exchange.balance(seller)['btc_reserved'] == '0.00000000'
+    assert exchange.balance(seller)['cad_balance'] == '1000.00'
+    assert exchange.open_orders(seller, 'btc_cad') == []
+
+    with pytest.raises(SimulatorError) as error:
+        exchange.place_order(buyer, 'buy', 'btc_cad', '1', '5000')
+    assert error.value.code == SimulatorError.INSUFFICIENT_FUNDS
+    with pytest.raises(SimulatorError) as error:
+        exchange.cancel_order(buyer, order['id'])
+    assert error.value.code == SimulatorError.NOT_FOUND
+
+
+def test_simulator_server(monkeypatch):
+    from quadriga.simulator import Exchange, ExchangeSimulator
+
+    # Send real requests, signed with real nonces
+    monkeypatch.undo()
+
+    exchange = Exchange()
+    exchange.add_account(test_key, test_secret, test_client_id,
+                         {'btc': '1'})
+    exchange.seed_book(test_book, bids=[('1000', '2')])
+    sleeps = []
+    with ExchangeSimulator(exchange, latency=0.01,
+                           sleep=sleeps.append) as simulator:
+        client = QuadrigaClient(
+            api_key=test_key, api_secret=test_secret,
+            client_id=test_client_id, default_book=test_book,
+            endpoint_prefix=simulator.url
+        )
+        assert client.get_public_orders()['bids'] == [
+            ['1000.00', '2.00000000']
+        ]
+        result = client.sell_market_order('0.25')
+        assert result['amount'] == '0.25000000'
+        assert client.get_balance()['usd_balance'] == '250.00'
+        assert client.get_summary()['last'] == '1000.00'
+
+        # A nonce older than the last one is rejected, then signed again
+        client._rest_client._nonce_generator = lambda: 1
+        with pytest.raises(RequestError) as error:
+            client.get_balance()
+        assert error.value.error_code == 106
+        assert len(sleeps) == 4 + 1 + client._rest_client.nonce_retries
+
+        bad_client = QuadrigaClient(
+            api_key=test_key, api_secret='wrong', client_id=test_client_id,
+            endpoint_prefix=simulator.url
+        )
+        with pytest.raises(RequestError) as error:
+            bad_client.get_balance()
+        assert error.value.error_code == 101
+        client.close()
+        bad_client.close()
+
+    errors = ExchangeSimulator(exchange, error_rate=1, error_statuses=[503])
+    with errors:
+        client = QuadrigaClient(endpoint_prefix=errors.url)
+        with pytest.raises(RequestError) as error:
+            client.get_summary()
+        assert error.value.http_code == 503
+        client.close()
+
+
+def test_lazy_imports():
+    import subprocess
+
+    # Importing the package and creating a client must not load the
+    # transport or NumPy, which are only needed once a request is sent
+    script = (
+        'import sys, quadriga\n'
+        'quadriga.QuadrigaClient()\n'
+        'print(",".join(name for name in ("requests", "urllib3", "numpy", '
+        '"concurrent.futures", "multiprocessing") if name in sys.modules))\n'
+    )
+    output = subprocess.check_output([sys.executable, '-c', script])
+    assert output.decode('utf-8').strip() == ''
+
+
+def test_result_models(requests_get, requests_post):
+    from quadriga.fixedpoint import FixedPoint
+    from quadriga.models import BookLevel, Order, Ticker, Trade, UserTrade
+
+    client = QuadrigaClient(default_book=test_book, result_models=True)
+    set_response(requests_get, body={
+        'timestamp': '1491481256', 'last': '1150.00', 'high': '1160.00',
+        'low': '1140.00', 'vwap': '1151.123', 'volume': '12.50000000',
+        'bid': '1149.99', 'ask': '1151.00',
+    })
+    ticker = client.get_summary()
+    assert isinstance(ticker, Ticker)
+    assert ticker.timestamp == 1491481256
+    assert ticker.vwap == FixedPoint(1151123, 3)
+    assert ticker['last'] == '1150.00'
+
+    set_response(requests_get, body=test_order_book)
+    orders = client.get_public_orders()
+    assert orders['bids'][0] == BookLevel(['1150.00', '0.50000000'])
+    assert orders['bids'][1].amount == FixedPoint(125, 2)
+    assert [list(level) for level in orders['asks']] == test_order_book[
+        'asks'
+    ]
+    check_order_book(client.get_order_book())
+
+    set_response(requests_get, body=[
+        {'date': '100', 'tid': 7, 'price': '1150.00',
+         'amount': '0.10000000', 'side': 'sell'},
+    ])
+    trade, = client.get_public_trades()
+    assert isinstance(trade, Trade)
+    assert (trade.date, trade.tid, trade.side) == (100, 7, 'sell')
+    assert trade.price * trade.amount == FixedPoint(115, 0)
+    assert trade.as_dict() == requests_get.return_value.json.return_value[0]
+
+    set_response(requests_post, body=[
+        {'datetime': '2017-04-06 12:00:00', 'id': 1, 'type': 2,
+         'method': 'Exchange', 'btc': '0.10000000', 'usd': '-115.00',
+         'rate': '1150.00', 'fee': '0.00050000', 'order_id': 'abc'},
+    ])
+    user_trade, = client.get_trades()
+    assert isinstance(user_trade, UserTrade)
+    assert user_trade.major == FixedPoint(1, 1)
+    assert user_trade['usd'] == '-115.00'
+    assert user_trade.minor == -FixedPoint(115, 0)
+
+    set_response(requests_post, body={
+        'id': 'abc', 'datetime': '2017-04-06 12:00:00', 'type': 1,
+        'price': '1150.00', 'amount': '0.10000000', 'status': 0,
+    })
+    order = client.sell_limit_order('0.1', '1150')
+    assert isinstance(order, Order)
+    assert (order.side, order.status, order.book) == (
+        'sell', Order.ACTIVE, test_book
+    )
+    assert 'updated' not in order.keys()
+
+    set_response(requests_post, body={
+        'usd_balance': '100.00', 'usd_reserved': '40.00',
+        'usd_available': '60.00', 'fee': '0.5000',
+    })
+    balance = client.get_balance()
+    assert balance.available('usd') == FixedPoint(60, 0)
+    assert balance.fee == FixedPoint(5, 1)
+    assert balance['usd_reserved'] == '40.00'
+
+
+def test_collector_records(tmpdir):
+    from quadriga.collector import decode_snapshot, encode_snapshot
+    from quadriga.storage import snapshot_rows
+
+    record = encode_snapshot(test_book, test_order_book)
+    assert decode_snapshot(record) == (
+        test_book, int(test_order_book['timestamp']),
+        snapshot_rows(test_book, test_order_book)
+    )
+    assert decode_snapshot(encode_snapshot(
+        'eth_cad', {'timestamp': '5', 'bids': [], 'asks': [['1.5', '2']]}
+    )) == ('eth_cad', 5, [(5, 1, 20000000000, 150, 'eth_cad')])
+
+
+def test_parallel_collector(monkeypatch, tmpdir):
+    import os
+    import signal
+    from quadriga.collector import ParallelCollector
+    from quadriga.simulator import Exchange, ExchangeSimulator
+    from quadriga.storage import OrderBookStore, storage_places
+
+    # Poll the simulator with real requests and real clocks
+    monkeypatch.undo()
+
+    books = ['btc_cad', 'btc_usd', 'eth_cad']
+    exchange = Exchange(books=books)
+    for book in books:
+        exchange.seed_book(book, bids=[('100', '1')], asks=[('101', '2')])
+    db_path = str(tmpdir.join('orders.db'))
+    with ExchangeSimulator(exchange) as simulator:
+        collector = ParallelCollector(
+            db_path, books=books, processes=2, interval=0.05,
+            keyframe_interval=5, client_options={
+                'endpoint_prefix': simulator.url
+            }, restart_delay=0, check_interval=0.05
+        )
+        assert collector.shards == [['btc_cad', 'eth_cad'], ['btc_usd']]
+        with collector:
+            time.sleep(0.5)
+            os.kill(collector._workers[1].pid, signal.SIGKILL)
+            time.sleep(0.5)
+            os.kill(collector._writer.pid, signal.SIGKILL)
+            time.sleep(0.5)
+        assert not collector.running
+
+    report = collector.report()
+    assert report['restarts'] == {'worker 1': 1, 'writer': 1}
+    assert report['workers'][0]['books'] == ['btc_cad', 'eth_cad']
+    assert all(worker['polls'] > 0 and worker['errors'] == 0
+               for worker in report['workers'])
+    assert 0 < report['writer']['snapshots'] <= sum(
+        worker['snapshots'] for worker in report['workers']
+    )
+    with OrderBookStore(db_path) as store:
+        for book in books:
+            snapshot = store.book_at(book, int(time.time()))
+            amount = 10 ** storage_places(book)[0]
+            assert snapshot['bids'] == [(10000, amount)]
+            assert snapshot['asks'] == [(10100, 2 * amount)]
+
+
+def test_binary_log(tmpdir, requests_get, logger):
+    from quadriga.binlog import BinaryLog, BinaryLogReader, HEADER_SIZE
+    from quadriga.collector import ParallelCollector
+    from quadriga.exceptions import BinaryLogError
+    from quadriga.recorder import OrderBookRecorder
+
+    path = str(tmpdir.join('orders.qlog'))
+    with BinaryLog(path, index_interval=2) as log:
+        assert log.insert_snapshots([
+            ('btc_cad', {'timestamp': '110', 'bids': [['10.50', '1']],
+                         'asks': []}),
+            ('btc_cad', {'timestamp': '100', 'bids': [['10.00', '1'],
+                                                      ['9.00', '2']],
+                         'asks': [['11.00', '3']]}),
+            ('eth_cad', {'timestamp': '105', 'bids': [['1.00', '1']],
+                         'asks': []}),
+        ]) == 5
+        # Snapshots older than the last one written are dropped
+        assert log.insert_rows([(90, 0, 1, 1, 'btc_cad')]) == 0
+        assert logger.warning.call_count == 1
+
+    # A record cut short by a crash is discarded
+    with open(path, 'ab') as stream:
+        stream.write(b'\0' * 10)
+    with BinaryLog(path) as log:
+        assert log.index_interval == 2
+        assert log.count == 5
+        assert log.insert_rows([(120, 1, 5, 1200, 'btc_usd')]) == 1
+    with open(path + '.idx', 'rb') as stream:
+        assert len(stream.read()) == 3 * 16
+
+    with BinaryLogReader(path) as reader:
+        assert len(reader) == 6
+        assert reader.books() == ['btc_cad', 'eth_cad', 'btc_usd']
+        assert list(reader.range(100, 105)) == [
+            (100, 0, 100000000, 1000, 'btc_cad'),
+            (100, 0, 200000000, 900, 'btc_cad'),
+            (100, 1, 300000000, 1100, 'btc_cad'),
+            (105, 0, 10000000000, 100, 'eth_cad'),
+        ]
+        assert list(reader.range(101, 109, book='btc_cad')) == []
+        assert [row[0] for row in reader.range(106)] == [110, 120]
+        assert reader.book_at('btc_cad', 109) == {
+            'timestamp': 100,
+            'bids': [(1000, 100000000), (900, 200000000)],
+            'asks': [(1100, 300000000)],
+        }
+        assert reader.book_at('btc_cad', 99) is None
+        assert reader.book_at('ltc_cad', 200) is None
+        # The search stops at the records older than max_age
+        assert reader.book_at('btc_cad', 109, max_age=8) is None
+        assert reader.book_at('btc_cad', 109, max_age=9)['timestamp'] == 100
+        assert reader.book_at('btc_cad', 200, max_age=None)['timestamp'] == 110
+
+        records = reader.records(101, 200)
+        assert not records.flags.writeable
+        assert records['timestamp'].tolist() == [105, 110, 120]
+        assert records['price'].tolist() == [100, 1050, 1200]
+        assert records['book'].tolist() == [1, 0, 2]
+        assert records['side'].tolist() == [0, 0, 1]
+        assert len(reader.records(121)) == 0
+        assert len(reader.records()) == 6
+
+    with open(str(tmpdir.join('other')), 'wb') as stream:
+        stream.write(b'\0' * HEADER_SIZE)
+    with pytest.raises(BinaryLogError):
+        BinaryLogReader(str(tmpdir.join('other')))
+
+    set_response(requests_get, body=test_order_book)
+    path = str(tmpdir.join('recorded.qlog'))
+    recorder = OrderBookRecorder(build_client(), path, books=['btc_cad'],
+                                 store_class=BinaryLog)
+    assert recorder.record_once() == 1
+    assert BinaryLogReader(path).book_at('btc_cad', 1491481256) == {
+        'timestamp': 1491481256,
+        'bids': [(115000, 50000000), (114999, 125000000)],
+        'asks': [(115100, 200000000)],
+    }
+    with pytest.raises(ValueError):
+        OrderBookRecorder(build_client(), path, keyframe_interval=10,
+                          store_class=BinaryLog)
+
+    # Shards would be written out of order
+    with pytest.raises(ValueError):
+        ParallelCollector(path, books=['btc_cad', 'eth_cad'], processes=2,
+                          store_class=BinaryLog)
+    collector = ParallelCollector(path, books=['btc_cad', 'eth_cad'],
+                                  processes=1, store_class=BinaryLog)
+    assert collector.shards == [['btc_cad', 'eth_cad']]
+
+
+def test_archive(tmpdir):
+    from quadriga.archive import (
+        ArchiveReader,
+        ArchiveWriter,
+        archive_database,
+        decode_block,
+        encode_block
+    )
+    from quadriga.exceptions import ArchiveError
+    from quadriga.storage import OrderBookStore
+
+    rows = [(100, 0, 5, 1000), (100, 0, 7, 990), (100, 1, 1, 1010),
+            (160, 0, 5, 1005), (160, 1, 2, 1010)]
+    block = encode_block(rows)
+    assert list(zip(*decode_block(block[24:], 5))) == rows
+
+    day = 86400
+    db_path = str(tmpdir.join('orders.db'))
+    with OrderBookStore(db_path) as store:
+        store.insert_rows([row + ('btc_cad',) for row in rows])
+        store.insert_rows([
+            (day + 10, 0, 3, 2000, 'btc_cad'),
+            (day + 10, 1, 4, 2100, 'btc_cad'),
+            (day - 1, 1, 9, 50, 'eth_cad'),
+        ])
+
+    root = str(tmpdir.join('archive'))
+    assert archive_database(db_path, root, end=day - 1, block_size=2)[0] == 6
+    # Later runs append to the partitions
+    assert archive_database(db_path, root, start=day)[0] == 2
+    # and skip the rows already archived
+    assert archive_database(db_path, root)[0] == 0
+    with ArchiveWriter(root) as writer:
+        writer.write_rows([(day + 10, 0, 3, 2000, 'btc_cad'),
+                           (day + 10, 1, 4, 2100, 'btc_cad')])
+    assert (writer.rows, writer.skipped) == (0, 2)
+
+    reader = ArchiveReader(root)
+    assert reader.books() == ['btc_cad', 'eth_cad']
+    assert reader.days('btc_cad') == ['1970-01-01', '1970-01-02']
+    assert reader.days('ltc_cad') == []
+    assert sorted(reader.range('btc_cad', 100, 100)) == sorted(rows[:3])
+    assert list(reader.range('btc_cad', 101, day + 10)) == rows[3:] + [
+        (day + 10, 0, 3, 2000), (day + 10, 1, 4, 2100),
+    ]
+    assert list(reader.range('eth_cad')) == [(day - 1, 1, 9, 50)]
+    assert len(list(reader.blocks('btc_cad', 150, 170))) == 2
+    assert len(list(reader.blocks('btc_cad', start=day))) == 1
+
+    # A block cut short by an interrupted run is ignored
+    path = tmpdir.join('archive', 'btc_cad', '1970-01-02.qarc')
+    size = len(path.read_binary())
+    with ArchiveWriter(root) as writer:
+        writer.write_rows([(day + 20, 0, 1, 2000, 'btc_cad')])
+    path.write_binary(path.read_binary()[:-3])
+    assert len(list(reader.range('btc_cad', start=day))) == 2
+
+    # and discarded before the partition is appended to
+    with ArchiveWriter(root) as writer:
+        writer.write_rows([(day + 30, 1, 2, 2200, 'btc_cad'),
+                           (day + 40, 0, 3, 2300, 'btc_cad')])
+    assert len(path.read_binary()) == size + writer.bytes
+    assert list(reader.range('btc_cad', start=day)) == [
+        (day + 10, 0, 3, 2000), (day + 10, 1, 4, 2100),
+        (day + 30, 1, 2, 2200), (day + 40, 0, 3, 2300),
+    ]
+
+    # A partition cut short in its magic is started again
+    tmpdir.join('archive', 'eth_cad', '1970-01-02.qarc').write_binary(b'QGA')
+    with ArchiveWriter(root) as writer:
+        writer.write_rows([(day + 50, 0, 1, 60, 'eth_cad')])
+    assert list(reader.range('eth_cad', start=day)) == [(day + 50, 0, 1, 60)]
+
+    path.write_binary(b'not an archive')
+    with pytest.raises(ArchiveError):
+        list(reader.range('btc_cad', start=day))
+    with pytest.raises(ArchiveError):
+        with ArchiveWriter(root) as writer:
+            writer.write_rows([(day + 60, 0, 1, 60, 'btc_cad')])
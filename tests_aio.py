@@ -0,0 +1,220 @@
+"""Tests of the asyncio client, which need Python 3.5 or later.
+
+They are kept out of tests.py, which must stay importable on Python 2.7 and
+3.4, and are not collected on older versions (see conftest.py).
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+
+import mock
+import pytest
+
+from quadriga import QuadrigaClient, RestClient
+from quadriga.aio import AsyncQuadrigaClient
+from quadriga.exceptions import InvalidOrderBookError, RequestError
+
+from tests import (  # noqa: F401 (fixtures)
+    build_url,
+    logger,
+    patch_time_module,
+    test_body,
+    test_book,
+    test_client_id,
+    test_headers,
+    test_key,
+    test_nonce,
+    test_reason,
+    test_secret,
+    test_url
+)
+
+
+def run_async(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class StubTransport(object):
+
+    def __init__(self, body=test_body, code=200):
+        self.calls = []
+        self.closed = False
+        self.response = mock.MagicMock()
+        self.response.url = test_url
+        self.response.headers = test_headers
+        self.response.status_code = code
+        self.response.reason = test_reason
+        self.response.json.return_value = body
+
+    async def request(self, method, url, params=None, json=None):
+        self.calls.append((method, url, params, json))
+        return self.response
+
+    async def close(self):
+        self.closed = True
+
+
+def test_async_client(logger):  # noqa: F811
+
+    transport = StubTransport()
+
+    async def run():
+        async with AsyncQuadrigaClient(
+            api_key=test_key,
+            api_secret=test_secret,
+            client_id=test_client_id,
+            default_book=test_book,
+            transport=transport
+        ) as client:
+            with pytest.raises(InvalidOrderBookError):
+                client.get_summary(book='invalid_book')
+            return await asyncio.gather(
+                client.get_summary(),
+                client.get_public_orders(book='eth_cad'),
+                client.buy_limit_order(10, 5)
+            )
+
+    outputs = run_async(run())
+    assert outputs == [test_body] * 3
+    assert transport.closed is True
+    assert transport.calls[0] == (
+        'GET', build_url('/ticker'), {'book': test_book}, None
+    )
+    assert transport.calls[1] == (
+        'GET', build_url('/order_book'), {'book': 'eth_cad', 'group': 1}, None
+    )
+    signature = RestClient(
+        api_key=test_key,
+        api_secret=test_secret,
+        client_id=test_client_id
+    )._compute_signature(test_nonce)
+    assert transport.calls[2] == ('POST', build_url('/buy'), None, {
+        'book': test_book,
+        'amount': 10,
+        'price': 5,
+        'key': test_key,
+        'nonce': test_nonce,
+        'signature': signature
+    })
+    logger.debug.assert_called_with('[client: test_client_id] close client')
+
+
+def test_async_client_error():
+
+    transport = StubTransport(code=500)
+    client = AsyncQuadrigaClient(transport=transport)
+    with pytest.raises(RequestError) as error:
+        run_async(client.get_balance())
+    assert error.value.http_code == 500
+
+
+def test_async_get_many():
+
+    transport = StubTransport()
+    client = AsyncQuadrigaClient(transport=transport)
+    output = run_async(client.get_summaries(books=['btc_cad', 'eth_cad']))
+    assert output == {'btc_cad': test_body, 'eth_cad': test_body}
+    assert len(transport.calls) == 2
+
+
+def test_async_place_orders():
+
+    transport = StubTransport()
+    client = AsyncQuadrigaClient(default_book=test_book, transport=transport)
+    results = run_async(client.place_orders([
+        {'side': 'buy', 'amount': 1},
+        {'side': 'hold', 'amount': 1},
+    ]))
+    assert results[0] == test_body
+    assert isinstance(results[1], ValueError)
+    assert run_async(client.cancel_orders(['order_id'])) == [test_body]
+    assert [call[1] for call in transport.calls] == [
+        build_url('/buy'), build_url('/cancel_order')
+    ]
+
+
+def test_async_iter_trades(tmpdir):
+    import datetime
+    from quadriga.checkpoint import FileCheckpoint
+
+    history = [
+        {'id': i, 'datetime': '2017-04-0{} 12:00:00'.format(i + 1)}
+        for i in range(5)
+    ]
+    transport = StubTransport()
+    offsets = []
+
+    async def request(method, url, params=None, json=None):
+        assert json['sort'] == 'asc'
+        offsets.append(json['offset'])
+        transport.response.json.return_value = \
+            history[json['offset']:json['offset'] + json['limit']]
+        return transport.response
+
+    transport.request = request
+    client = AsyncQuadrigaClient(
+        api_key=test_key,
+        api_secret=test_secret,
+        client_id=test_client_id,
+        default_book=test_book,
+        transport=transport
+    )
+
+    async def collect(trades, count=None):
+        result = []
+        async for trade in trades:
+            result.append(trade)
+            if len(result) == count:
+                break
+        return result
+
+    assert run_async(collect(client.iter_trades(page_size=2))) == history
+    assert offsets == [0, 2, 4]
+
+    del offsets[:]
+    since = datetime.datetime(2017, 4, 3, 12)
+    trades = client.iter_trades(page_size=4, since=since, prefetch=False)
+    assert [t['id'] for t in run_async(collect(trades))] == [2, 3, 4]
+    assert offsets == [0, 4]
+
+    checkpoint = FileCheckpoint(str(tmpdir.join('trades.checkpoint')))
+    trades = client.iter_trades(page_size=2, checkpoint=checkpoint)
+    assert run_async(collect(trades, 3)) == history[:3]
+    assert checkpoint.offset == 2
+    run_async(trades.aclose())
+    assert run_async(collect(trades)) == []
+
+    trades = client.iter_trades(page_size=2, checkpoint=checkpoint)
+    assert run_async(collect(trades)) == history[2:]
+    assert checkpoint.offset == 5
+
+
+def test_async_shared_nonce_generator():
+    from quadriga.nonce import SharedNonceGenerator
+
+    nonce_generator = SharedNonceGenerator()
+    transport = StubTransport()
+    async_client = AsyncQuadrigaClient(
+        api_key=test_key,
+        api_secret=test_secret,
+        client_id=test_client_id,
+        default_book=test_book,
+        transport=transport,
+        nonce_generator=nonce_generator
+    )
+    sync_client = QuadrigaClient(
+        api_key=test_key,
+        api_secret=test_secret,
+        client_id=test_client_id,
+        nonce_generator=nonce_generator
+    )
+    run_async(async_client.get_balance())
+    assert sync_client._rest_client._sign_payload()['nonce'] == test_nonce + 1
+    run_async(async_client.get_balance())
+    assert [call[3]['nonce'] for call in transport.calls] == [
+        test_nonce, test_nonce + 2
+    ]
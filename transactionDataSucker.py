@@ -1,47 +1,41 @@
-from quadriga import QuadrigaClient
-import datetime
-import sqlite3
-
-# Initialize the QuadrigaCX client                                                                       
-client = QuadrigaClient(
-        api_key = 'api_key',
-        api_secret = 'api_secret',
-        client_id = 'client_id',
-        default_book = 'bch_cad'
-        )
+"""Record QuadrigaCX order book snapshots into quadrigaData.db.
 
-# Initialize SQLite database
-conn = sqlite3.connect('quadrigaData.db')
-c = conn.cursor()
+Run it once (e.g. from cron) to record a single snapshot of each book, or
+with --interval to keep recording until interrupted.
+"""
+import argparse
+import time
 
+from quadriga import QuadrigaClient
+from quadriga.recorder import OrderBookRecorder
+from quadriga.storage import OrderBookStore
 
 
 def main():
-        orderTimeStamp, orderBids, orderAsks = pullPublicOrders()
-        writeListToSQLdb(orderTimeStamp, 0, orderBids)
-        writeListToSQLdb(orderTimeStamp, 1, orderAsks)
-        conn.close()
-        
-def pullPublicOrders():
-        orderData = client.get_public_orders()
-        orderTimeStamp = int(orderData['timestamp'])
-        orderBids = [[float(bid[0]), float(bid[1])] for bid in orderData['bids']]
-        orderAsks = [[float(ask[0]), float(ask[1])] for ask in orderData['asks']]
-
-        return(orderTimeStamp, orderBids, orderAsks)
-        #print(datetime.datetime.fromtimestamp(ordersTimeStamp))
-
-        
-# Writes an array of orders to the sql file
-# orderTimeStamp: computer ticks
-# orderType: 0 for bid, 1 for ask
-# orders: Array of orders of the form [price, amount]
-def writeListToSQLdb(orderTimeStamp, orderType, orders):
-
-        transaction = [(orderTimeStamp, orderType, int(order[1]*(10**8)), int(order[0]*(10**2))) for order in orders]
-
-        c.executemany("INSERT INTO transactionOrders (timeStamp, type, amount, price) VALUES (?,?,?,?);",(transaction))
-        conn.commit()
-        
-        
-main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='quadrigaData.db')
+    parser.add_argument('--books', nargs='+', default=['bch_cad'])
+    parser.add_argument('--interval', type=float,
+                        help='seconds between snapshots (default: run once)')
+    args = parser.parse_args()
+
+    # Rows recorded before the book column existed all belong to bch_cad
+    OrderBookStore(args.db, legacy_book='bch_cad').close()
+
+    with QuadrigaClient(default_book=args.books[0]) as client:
+        recorder = OrderBookRecorder(
+            client, args.db, books=args.books, interval=args.interval or 1.0
+        )
+        if args.interval is None:
+            recorder.record_once()
+            return
+        with recorder:
+            try:
+                while True:
+                    time.sleep(60)
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == '__main__':
+    main()